@@ -0,0 +1,146 @@
+# Runs headless simulations (see data/simulation.py) of every level and difficulty at once, spread over a pool of processes
+# Run from the game folder with: python -m data.batch layout.json|policy [output.json] [processes]
+# The layout is either a list of towers used on every level, or a dict of them by level number ({"0": [...], "3": [...]})
+# A policy places towers as the game goes on instead, before each wave: "advisor" or "advisor:tower_name" (see POLICIES)
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy") # settings.py starts pygame up when it's imported, no window is ever opened
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import sys
+import json
+import time
+import numpy
+from multiprocessing import Pool
+
+from data.settings import *
+from data.simulation import Simulation
+
+DIFFICULTIES = 3 # every level has mild, acute and severe waves
+SEED = 0
+POLICY_TOWER = "t_cell" # what the advisor policy places unless it's told otherwise
+
+def advisor_policy(simulation, name):
+    # spends all the protein on towers where the placement advisor says they'd make the enemies' route longest,
+    # breaking ties by how much of the route the tower can reach
+    game = simulation.game
+    cost = round(TOWER_DATA[name]["stages"][0]["upgrade_cost"] * (1 + game.difficulty * 0.25))
+    reach = TOWER_DATA[name]["stages"][0]["range"] // game.map.tilesize
+    while game.protein >= cost:
+        gains = game.pathfinder.get_placement_gains(game.get_start_nodes())
+        total = gains.sum(0)
+        total[(gains == -1).any(0)] = -1 # would cut a start off
+
+        # how many path tiles are within reach of each tile, from the path's summed area table
+        path_nodes = numpy.array(game.pathfinder.get_path_nodes(game.get_start_nodes()), dtype = numpy.int32)
+        table = numpy.pad(path_nodes.cumsum(0).cumsum(1), ((1, 0), (1, 0)))
+        xs = numpy.arange(path_nodes.shape[0])
+        ys = numpy.arange(path_nodes.shape[1])
+        x1, x2 = numpy.clip(xs - reach, 0, None), numpy.clip(xs + reach + 1, None, path_nodes.shape[0])
+        y1, y2 = numpy.clip(ys - reach, 0, None), numpy.clip(ys + reach + 1, None, path_nodes.shape[1])
+        covered = table[x2][:, y2] - table[x1][:, y2] - table[x2][:, y1] + table[x1][:, y1]
+
+        tiles = [(total[x][y], covered[x][y], x, y) for x, col in enumerate(game.map.get_map()) for y, node in enumerate(col)
+                 if node == 0 and game.map.is_valid_tower_tile(x, y) == -1 and total[x][y] >= 0 and covered[x][y] > 0]
+        if len(tiles) == 0:
+            return
+        x, y = max(tiles)[2:]
+        towers = len(simulation.towers)
+        simulation.place({"name": name, "x": int(x), "y": int(y)})
+        if len(simulation.towers) == towers: # blocked after all, so nothing else will fit either
+            return
+
+POLICIES = {
+    "advisor": advisor_policy
+}
+
+def get_policy(name):
+    # returns (policy, towers it places) for a name like "advisor" or "advisor:b_cell",
+    # raises ValueError saying which part of the name isn't known
+    name, tower = (name.split(":") + [POLICY_TOWER])[:2]
+    if name not in POLICIES:
+        raise ValueError("there's no {} policy (the policies are {})".format(name, ", ".join(POLICIES)))
+    if tower not in TOWER_DATA:
+        raise ValueError("there's no {} tower for the {} policy to place".format(tower, name))
+    return lambda simulation: POLICIES[name](simulation, tower), [tower]
+
+def run_job(job):
+    # one simulation in a worker process, which has its own copy of everything the game loads
+    level, difficulty, layout, policy_name = job
+    start_time = time.perf_counter()
+    if policy_name != None:
+        policy, policy_towers = get_policy(policy_name)
+        simulation = Simulation(level, difficulty, seed = SEED, policy = policy, policy_towers = policy_towers)
+    else:
+        simulation = Simulation(level, difficulty, layout, SEED)
+    results = simulation.run()
+    results["real_time"] = time.perf_counter() - start_time
+    return results
+
+class Batch():
+    def __init__(self, layouts = None, policy = None, processes = None):
+        # layouts is a dict of layouts by level, and levels without one are simulated without any towers
+        self.layouts = layouts if layouts != None else {}
+        self.policy = policy
+        self.processes = processes
+        self.levels = len(LevelData.get_instance().level_data)
+
+    def get_jobs(self):
+        # the later levels and harder difficulties take longest, so they're started first
+        return [(level, difficulty, self.layouts.get(level, []), self.policy)
+                for level in reversed(range(self.levels)) for difficulty in reversed(range(DIFFICULTIES))]
+
+    def run(self):
+        start_time = time.perf_counter()
+        pool = Pool(self.processes)
+        runs = []
+        for results in pool.imap_unordered(run_job, self.get_jobs()):
+            runs.append(results)
+            print("Level {} difficulty {} done ({}/{})".format(results["level"], results["difficulty"], len(runs), self.levels * DIFFICULTIES))
+        # the workers are left to finish by themselves, pygame catches the SIGTERM Pool.terminate would send them
+        pool.close()
+        pool.join()
+        runs.sort(key = lambda results: (results["level"], results["difficulty"]))
+        return {
+            "policy": self.policy,
+            "layouts": self.layouts,
+            "seed": SEED,
+            "real_time": time.perf_counter() - start_time,
+            "runs": runs
+        }
+
+def print_report(report):
+    print("Level  Difficulty  Wave     Lives lost  Leaks  Protein  Game time  Real time")
+    for results in report["runs"]:
+        print("{:>5}  {:>10}  {:>8}  {:>10}  {:>5}  {:>7}  {:>8.1f}s  {:>8.2f}s{}".format(
+            results["level"], results["difficulty"], "{}/{}".format(results["wave"], results["max_wave"]), results["lives_lost"],
+            results["leaks"], results["protein"], results["game_time"], results["real_time"], "" if results["lives"] > 0 else "  lost"))
+    print("{} runs in {:.2f}s".format(len(report["runs"]), report["real_time"]))
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python -m data.batch layout.json|policy [output.json] [processes]")
+        sys.exit(1)
+
+    layouts = None
+    policy = None
+    if path.isfile(sys.argv[1]):
+        with open(sys.argv[1], "r") as layout_file:
+            layout = json.load(layout_file)
+        if isinstance(layout, dict):
+            layouts = {int(level): towers for level, towers in layout.items()}
+        else:
+            layouts = {level: layout for level in range(len(LevelData.get_instance().level_data))}
+    else:
+        try:
+            get_policy(sys.argv[1])
+        except ValueError as error:
+            print("{} isn't a layout file, and {}".format(sys.argv[1], error))
+            sys.exit(1)
+        policy = sys.argv[1]
+
+    report = Batch(layouts, policy, int(sys.argv[3]) if len(sys.argv) > 3 else None).run()
+    print_report(report)
+    if len(sys.argv) > 2:
+        with open(sys.argv[2], "w") as out_file:
+            json.dump(report, out_file, indent=4)
+        print("Results written to " + sys.argv[2])
@@ -0,0 +1,352 @@
+# Pathfinding benchmarks over every map in data/maps
+# Run from the game folder with: python -m data.benchmark [output.json]
+# Every map is loaded the same way Game.new_game does it, then timed with each pathfinding engine and the A* the game started with
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy") # nothing is ever drawn
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import sys
+import json
+import random
+import time
+import numpy
+from heapq import *
+
+from data.settings import *
+from data.tilemap import TiledMap
+from data.pathfinding import Pathfinder, Hierarchy, heuristic
+from data.game import Game
+
+class BaselinePathfinder():
+    # The game's A* from before any of the pathfinding work, which the other engines are measured against
+    # The search is left as it was, it only takes the goal nodes instead of the goal sprites (see Pathfinder) and has
+    # what the benchmark calls on the other engines around it, done the way the game did it back then
+    def __init__(self, *args, **kwargs):
+        self.map = [[], [], [], [], []]
+        art_array = kwargs.get('arteries', None)
+        if art_array is None:
+            self.arteries = False
+        else:
+            self.map[2] = numpy.array(art_array)
+            self.map[1] = numpy.array(kwargs.get('artery_entrances', None))
+            self.arteries = True
+        vein_array = kwargs.get('veins', None)
+        if vein_array is None:
+            self.veins = False
+        else:
+            self.map[-2] = numpy.array(vein_array)
+            self.map[-1] = numpy.array(kwargs.get('vein_entrances', None))
+            self.veins = True
+
+        if self.arteries == False and self.veins == False:
+            self.neighbors = [(0, 1, 0), (0, -1, 0), (1, 0, 0), (-1, 0, 0)]
+        else:
+            self.neighbors = [(0, 1, 0), (0, -1, 0), (1, 0, 0), (-1, 0, 0), (0, 0, -1), (0, 0, 1)]
+
+        self.base_map = numpy.array(kwargs.get('base_map'))
+        self.goal_nodes = list(dict.fromkeys(kwargs.get('goals', [])))
+
+    def clear_nodes(self, map):
+        self.paths = {}
+        self.flying_paths = {}
+        self.map[0] = numpy.array(map)
+
+    def update_nodes(self, map):
+        # the game cleared everything whenever a tower was placed or sold
+        self.clear_nodes(map)
+
+    def get_path_nodes(self, starts):
+        # Game.calculate_path, one search per start tile
+        path_nodes = numpy.zeros(self.map[0].shape, dtype = bool)
+        for start in starts:
+            path = self.astar(start, False)
+            if path == False:
+                return False
+            for node in path:
+                if node[1] == 0:
+                    path_nodes[node[0][0]][node[0][1]] = True
+        return path_nodes
+
+    def astar(self, start, ignore_towers = False):
+        try:
+            if ignore_towers:
+                return self.flying_paths[start].copy()
+            return self.paths[start].copy()
+
+        except:
+            if ignore_towers:
+                temp_map = self.map[0].copy()
+                self.map[0] = self.base_map
+
+            prevstate = self.map[0][start[0][0]][start[0][1]]
+            self.map[0][start[0][0]][start[0][1]] = 0
+
+            close_set = set()
+            came_from = {}
+
+            oheap = []
+            fscore = {}
+            gscore = {}
+            for goal_node in self.goal_nodes:
+                fscore[goal_node] = heuristic(start[0], goal_node[0])
+                gscore[goal_node] = 0
+                heappush(oheap, (fscore[goal_node], goal_node))
+
+            while oheap:
+                current = heappop(oheap)[1]
+
+                if current == start:
+                    data = []
+                    while current in came_from:
+                        data.append(current)
+                        current = came_from[current]
+                    data.append(current)
+
+                    self.map[0][start[0][0]][start[0][1]] = prevstate
+                    if ignore_towers:
+                        self.map[0] = temp_map
+
+                    for i, node in enumerate(data): # Adds the path for each node in the path
+                        # this only has to be done until a node that already has a path is reached
+                        if ignore_towers:
+                            if self.flying_paths.get(node, False) != False:
+                                break
+                            self.flying_paths[node] = data[i:]
+                        else:
+                            if self.paths.get(node, False) != False:
+                                break
+                            self.paths[node] = data[i:]
+                    return data.copy()
+
+                close_set.add(current)
+
+                for i, j, k in self.neighbors:
+                    neighbor = (current[0][0] + i, current[0][1] + j), current[1] + k
+                    if abs(neighbor[1]) > 2:
+                        continue
+                    if self.arteries == False and neighbor[1] > 0:
+                        continue
+                    if self.veins == False and neighbor[1] < 0:
+                        continue
+
+                    cur_array = self.map[neighbor[1]]
+                    if 0 <= neighbor[0][0] < cur_array.shape[0]:
+                        if 0 <= neighbor[0][1] < cur_array.shape[1]:
+                            if cur_array[neighbor[0][0]][neighbor[0][1]] == 1:
+                                continue
+                        else:
+                            # array bound y walls
+                            continue
+                    else:
+                        # array bound x walls
+                        continue
+
+                    tentative_g_score = gscore[current] + 1
+
+                    tentative_f_score = heuristic(start[0], neighbor[0]) + tentative_g_score
+
+                    if neighbor in close_set and tentative_f_score >= fscore.get(neighbor):
+                        continue
+
+                    if neighbor not in [i[1] for i in oheap] or tentative_f_score < fscore.get(neighbor):
+                        came_from[neighbor] = current
+                        fscore[neighbor] = tentative_f_score
+                        gscore[neighbor] = tentative_g_score
+                        heappush(oheap, (fscore[neighbor], neighbor))
+
+            self.paths[start] = False
+            self.map[0][start[0][0]][start[0][1]] = prevstate
+            return False
+
+class HierarchicalPathfinder(Pathfinder):
+    # A* mode searching over clusters of cluster_size instead of every node (see Hierarchy)
+    # The game never uses it, the flow field it runs in is far faster on every map, it's only here to compare against
+    def __init__(self, **kwargs):
+        self.cluster_size = kwargs["cluster_size"]
+        self.hierarchies = {}
+        super().__init__(**kwargs)
+
+    def clear_nodes(self, map):
+        super().clear_nodes(map)
+        self.hierarchies = {True: self.hierarchies[True]} if True in self.hierarchies else {}
+
+    def update_nodes(self, map):
+        changed = numpy.argwhere(numpy.array(map) != self.map[0])
+        super().update_nodes(map)
+        if False in self.hierarchies:
+            self.hierarchies[False].update([(int(x), int(y)) for x, y in changed])
+
+    def get_hierarchy(self, ignore_towers):
+        try:
+            return self.hierarchies[ignore_towers]
+
+        except KeyError:
+            self.hierarchies[ignore_towers] = Hierarchy(self, ignore_towers)
+            return self.hierarchies[ignore_towers]
+
+    def astar(self, start, ignore_towers = False):
+        paths = self.flying_paths if ignore_towers else self.paths
+        try:
+            return paths[start]
+
+        except KeyError:
+            route = self.get_hierarchy(ignore_towers).find_route(self.graph_ids[start], self.goal_ids)
+            if route == False:
+                paths[start] = False
+                return False
+            return self.cache_route([self.graph_nodes[i] for i in route], ignore_towers)
+
+    def get_version(self):
+        # the hierarchy's routes aren't the shortest
+        return super().get_version() + "-hierarchical" + str(self.cluster_size)
+
+# keyword arguments added to the map's arrays for each engine
+ENGINES = {
+    "baseline": {}, # the speedups are against this one
+    "astar": {},
+    "hierarchical": {"cluster_size": 16},
+    "flow_field": {"flow_field": True},
+    "wavefront": {"flow_field": True, "wavefront": True} # what the game uses on maps of WAVEFRONT_MIN_TILES or more
+}
+REPEATS = 5 # the cold timings are the best of this many runs
+PLACEMENTS = 10 # random tower placements per map and engine
+REROUTES = 30 # walking enemies re-routed after each placement (Game.check_paths does one search per enemy)
+SEED = 0
+ENGINE_CLASSES = {"baseline": BaselinePathfinder, "hierarchical": HierarchicalPathfinder} # Pathfinder for the rest
+
+class Benchmark():
+    def __init__(self):
+        MainDisplay.get_instance() # the map images need a display mode
+        self.game = Game(pg.time.Clock())
+        self.results = {"engines": ENGINES, "repeats": REPEATS, "placements": PLACEMENTS, "seed": SEED, "maps": {}}
+
+    def run(self):
+        for file in sorted(listdir(MAP_FOLDER)):
+            if file.endswith(".tmx"):
+                name = file[:-4]
+                self.results["maps"][name] = self.run_map(path.join(MAP_FOLDER, file))
+                self.print_map(name)
+        return self.results
+
+    def run_map(self, filename):
+        game = self.game
+        game.map = TiledMap(filename)
+        path_data = game.load_map()
+        self.base_map = [col[:] for col in path_data["base_map"]]
+        self.starts = game.get_start_nodes()
+        result = {"size": [len(self.base_map), len(self.base_map[0])], "start_tiles": len(self.starts)}
+        if len(self.starts) == 0 or len(game.goals) == 0:
+            result["skipped"] = "no starts or goals"
+            return result
+
+        result["engines"] = {}
+        for engine, kwargs in ENGINES.items():
+            data = dict(path_data)
+            data.update(kwargs)
+            result["engines"][engine] = self.run_engine(ENGINE_CLASSES.get(engine, Pathfinder)(**data))
+        # how many times faster than the baseline each engine is at everything they both do
+        baseline = result["engines"]["baseline"]
+        result["speedups"] = {engine: {key: baseline[key] / value for key, value in times.items()
+                                       if value and baseline.get(key) != None and key != "astar_warm_ms"}
+                              for engine, times in result["engines"].items() if engine != "baseline"}
+        return result
+
+    def run_engine(self, pathfinder):
+        result = {}
+
+        # one search per start tile from a cleared pathfinder, then the same search again from the cache
+        cold = []
+        warm = []
+        for start in self.starts:
+            times = []
+            for i in range(REPEATS):
+                pathfinder.clear_nodes(self.base_map)
+                times.append(self.time(pathfinder.astar, start, False))
+            cold.append(min(times))
+            warm.append(self.time(pathfinder.astar, start, False))
+        result["astar_cold_ms"] = sum(cold) / len(cold)
+        result["astar_warm_ms"] = sum(warm) / len(warm)
+
+        # ground versus flying routes for every start tile, both from a cleared pathfinder
+        for key, ignore_towers in (("ground_routes_ms", False), ("flying_routes_ms", True)):
+            result[key] = min(self.time(self.all_routes, pathfinder, ignore_towers) for i in range(REPEATS))
+
+        # Game.calculate_path: every start tile's path, from a cleared pathfinder
+        times = []
+        for i in range(REPEATS):
+            pathfinder.clear_nodes(self.base_map)
+            times.append(self.time(pathfinder.get_path_nodes, self.starts))
+        result["calculate_path_ms"] = min(times)
+
+        # Game.make_advisor_surf: the placement gains of every tile, from a cleared pathfinder (the baseline had no advisor)
+        times = []
+        for i in range(REPEATS if hasattr(pathfinder, "get_placement_gains") else 0):
+            pathfinder.clear_nodes(self.base_map)
+            times.append(self.time(pathfinder.get_placement_gains, self.starts))
+        result["placement_gains_ms"] = min(times) if times else None
+
+        # a tower lands: the map update, the legality check and every start tile's new route
+        rng = random.Random(SEED)
+        map = [col[:] for col in self.base_map]
+        tiles = [(x, y) for x, col in enumerate(map) for y, node in enumerate(col)
+                 if node == 0 and self.game.map.is_valid_tower_tile(x, y) == -1]
+        # and then the enemies on the map are re-routed from wherever they are
+        ground = [((x, y), 0) for x, col in enumerate(map) for y, node in enumerate(col) if node == 0]
+        times = []
+        reroute_times = []
+        while len(times) < PLACEMENTS and tiles:
+            x, y = tiles.pop(rng.randrange(len(tiles)))
+            map[x][y] = 1
+            enemies = [node for node in rng.sample(ground, min(REROUTES, len(ground))) if node[0] != (x, y)]
+            start_time = time.perf_counter()
+            pathfinder.update_nodes(map)
+            legal = pathfinder.get_path_nodes(self.starts) is not False
+            if legal:
+                for start in self.starts:
+                    pathfinder.astar(start, False)
+            times.append((time.perf_counter() - start_time) * 1000)
+            if legal:
+                reroute_times.append(self.time(self.reroute, pathfinder, enemies))
+            else:
+                map[x][y] = 0
+                pathfinder.update_nodes(map)
+        result["placement_ms"] = sum(times) / len(times) if times else None
+        result["placement_max_ms"] = max(times) if times else None
+        result["reroute_ms"] = sum(reroute_times) / len(reroute_times) if reroute_times else None
+        return result
+
+    def reroute(self, pathfinder, nodes):
+        for node in nodes:
+            pathfinder.astar(node, False)
+
+    def all_routes(self, pathfinder, ignore_towers):
+        pathfinder.clear_nodes(self.base_map)
+        pathfinder.flying_paths = {}
+        for cache in ("fields", "walkable", "hierarchies"): # whichever the engine has
+            getattr(pathfinder, cache, {}).pop(True, None)
+        for start in self.starts:
+            pathfinder.astar(start, ignore_towers)
+
+    def time(self, function, *args):
+        start_time = time.perf_counter()
+        function(*args)
+        return (time.perf_counter() - start_time) * 1000
+
+    def print_map(self, name):
+        result = self.results["maps"][name]
+        print("{} ({}x{}, {} start tiles)".format(name, result["size"][0], result["size"][1], result["start_tiles"]))
+        if "skipped" in result:
+            print("    skipped: " + result["skipped"])
+            return
+        for engine, times in result["engines"].items():
+            print("    {:<13}".format(engine) + "  ".join("{} {:.3f}".format(key[:-3], value) for key, value in times.items() if value != None))
+        print("    times faster than the baseline:")
+        for engine, speedups in result["speedups"].items():
+            print("    {:<13}".format(engine) + "  ".join("{} {:.1f}".format(key[:-3], value) for key, value in speedups.items()))
+
+if __name__ == "__main__":
+    results = Benchmark().run()
+    filename = sys.argv[1] if len(sys.argv) > 1 else "benchmark.json"
+    with open(filename, "w") as out_file:
+        json.dump(results, out_file, indent=4)
+    print("Results written to " + filename)
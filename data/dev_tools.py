@@ -14,6 +14,7 @@ from copy import deepcopy
 class DevClass(Game):
     def __init__(self, clock):
         self.clock = clock
+        self.headless = False
         self.tower_names = SAVE_DATA["owned_towers"]
         self.enemy_names = SAVE_DATA["seen_enemies"]
         self.wave = 0
@@ -33,12 +34,19 @@ class DevClass(Game):
         self.obstacles = pg.sprite.Group()
         self.towers = pg.sprite.Group()
         self.enemies = pg.sprite.Group()
+        self.enemy_store = EnemyStore()
+        self.projectile_store = ProjectileStore(self)
+        self.scheduler = Scheduler()
+        self.random = random.Random()
+        self.accumulator = 0
+        self.speed = 0
         self.projectiles = pg.sprite.Group()
         self.goals = pg.sprite.Group()
         self.explosions = pg.sprite.Group()
 
         self.protein = 0
         self.lives = 0
+        self.leaks = 0
         self.start_data = []
 
         self.map.clear_map()
@@ -103,7 +111,10 @@ class DevClass(Game):
             artery_entrances = artery_entrances,
             veins = veins,
             vein_entrances = vein_entrances,
-            base_map = base_map)
+            base_map = base_map,
+            goals = self.get_goal_nodes())
+        self.path_worker = None
+        self.show_advisor = False
         self.pathfinder.clear_nodes(self.map.get_map())
         self.draw_tower_bases_wrapper()
 
@@ -114,7 +125,7 @@ class DevClass(Game):
         self.draw_tower_bases(pg.Surface((self.map.width, self.map.height)))
 
     def make_stripped_path_wrapper(self):
-        self.make_stripped_path(pg.Surface((self.map.width, self.map.height)))
+        self.path_surf = self.make_stripped_path(pg.Surface((self.map.width, self.map.height)))
 
     def load_ui(self, save=False):
         self.ui = DevUI(save)
@@ -156,12 +167,14 @@ class DevClass(Game):
         self.make_stripped_path_wrapper()
 
     def update(self):
-        for start in self.starts:
-            start.update()
-        self.enemies.update()
+        self.run_ticks()
+
+    def tick(self):
+        self.scheduler.update(TICK_TIME)
+        self.enemy_store.update(TICK_TIME / 1000)
         self.towers.update()
-        self.projectiles.update()
-        self.explosions.update()
+        self.projectile_store.update(TICK_TIME / 1000)
+        return True
 
     def draw(self):
         surface = pg.Surface((self.map.width, self.map.height))
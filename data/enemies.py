@@ -1,30 +1,288 @@
 from data.settings import *
-import random
 from data.tilemap import tile_from_coords
 from data.game_misc import Explosion
 import math
+import numpy
+
+def stored(name):
+    # an attribute that lives in the object's row of its store's column (see ColumnStore)
+    def get(self):
+        return self.store.columns[name].item(self.row)
+
+    def set(self, value):
+        self.store.columns[name][self.row] = value
+
+    return property(get, set)
+
+class ColumnStore():
+    # Struct of arrays: the attributes in COLUMNS are kept in one NumPy column each with a row per object, which the objects
+    # get at with stored properties, so they can all be updated in one step (EnemyStore, and ProjectileStore in data/towers.py)
+    # Every store has an "order" column of how many objects were added before each one
+    COLUMNS = {"order": numpy.int64}
+
+    def __init__(self, capacity = 64):
+        self.columns = {name: numpy.zeros(capacity, dtype = dtype) for name, dtype in self.COLUMNS.items()}
+        self.objects = [] # the object in each row
+        self.added = 0
+
+    def __len__(self):
+        return len(self.objects)
+
+    def add(self, obj):
+        if len(self.objects) == len(self.columns["order"]): # out of rows, so every column doubles in size
+            for name, column in self.columns.items():
+                self.columns[name] = numpy.concatenate((column, numpy.zeros_like(column)))
+
+        obj.row = len(self.objects)
+        self.objects.append(obj)
+        for column in self.columns.values():
+            column[obj.row] = 0
+        self.columns["order"][obj.row] = self.added
+        self.added += 1
+
+    def remove(self, obj):
+        # the last row is moved into the gap, so the rows in use are always the first len(self) ones
+        moved = self.objects.pop()
+        if moved != obj:
+            for column in self.columns.values():
+                column[obj.row] = column[len(self.objects)]
+            moved.row = obj.row
+            self.objects[obj.row] = moved
+
+    def get_columns(self, size):
+        # the columns are replaced when they grow, so these views have to be looked up again after an object is added
+        return {name: column[:size] for name, column in self.columns.items()}
+
+    def get_objects(self, mask):
+        return [self.objects[row] for row in numpy.flatnonzero(mask).tolist()]
+
+GRID_CELL_SIZE = 128 # px
+
+class EnemyGrid():
+    # Uniform grid of where the middle of every enemy is, made by EnemyStore.get_grid whenever the enemies have moved,
+    # so towers, projectiles and explosions looking for enemies only go through the ones in the cells around them
+    # Enemies killed since then are still in their cells, so they're skipped when they come up
+    def __init__(self, size = GRID_CELL_SIZE):
+        self.size = size
+        self.cells = {} # (cell x, cell y) -> [(order, x, y, enemy)] in order
+        self.reach = 0 # the biggest enemy width or height, which is further than any enemy rect goes from its middle
+
+    def build(self, store):
+        columns = store.get_columns(len(store))
+        rows = numpy.argsort(columns["order"])
+        center_x = (columns["x"] + columns["w"] // 2)[rows].tolist()
+        center_y = (columns["y"] + columns["h"] // 2)[rows].tolist()
+        self.cells = {}
+        for row, order, x, y in zip(rows.tolist(), columns["order"][rows].tolist(), center_x, center_y):
+            self.cells.setdefault((x // self.size, y // self.size), []).append((order, x, y, store.objects[row]))
+        self.reach = int(max(columns["w"].max(), columns["h"].max())) if len(store) > 0 else 0
+
+    def get_cells(self, x1, y1, x2, y2):
+        # the enemy lists of the cells from (x1, y1) to (x2, y2), going through whichever of those or the cells with enemies in them is fewer
+        if (x2 - x1 + 1) * (y2 - y1 + 1) > len(self.cells):
+            return [entries for cell, entries in self.cells.items() if x1 <= cell[0] <= x2 and y1 <= cell[1] <= y2]
+        return [self.cells[cell] for cell in ((cell_x, cell_y) for cell_x in range(x1, x2 + 1) for cell_y in range(y1, y2 + 1)) if cell in self.cells]
+
+    def get_in_range(self, x, y, radius):
+        # enemies whose middles are at most radius (in a straight line) from (x, y), in the order of the game's enemies group
+        found = []
+        radius_squared = radius ** 2
+        for entries in self.get_cells(int((x - radius) // self.size), int((y - radius) // self.size),
+                                      int((x + radius) // self.size), int((y + radius) // self.size)):
+            for entry in entries:
+                if (entry[1] - x) ** 2 + (entry[2] - y) ** 2 <= radius_squared and entry[3].alive():
+                    found.append(entry)
+        found.sort() # by order, which is never the same for two enemies
+        return [entry[3] for entry in found]
+
+    def get_in_rect(self, rect):
+        # enemies whose rects overlap rect, in the order of the game's enemies group (like spritecollide)
+        found = []
+        for entries in self.get_cells(int((rect.left - self.reach) // self.size), int((rect.top - self.reach) // self.size),
+                                      int((rect.right + self.reach) // self.size), int((rect.bottom + self.reach) // self.size)):
+            for entry in entries:
+                if entry[3].alive() and entry[3].rect.colliderect(rect):
+                    found.append(entry)
+        found.sort()
+        return [entry[3] for entry in found]
+
+    def get_touched(self, rect, dx, dy):
+        # enemies rect touches on its way (dx, dy) across, the same as EnemyStore.sweep does it for a single rect,
+        # as (how far through the move it first touches the enemy from 0 to 1, enemy) in that order and then the enemies group's
+        found = []
+        area = rect.union(rect.move(dx, dy))
+        for entries in self.get_cells(int((area.left - self.reach) // self.size), int((area.top - self.reach) // self.size),
+                                      int((area.right + self.reach) // self.size), int((area.bottom + self.reach) // self.size)):
+            for order, x, y, enemy in entries:
+                if not enemy.alive():
+                    continue
+                enter, leave = 0, 1
+                for start, move, low, high in ((rect.x, dx, enemy.rect.left - rect.w, enemy.rect.right),
+                                               (rect.y, dy, enemy.rect.top - rect.h, enemy.rect.bottom)):
+                    if move == 0:
+                        if not low < start < high:
+                            break
+                    else:
+                        low, high = (low - start) / move, (high - start) / move
+                        enter, leave = max(enter, min(low, high)), min(leave, max(low, high))
+                else:
+                    if enter < leave:
+                        found.append((enter, order, enemy))
+        found.sort(key = lambda entry: entry[:2])
+        return [(time, enemy) for time, order, enemy in found]
+
+    def get_nearest(self, x, y):
+        # the enemy whose middle is the fewest pixels across and down from (x, y), and the first in the enemies group if it's a tie
+        # the cells are gone through from the closest, until the rest are all further away than what's been found
+        cells = []
+        for (cell_x, cell_y), entries in self.cells.items():
+            left, top = cell_x * self.size, cell_y * self.size
+            cells.append((max(left - x, x - left - self.size + 1, 0) + max(top - y, y - top - self.size + 1, 0), cell_x, cell_y))
+        cells.sort()
+        best = None
+        for closest, cell_x, cell_y in cells:
+            if best != None and closest > best[0]:
+                break
+            for order, enemy_x, enemy_y, enemy in self.cells[(cell_x, cell_y)]:
+                distance = abs(enemy_x - x) + abs(enemy_y - y)
+                if (best == None or (distance, order) < best[:2]) and enemy.alive():
+                    best = (distance, order, enemy)
+        return best[2] if best != None else None
+
+class EnemyStore(ColumnStore):
+    # Every enemy in a game: everything that changes every frame is kept in columns, so all of them move in one step
+    # Only the enemies that have something happen to them (reaching their next node or growing/shrinking between layers)
+    # have their own methods called, and slows, shields and mutations wait on the game's scheduler
+    COLUMNS = {
+        "x": numpy.int64, "y": numpy.int64, "w": numpy.int64, "h": numpy.int64, # the enemy's rect
+        "distance": numpy.float64, # how far along its path the enemy has gone, in pixels
+        "path_end": numpy.float64, # distance at the end of the path
+        "seg_begin": numpy.float64, "seg_end": numpy.float64, # distance at the start and end of the stretch it's on
+        "seg_x": numpy.float64, "seg_y": numpy.float64, # where that stretch starts
+        "seg_dx": numpy.float64, "seg_dy": numpy.float64, # and which way it goes
+        "target_x": numpy.float64, "target_y": numpy.float64, # where it ends (the middle of new_node's tile)
+        "speed": numpy.float64,
+        "hp": numpy.float64,
+        "slowed": bool,
+        "shield": bool,
+        "shield_hp": numpy.float64,
+        "shield_max_hp": numpy.float64,
+        "maximising": numpy.int64,
+        "order": numpy.int64 # which is also the enemy's place in the game's enemies group
+    }
+
+    def __init__(self, capacity = 64):
+        super().__init__(capacity)
+        self.grid = None # made when it's first needed after the enemies move or change
+
+    def add(self, enemy):
+        super().add(enemy)
+        self.grid = None
+
+    def remove(self, enemy):
+        # a killed enemy gets a store of its own, since towers and projectiles can still be holding on to it
+        detached = EnemyStore(1)
+        for name, column in self.columns.items():
+            detached.columns[name][0] = column[enemy.row]
+        detached.objects.append(enemy)
+
+        super().remove(enemy)
+        enemy.store = detached
+        enemy.row = 0
+
+    def get_grid(self):
+        # enemies are spawned and mutate on the game's scheduler, before they move, so the grid from the last update
+        # can be out of date by the time the scheduler's done too
+        if self.grid == None:
+            self.grid = EnemyGrid()
+            self.grid.build(self)
+        return self.grid
+
+    def sweep(self, start_x, start_y, end_x, end_y, w, h):
+        # which enemies each of a set of (w, h) rects touches on its way from (start_x, start_y) to (end_x, end_y) in a tick,
+        # so nothing fast goes through an enemy between one tick and the next
+        # The enemies are sorted by their left edge, so each rect only gets paired with the run of them whose edges are
+        # within the stretch of x it went over (sort and sweep), and only those pairs are checked properly
+        # Returns (index of the rect, enemy row, how far through its move it first touches the enemy from 0 to 1) for every pair that touches
+        columns = self.get_columns(len(self.objects))
+        rows = numpy.argsort(columns["x"], kind = "stable")
+        left = columns["x"][rows]
+        first = numpy.searchsorted(left, numpy.minimum(start_x, end_x) - columns["w"].max(), "right")
+        last = numpy.searchsorted(left, numpy.maximum(start_x, end_x) + w, "left")
+        counts = numpy.maximum(last - first, 0)
+        pairs = numpy.repeat(numpy.arange(len(start_x)), counts)
+        enemy_rows = rows[numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts - first, counts)]
+
+        # the rect overlaps the enemy's (like Rect.colliderect, so touching edges don't count) while it's inside the enemy's rect
+        # grown by the rect's size, which along each axis is a range of how far through the move it is
+        # (a rect that doesn't move along an axis gets -inf to inf if it's inside the whole time and an empty or nan range if not)
+        enter, leave = -numpy.inf, numpy.inf
+        with numpy.errstate(divide = "ignore", invalid = "ignore"):
+            for start, end, size, position, enemy_size in ((start_x, end_x, w, "x", "w"), (start_y, end_y, h, "y", "h")):
+                start, move = start[pairs], (end - start)[pairs]
+                low = (columns[position][enemy_rows] - size[pairs] - start) / move
+                high = (columns[position][enemy_rows] + columns[enemy_size][enemy_rows] - start) / move
+                enter = numpy.maximum(enter, numpy.minimum(low, high))
+                leave = numpy.minimum(leave, numpy.maximum(low, high))
+        touching = (enter < leave) & (enter < 1) & (leave > 0)
+        return pairs[touching], enemy_rows[touching], numpy.maximum(enter[touching], 0)
+
+    def update(self, passed_time):
+        columns = self.get_columns(len(self.objects))
+        for enemy in self.get_objects(columns["maximising"] != 0):
+            enemy.resize()
+
+        # an enemy's position is only how far along its path it is, so moving is one add,
+        # and only the enemies that went past the end of the stretch they were on have to load their next nodes
+        columns["distance"] += columns["speed"] * passed_time
+        for enemy in self.get_objects(columns["distance"] >= columns["seg_end"]):
+            enemy.follow_path()
+
+        columns = self.get_columns(len(self.objects))
+        along = columns["distance"] - columns["seg_begin"]
+        columns["x"][:] = numpy.round(columns["seg_x"] + columns["seg_dx"] * along) - columns["w"] // 2
+        columns["y"][:] = numpy.round(columns["seg_y"] + columns["seg_dy"] * along) - columns["h"] // 2
+        for enemy, x, y in zip(self.objects, columns["x"].tolist(), columns["y"].tolist()):
+            enemy.rect.topleft = (x, y)
+        self.grid = None
 
 class Enemy(pg.sprite.Sprite):
+    speed = stored("speed")
+    hp = stored("hp")
+    slowed = stored("slowed")
+    shield = stored("shield")
+    shield_hp = stored("shield_hp")
+    shield_max_hp = stored("shield_max_hp")
+    maximising = stored("maximising")
+    distance = stored("distance")
+    path_end = stored("path_end")
+    seg_begin = stored("seg_begin")
+    seg_end = stored("seg_end")
+    seg_x = stored("seg_x")
+    seg_y = stored("seg_y")
+    seg_dx = stored("seg_dx")
+    seg_dy = stored("seg_dy")
+    target_x = stored("target_x")
+    target_y = stored("target_y")
+
     def __init__(self, game, x, y, name):
         self.game = game
         self.groups = game.enemies
         super().__init__(self.groups)
+        self.store = game.enemy_store
+        self.store.add(self)
         
-        self.clock = game.clock
         self.game = game
         self.name = name
         
-        self.direction = [1 if random.random() < 0.5 else -1, 1 if random.random() < 0.5 else -1]
         self.new_node = ((tile_from_coords(x, self.game.map.tilesize), tile_from_coords(y, self.game.map.tilesize)), 0)
         self.maximising = 0
         self.damagable = True
 
-        self.carry = [0, 0]
-
         self.slowed = False
-        self.slow_end = 0
-        self.shield_end = 0
-        self.total_time_passed = 0
+        self.slow_end = 0 # game times (see Scheduler) for when the slow wears off and the shield next recharges
+        self.shield_recharge_time = 0
+        self.spawn_time = game.scheduler.now
         
         self.load_attributes(x, y)
         
@@ -64,72 +322,51 @@ class Enemy(pg.sprite.Sprite):
             self.mutation_type = data["mutation_type"]
             self.mutation_time = data["mutation_time"]
             self.mutation_number = data["mutation_number"]
+            self.game.scheduler.schedule(max(self.spawn_time + self.mutation_time * 1000 - self.game.scheduler.now, 0), self.mutation)
         
         self.image_size = (round(self.raw_image.get_size()[0] * prev_scale), round(self.raw_image.get_size()[1] * prev_scale))
         self.ratio = self.image_size[1] / self.image_size[0]
-        self.image = pg.transform.scale(self.raw_image, self.image_size)
+        self.scale_image()
         image_size = self.raw_image.get_size()
         self.rect = pg.Rect(x, y, image_size[0], image_size[1])
+        for name, value in zip(("x", "y", "w", "h"), self.rect):
+            self.store.columns[name][self.row] = value
+        self.store.grid = None
+
+    def kill(self):
+        if self.alive():
+            self.store.remove(self)
+        super().kill()
+
+    # movement is updated for every enemy at once by EnemyStore.update, which calls these when needed
+    # and the timed ones are called by the game's scheduler, so they have to check the enemy is still around
+    def mutation(self):
+        if not self.alive():
+            return
+        self.name = self.mutation_type
+        self.load_attributes(self.rect.x, self.rect.y)
+        for _ in range(self.mutation_number - 1):
+            self.game.enemies.add(Enemy(self.game, self.rect.x, self.rect.y, self.name))
 
-    def update(self):
-        passed_time = self.clock.get_time() / 1000
-        self.slow_end -= passed_time
-        self.total_time_passed += passed_time
-
-        if self.shield and self.shield_hp != self.shield_max_hp:
-            if self.shield_recharge_delay <= 0:
-                self.shield_hp += 1
-                self.shield_recharge_delay = self.shield_recharge_rate
-
-            else:
-                self.shield_recharge_delay -= passed_time
-
-        if self.slowed and self.slow_end <= 0:
-            self.reset_speed()
-            
-        if self.mutate:
-            if self.total_time_passed >= self.mutation_time:
-                self.name = self.mutation_type
-                self.load_attributes(self.rect.x, self.rect.y)
-                for _ in range(self.mutation_number - 1):
-                    self.game.enemies.add(Enemy(self.game, self.rect.x, self.rect.y, self.name))
-
+    def resize(self):
         if (self.maximising < 0 and self.image_size[0] > 0 or self.maximising > 0 and self.image_size[0] < self.rect.w):
             image_w = max(0, min(self.image_size[0] + self.maximising, self.rect.w))
             self.image_size = (image_w, round(image_w * self.ratio))
             if self.image_size[0] > 0:
                 if self.image_size[0] == self.rect.w:
                     self.maximising = 0
-                self.image = pg.transform.scale(self.raw_image, self.image_size)
+                self.scale_image()
             else:
                 self.maximising = 0
-
-        if (self.rect.left <= self.new_node_rect.left):
-            self.direction[0] = abs(self.direction[0])
-
-        elif (self.rect.right >= self.new_node_rect.right):
-            self.direction[0] = -abs(self.direction[0])
-
-        if (self.rect.top <= self.new_node_rect.top):
-            self.direction[1] = abs(self.direction[1])
-
-        elif (self.rect.bottom >= self.new_node_rect.bottom):
-            self.direction[1] = -abs(self.direction[1])
-
-        move = []
-        for i, val in enumerate(self.carry):
-            self.carry[i] += self.speed * passed_time * self.direction[i]
-            move.append(round(self.carry[i]))
-            self.carry[i] -= move[-1]
-
-        self.rect.move_ip(move[0], move[1])
-
-        if (self.new_node_rect.collidepoint(self.rect.topleft) and self.new_node_rect.collidepoint(self.rect.bottomright)):
-            self.load_next_node()
             
+    def scale_image(self):
+        if not self.game.headless: # the image is only needed for drawing
+            self.image = pg.transform.scale(self.raw_image, self.image_size)
+
     def damage(self, dam, shield_dam):
         if self.shield and self.shield_hp > 0:
-            self.shield_recharge_delay = self.shield_max_recharge_delay
+            self.shield_recharge_time = self.game.scheduler.now + self.shield_max_recharge_delay * 1000
+            self.game.scheduler.schedule(self.shield_max_recharge_delay * 1000, self.recharge_shield)
             if shield_dam > self.shield_hp:
                 self.shield_hp = 0
             else:
@@ -139,10 +376,11 @@ class Enemy(pg.sprite.Sprite):
             self.hp -= dam
 
         if (self.hp <= 0):
-            ENEMY_DEATH_SOUND.play()
             self.game.protein += self.dropped_protein
-            self.game.ui.generate_header()
-            self.game.ui.generate_body_wrapper()
+            if not self.game.headless:
+                ENEMY_DEATH_SOUND.play()
+                self.game.ui.generate_header()
+                self.game.ui.generate_body_wrapper()
             if self.explode_on_death:
                 EnemyExplosion(self.game, self.rect.center[0], self.rect.center[1], self.explode_radius)
             self.kill()
@@ -174,10 +412,47 @@ class Enemy(pg.sprite.Sprite):
         return combo_surf
 
     def recreate_path(self):
-        self.path = self.game.pathfinder.astar((self.new_node[0], self.new_node[1]), self.game.goals, self.flying)
+        self.path = self.game.pathfinder.astar((self.new_node[0], self.new_node[1]), self.flying)
         if not self.path and not self.flying:
-            self.path = self.game.pathfinder.astar((self.new_node[0], self.new_node[1]), self.game.goals, True)
+            self.path = self.game.pathfinder.astar((self.new_node[0], self.new_node[1]), True)
+        self.set_path(self.path)
+
+    def set_path(self, path):
+        self.path = path
+        self.path_index = 0 # the path is shared with other enemies, so only keep track of how far along it this one is
+        # the path is followed from where the enemy is now, then through the middle of each node's tile
+        self.distance = 0
+        self.seg_end = 0
+        self.target_x, self.target_y = self.rect.center
         self.load_next_node()
+        if self.path != False:
+            self.path_end = self.seg_end + self.path.get_length() * self.game.map.tilesize
+
+    @property
+    def end_dist(self): # how far the enemy still has to go, in pixels
+        return self.path_end - self.distance
+
+    def get_stretches(self):
+        # the rest of the enemy's path from where it is now, as (x, y, dx, dy, length) like the stretch it's on,
+        # for working out where it'll be later (see Projectile.aim)
+        along = self.distance - self.seg_begin
+        yield self.seg_x + self.seg_dx * along, self.seg_y + self.seg_dy * along, self.seg_dx, self.seg_dy, self.seg_end - self.distance
+        if self.path == False:
+            return
+        x, y = self.target_x, self.target_y
+        for index in range(self.path_index, len(self.path)):
+            node = self.path[index]
+            target_x = (node[0][0] + 0.5) * self.game.map.tilesize
+            target_y = (node[0][1] + 0.5) * self.game.map.tilesize
+            length = math.hypot(target_x - x, target_y - y)
+            if length > 0: # moving between layers doesn't take any distance
+                yield x, y, (target_x - x) / length, (target_y - y) / length, length
+            x, y = target_x, target_y
+
+    def follow_path(self):
+        # the enemy can go past more than one node in a frame (moving between layers doesn't take any distance)
+        while self.alive() and self.distance >= self.seg_end:
+            self.load_next_node()
 
     def load_next_node(self):
         if self.path == False:
@@ -185,9 +460,11 @@ class Enemy(pg.sprite.Sprite):
             self.kill()
             return
 
-        if (len(self.path) == 0):
+        if (self.path_index == len(self.path)):
             self.game.lives = max(self.game.lives - 1, 0)
-            self.game.ui.generate_header_wrapper()
+            self.game.leaks += 1
+            if not self.game.headless:
+                self.game.ui.generate_header_wrapper()
             self.game.protein += self.dropped_protein   # TODO: Remove this dev feature
                                                         # (enemies shouldn't drop protein if they reach the goal)
             
@@ -197,9 +474,9 @@ class Enemy(pg.sprite.Sprite):
             self.kill()
             return
         
-        self.end_dist = len(self.path)
         prevlayer = self.new_node[1]
-        self.new_node = self.path.pop(0)
+        self.new_node = self.path[self.path_index]
+        self.path_index += 1
         
         if abs(prevlayer) == 1 and abs(self.new_node[1]) == 2:
             self.maximising = -4
@@ -210,12 +487,35 @@ class Enemy(pg.sprite.Sprite):
         elif prevlayer == 0:
             self.damagable = True
 
-        self.new_node_rect = pg.Rect(self.new_node[0][0] * self.game.map.tilesize, self.new_node[0][1] * self.game.map.tilesize, self.game.map.tilesize, self.game.map.tilesize)
+        # the next stretch goes from the middle of the last node's tile to the middle of this one's
+        seg_x, seg_y = self.target_x, self.target_y
+        self.target_x = (self.new_node[0][0] + 0.5) * self.game.map.tilesize
+        self.target_y = (self.new_node[0][1] + 0.5) * self.game.map.tilesize
+        length = math.hypot(self.target_x - seg_x, self.target_y - seg_y)
+        self.seg_x, self.seg_y = seg_x, seg_y
+        if length > 0:
+            self.seg_dx, self.seg_dy = (self.target_x - seg_x) / length, (self.target_y - seg_y) / length
+        else:
+            self.seg_dx, self.seg_dy = 0, 0
+        self.seg_begin = self.seg_end
+        self.seg_end = self.seg_begin + length
         
+    def recharge_shield(self):
+        # a hit since this timer was set puts the recharge back, and that hit set a timer of its own
+        if not self.alive() or self.game.scheduler.now < self.shield_recharge_time or self.shield_hp == self.shield_max_hp:
+            return
+        self.shield_hp += 1
+        self.shield_recharge_time = self.game.scheduler.now + self.shield_recharge_rate * 1000
+        self.game.scheduler.schedule(self.shield_recharge_rate * 1000, self.recharge_shield)
+
+    def end_slow(self):
+        if self.alive() and self.slowed and self.game.scheduler.now >= self.slow_end:
+            self.reset_speed()
+
     def reset_speed(self):
         self.speed = self.raw_speed
         self.raw_image = self.original_image
-        self.image = pg.transform.scale(self.raw_image, self.image_size)
+        self.scale_image()
         self.slowed = False
 
     def is_slowed(self):
@@ -227,22 +527,38 @@ class Enemy(pg.sprite.Sprite):
             if new_speed > self.speed:
                 return
             elif new_speed == self.speed:
-                self.slow_end = slow_duration
+                self.set_slow_end(slow_duration)
                 return
 
         self.speed = new_speed
-        self.slow_end = slow_duration
+        self.set_slow_end(slow_duration)
 
         if self.slowed:
             return
 
         self.slowed = True
+        self.tint_image()
+        self.scale_image()
+
+    def tint_image(self):
+        if self.game.headless:
+            return
         image_surf = pg.Surface(self.image_size).convert_alpha()
         image_surf.fill((0, 0, 0, 0))
         image_surf.blit(self.original_image.convert_alpha(), (0, 0))
         image_surf.fill(HALF_GREEN, None, pg.BLEND_RGBA_MULT)
         self.raw_image = image_surf
-        self.image = pg.transform.scale(self.raw_image, self.image_size)
+
+    def load_image(self): # images aren't kept in snapshots (see data/snapshot.py)
+        self.raw_image = self.original_image
+        if self.slowed:
+            self.tint_image()
+        self.scale_image()
+
+    def set_slow_end(self, slow_duration):
+        # an earlier timer just finds slow_end has been pushed back and leaves the slow alone
+        self.slow_end = self.game.scheduler.now + slow_duration * 1000
+        self.game.scheduler.schedule(slow_duration * 1000, self.end_slow)
 
 class EnemyExplosion(Explosion):
     def __init__(self, game, x, y, rad):
@@ -260,9 +576,7 @@ class EnemyExplosion(Explosion):
                         tower.kill()
         
         if hit:
-            game.pathfinder.clear_nodes(game.map.get_map())
+            game.pathfinder.update_nodes(game.map.get_map())
             game.draw_tower_bases_wrapper()
-            game.make_stripped_path_wrapper()
-            for enemy in game.enemies:
-                enemy.recreate_path()
+            game.recalculate_paths()
         super().__init__(game, x, y, rad)
@@ -4,8 +4,11 @@ from data.pathfinding import *
 from data.game_misc import *
 from data.towers import *
 from data.display import *
+from data.scheduler import *
+from data.recorder import *
 
 import random
+import time
 
 vec = pg.math.Vector2
 
@@ -29,17 +32,31 @@ def collide_with_walls(sprite, group, dir):
             sprite.vel.y = 0
             sprite.hit_rect.centery = sprite.pos.y
 
+def get_start_routes(pathfinder, start_tiles): # the routes drawn by make_stripped_path
+    return [(pathfinder.astar(node, flying), flying) for node, flying in start_tiles]
+
+def work_out_paths(pathfinder, nodes, start_tiles, start_nodes, show_advisor): # runs on the path worker's thread
+    # only touches its own pathfinder and the copies it was given, nothing that belongs to the game
+    routes = {node: pathfinder.astar(node, False) for node in nodes}
+    blocking = pathfinder.get_blocking_nodes(start_nodes)
+    start_routes = get_start_routes(pathfinder, start_tiles)
+    gains = pathfinder.get_placement_gains(start_nodes) if show_advisor else None
+    return routes, blocking, start_tiles, start_routes, gains
+
 skip_to_wave = 0   # TODO: Remove this dev option
                     # Change this to change which wave you start on. You'll get all the protein from the previous waves.
                     # Indexing starts at 0 and the wave this is set to is inclusive.
                     # i.e. if the value is set to 15, the game will start at wave 16 (when counting from 1).
 
 class Game(Display):
-    def __init__(self, clock):
+    def __init__(self, clock, headless = False):
         self.init_super()
         self.clock = clock
+        self.headless = headless # nothing is drawn or played, see data/simulation.py
+        self.fixed_seed = None # every new game gets a random seed unless this is set
 
         self.game_done_event = pg.event.Event(pg.USEREVENT)
+        self.path_worker = None
         
         self.ui_pos = None
         self.key_map = {
@@ -73,31 +90,85 @@ class Game(Display):
     
     def new_game(self):
         self.load_level_data()
-        self.map = TiledMap(path.join(MAP_FOLDER, "{}.tmx".format(list(BODY_PARTS)[self.level_data["body_part"]]))) # TODO: Remove this dev option
-        self.load_data()
+        self.map = TiledMap(path.join(MAP_FOLDER, "{}.tmx".format(list(BODY_PARTS)[self.level_data["body_part"]])), self.headless) # TODO: Remove this dev option
+        if not self.headless:
+            self.load_data()
 
         # initialize all variables and do all the setup for a new game
-        self.new_enemy_box = NewEnemyBox()
-        self.obstacles = pg.sprite.Group()
+        self.new_enemy_box = None if self.headless else NewEnemyBox()
+        self.scheduler = Scheduler()
+        self.ticks = 0
+        self.accumulator = 0 # frame time that hasn't been ticked through yet
+        self.speed = 0 # index into GAME_SPEEDS
         self.towers = pg.sprite.Group()
         self.enemies = pg.sprite.Group()
+        self.enemy_store = EnemyStore()
+        self.projectile_store = ProjectileStore(self)
         self.projectiles = pg.sprite.Group()
-        self.goals = pg.sprite.Group()
         self.explosions = pg.sprite.Group()
         self.starts = []
 
+        # everything random in a game comes from its own generator, so with the same seed and inputs it plays out the same way
+        self.seed = random.randrange(2 ** 32) if self.fixed_seed == None else self.fixed_seed
+        self.random = random.Random(self.seed)
+        self.recorder = Recorder(self)
+
         self.current_tower = None
         self.protein = SAVE_DATA["game_attrs"]["starting_protein"]["value"]
         self.lives = SAVE_DATA["game_attrs"]["lives"]["value"]
+        self.leaks = 0 # enemies that got to the end, which can be more than the lives that were lost
 
         self.wave = -1  # only updated at the start of prepare_next_wave()
         self.in_a_wave = False
 
         self.cause_of_death = "IB"
+        self.time_passed = 0
+
+        path_data = self.load_map()
+        path_data["flow_field"] = True
+        path_data["wavefront"] = len(path_data["base_map"]) * len(path_data["base_map"][0]) >= WAVEFRONT_MIN_TILES
+        self.pathfinder = Pathfinder(**path_data)
+        if self.path_worker != None:
+            self.path_worker.stop()
+        # a simulation has nothing else to do while it waits for paths, so it works them out straight away
+        self.path_worker = None if self.headless else PathWorker(**path_data)
+        self.path_version = 0
+        self.paths_pending = False
+        self.show_advisor = False
+        self.advisor_font = pg.font.Font(FONT, self.map.tilesize // 2)
+        
+        if not self.headless:
+            songs = [MILD_LEVEL_MUSIC, ACUTE_LEVEL_MUSIC, SEVERE_LEVEL_MUSIC]
+            pg.mixer.music.set_endevent()
+            pg.mixer.music.stop()
+            pg.mixer.music.load(songs[self.difficulty][self.level // 11])
+            if self.difficulty == 2 and self.level // 11 == 1: # only for late severe levels
+                pg.mixer.music.play(0) # have to make the song play 0 times for some reason...
+                pg.mixer.music.set_endevent(pg.USEREVENT + 3)
+            else:
+                pg.mixer.music.play(-1)
+        
+        self.node_is_in_path = [[]]
+        self.pathfinder.clear_nodes(self.map.get_map())
+        self.load_flying_paths()
+        if not self.headless:
+            self.camera = Camera(SAVE_DATA["width"], SAVE_DATA["height"], self.map.width, self.map.height)
+            self.textbox = Textbox(self)
+            self.ui = UI(self, 10)
+        self.prepare_next_text()
+        self.draw_tower_bases_wrapper()
+        self.make_stripped_path_wrapper()
+        self.mouse_pos = (0, 0)
+        
+        self.calculate_path()
+
+    def load_map(self):
+        # sets up the starts, goals and walls from the map's objects
+        # and returns the arrays a Pathfinder for this map is made from
+        self.obstacles = pg.sprite.Group()
+        self.goals = pg.sprite.Group()
         self.start_data = []
         self.map.clear_map()
-        
-        self.time_passed = 0
 
         width = round(self.map.width / self.map.tilesize)
         height = round(self.map.height / self.map.tilesize)
@@ -167,34 +238,14 @@ class Game(Display):
                 for y in range(tile_from_xcoords(start.height, self.map.tilesize)):
                     self.map.set_valid_tower_tile(tile_from_xcoords(start.x, self.map.tilesize) + x, tile_from_xcoords(start.y, self.map.tilesize) + y, 0)
 
-        self.pathfinder = Pathfinder(
-            arteries = arteries,
-            artery_entrances = artery_entrances,
-            veins = veins,
-            vein_entrances = vein_entrances,
-            base_map = self.map.get_map())
-        
-        songs = [MILD_LEVEL_MUSIC, ACUTE_LEVEL_MUSIC, SEVERE_LEVEL_MUSIC]
-        pg.mixer.music.set_endevent()
-        pg.mixer.music.stop()
-        pg.mixer.music.load(songs[self.difficulty][self.level // 11])
-        if self.difficulty == 2 and self.level // 11 == 1: # only for late severe levels
-            pg.mixer.music.play(0) # have to make the song play 0 times for some reason...
-            pg.mixer.music.set_endevent(pg.USEREVENT + 3)
-        else:
-            pg.mixer.music.play(-1)
-        
-        self.node_is_in_path = [[]]
-        self.camera = Camera(SAVE_DATA["width"], SAVE_DATA["height"], self.map.width, self.map.height)
-        self.pathfinder.clear_nodes(self.map.get_map())
-        self.textbox = Textbox(self)
-        self.ui = UI(self, 10)
-        self.prepare_next_text()
-        self.draw_tower_bases_wrapper()
-        self.make_stripped_path_wrapper()
-        self.mouse_pos = (0, 0)
-        
-        self.calculate_path()
+        return {
+            "arteries": arteries,
+            "artery_entrances": artery_entrances,
+            "veins": veins,
+            "vein_entrances": vein_entrances,
+            "base_map": self.map.get_map(),
+            "goals": self.get_goal_nodes()
+        }
 
     def update(self):
         if self.new_enemy_box.show:
@@ -202,13 +253,9 @@ class Game(Display):
 
         else:
             # update portion of the game loop
-            for start in self.starts:
-                start.update()
-            self.enemies.update()
-            self.towers.update()
-            self.projectiles.update()
+            self.check_paths()
+            self.run_ticks()
             self.ui.update()
-            self.explosions.update()
 
             keys = pg.key.get_pressed()
             if keys[pg.K_LEFT]:
@@ -233,18 +280,40 @@ class Game(Display):
                     TEXT_SCROLL_SFX.stop()
                 else:
                     self.textbox.update()
-                return
 
-            if not self.in_a_wave and self.wave > 0:
-                self.time_passed += self.clock.get_time()
-                if self.time_passed >= WAVE_DELAY * 1000:
-                    self.start_next_wave()
+    def run_ticks(self):
+        # The game moves on in fixed steps of TICK_TIME no matter how long each frame took, so the same inputs always play out
+        # the same way; a faster game speed just takes more of those steps per frame instead of longer ones
+        self.accumulator += min(self.clock.get_time(), MAX_FRAME_TIME) * GAME_SPEEDS[self.speed]
+        while self.accumulator >= TICK_TIME:
+            self.accumulator -= TICK_TIME
+            if not self.tick():
+                self.accumulator = 0 # don't catch up on the time spent stopped
+                break
+
+    def tick(self):
+        # one step of the game, returns False if the game has stopped for something (a new enemy box)
+        self.ticks += 1
+        self.scheduler.update(TICK_TIME)
+        self.enemy_store.update(TICK_TIME / 1000)
+        self.towers.update()
+        self.projectile_store.update(TICK_TIME / 1000)
+
+        if self.text:
+            return True
 
-            if self.in_a_wave and self.current_wave_done():
-                    if self.wave < self.max_wave:
-                        self.prepare_next_text()
-                    elif len(self.enemies) == 0:
-                        pg.event.post(self.game_done_event)
+        if not self.in_a_wave and self.wave > 0:
+            self.time_passed += TICK_TIME
+            if self.time_passed >= WAVE_DELAY * 1000:
+                self.start_next_wave()
+
+        if self.in_a_wave and self.current_wave_done():
+                if self.wave < self.max_wave:
+                    self.prepare_next_text()
+                elif len(self.enemies) == 0 and not self.headless:
+                    pg.event.post(self.game_done_event)
+
+        return self.headless or not self.new_enemy_box.show
 
     def current_wave_done(self):
         for start in self.starts:
@@ -255,7 +324,7 @@ class Game(Display):
     def prepare_next_text(self):
         # Wave has text --> text (and the next wave) don't appear until previous wave is all dead
         # Wave has no text --> next wave starts counting down immediately after previous wave is done spawning
-        if not SAVE_DATA["skip_text"] and self.level_data["texts"][self.difficulty].get(str(self.wave + 1)) != None:
+        if not self.headless and not SAVE_DATA["skip_text"] and self.level_data["texts"][self.difficulty].get(str(self.wave + 1)) != None:
             if len(self.enemies) == 0:
                 self.text = True
                 self.texts = self.level_data["texts"][self.difficulty][str(self.wave + 1)].copy()
@@ -266,7 +335,8 @@ class Game(Display):
                 self.textbox.toggle(True)
         else:
             self.text = False
-            self.textbox.enabled = False
+            if not self.headless:
+                self.textbox.enabled = False
             self.prepare_next_wave()
 
     def prepare_next_wave(self):
@@ -276,14 +346,16 @@ class Game(Display):
                 self.protein += i["enemy_count"] * ENEMY_DATA[i["enemy_type"]]["protein"]
 
             self.wave += 1
-            self.ui.wave = self.wave
+            if not self.headless:
+                self.ui.wave = self.wave
 
         if self.wave == self.max_wave:
             return
 
         self.in_a_wave = False
-        self.ui.set_next_wave_btn(True)
-        self.ui.generate_next_wave_wrapper()
+        if not self.headless:
+            self.ui.set_next_wave_btn(True)
+            self.ui.generate_next_wave_wrapper()
         self.time_passed = 0
 
         self.starts.clear()
@@ -296,14 +368,15 @@ class Game(Display):
 
     def start_next_wave(self):
         self.in_a_wave = True
-        self.ui.set_next_wave_btn(False)
-        self.ui.wave = self.wave
-        self.ui.generate_header()
-        self.ui.generate_next_wave_wrapper()
+        if not self.headless:
+            self.ui.set_next_wave_btn(False)
+            self.ui.wave = self.wave
+            self.ui.generate_header()
+            self.ui.generate_next_wave_wrapper()
 
         for start in self.starts:
             start.enable_spawning()
-            if start.enemy_type not in SAVE_DATA["seen_enemies"]:
+            if not self.headless and start.enemy_type not in SAVE_DATA["seen_enemies"]:
                 SAVE_DATA["seen_enemies"].append(start.enemy_type)
                 self.new_enemy_box.show_new_enemy(start.enemy_type)
 
@@ -316,6 +389,9 @@ class Game(Display):
 
         temp_surf.blit(self.tower_bases_surf, self.tower_bases_surf.get_rect())
 
+        if self.show_advisor:
+            temp_surf.blit(self.advisor_surf, (0, 0))
+
         for tower in self.towers:
             if tower.area_of_effect or not tower.rotating:
                 continue
@@ -372,73 +448,109 @@ class Game(Display):
         return self
 
     def make_stripped_path_wrapper(self):
-        self.make_stripped_path(self.map_img)
-
-    def make_stripped_path(self, surface): # used to draw the path for the enemies in the current wave
-        self.path_surf = pg.Surface((surface.get_width(), surface.get_height()), pg.SRCALPHA)
-        self.path_surf.fill((0, 0, 0, 0))
+        if self.headless:
+            return
+        self.path_surf = self.make_stripped_path(self.map_img)
 
-        done = []
-        for start in self.starts:
-            if [start.start, ENEMY_DATA[start.enemy_type]["flying"]] in done:
-                continue
-            done.append([start.start, ENEMY_DATA[start.enemy_type]["flying"]])
+    def get_start_tiles(self, starts): # the start tiles each kind of enemy in the wave sets off from
+        start_tiles = []
+        for start in starts:
+            flying = ENEMY_DATA[start.enemy_type]["flying"]
             xpos = tile_from_xcoords(start.rect.x, self.map.tilesize)
             ypos = tile_from_xcoords(start.rect.y, self.map.tilesize)
-            flying = done[-1][1]
             for x in range(tile_from_xcoords(start.rect.w, self.map.tilesize)):
                 for y in range(tile_from_xcoords(start.rect.h, self.map.tilesize)):
-                    path = self.pathfinder.astar(((xpos + x, ypos + y), 0), self.goals, flying)
-
-                    self.stripped_path = []
-                    index = 0
-                    for i, node in enumerate(path):
-                        if (i < len(path) - 1):
-                            diff_x_after = path[i + 1][0][0] - node[0][0]
-                            diff_y_after = path[i + 1][0][1] - node[0][1]
-                            if (diff_x_after == 0 and diff_y_after == 0):
-                                continue
-                        self.stripped_path.append(node[0])
-
-                    for i, node in enumerate(self.stripped_path):
-                        if self.map.is_start_tile(node[0], node[1]):
-                            continue
-
-                        if (i > 0 and i < len(self.stripped_path) - 1):
-                            image = None
-                            diff_x_before = self.stripped_path[i - 1][0] - node[0]
-                            diff_x_after = self.stripped_path[i + 1][0] - node[0]
-                            diff_y_before = self.stripped_path[i - 1][1] - node[1]
-                            diff_y_after = self.stripped_path[i + 1][1] - node[1]
-
-                            if diff_x_before == 0 and diff_x_after == 0:  # up <--> down
-                                image = PATH_VERTICAL_IMG
-                            elif diff_y_before == 0 and diff_y_after == 0:  # left <--> right
-                                image = PATH_HORIZONTAL_IMG
-                            elif (diff_x_before == 1 and diff_y_after == 1) or (
-                                    diff_y_before == 1 and diff_x_after == 1):  # right <--> down
-                                image = PATH_CORNER1_IMG
-                            elif (diff_x_before == -1 and diff_y_after == 1) or (
-                                    diff_y_before == 1 and diff_x_after == -1):  # left <--> down
-                                image = PATH_CORNER2_IMG
-                            elif (diff_x_before == 1 and diff_y_after == -1) or (
-                                    diff_y_before == -1 and diff_x_after == 1):  # right <--> up
-                                image = PATH_CORNER3_IMG
-                            elif (diff_x_before == -1 and diff_y_after == -1) or (
-                                    diff_y_before == -1 and diff_x_after == -1):  # left <--> up
-                                image = PATH_CORNER4_IMG
-                            else:
-                                print("PATH DRAWING ERROR")  # this should never occur
-
-                            if flying:
-                                new_image = image.copy()
-                                new_image.fill(GREEN, None, pg.BLEND_RGBA_MULT)
-                            else:
-                                new_image = image
-                            self.path_surf.blit(new_image, pg.Rect(node[0] * self.map.tilesize, node[1] * self.map.tilesize,
-                                                               self.map.tilesize, self.map.tilesize))
+                    if (((xpos + x, ypos + y), 0), flying) not in start_tiles:
+                        start_tiles.append((((xpos + x, ypos + y), 0), flying))
+        return start_tiles
+
+    def make_stripped_path(self, surface, start_routes = None): # used to draw the path for the enemies in the current wave
+        # start_routes is passed in when the routes were worked out by the path worker
+        if start_routes == None:
+            start_routes = get_start_routes(self.pathfinder, self.get_start_tiles(self.starts))
+        path_surf = pg.Surface((surface.get_width(), surface.get_height()), pg.SRCALPHA)
+        path_surf.fill((0, 0, 0, 0))
+
+        for path, flying in start_routes:
+            stripped_path = []
+            index = 0
+            for i, node in enumerate(path):
+                if (i < len(path) - 1):
+                    diff_x_after = path[i + 1][0][0] - node[0][0]
+                    diff_y_after = path[i + 1][0][1] - node[0][1]
+                    if (diff_x_after == 0 and diff_y_after == 0):
+                        continue
+                stripped_path.append(node[0])
+
+            for i, node in enumerate(stripped_path):
+                if self.map.is_start_tile(node[0], node[1]):
+                    continue
+
+                if (i > 0 and i < len(stripped_path) - 1):
+                    image = None
+                    diff_x_before = stripped_path[i - 1][0] - node[0]
+                    diff_x_after = stripped_path[i + 1][0] - node[0]
+                    diff_y_before = stripped_path[i - 1][1] - node[1]
+                    diff_y_after = stripped_path[i + 1][1] - node[1]
+
+                    if diff_x_before == 0 and diff_x_after == 0:  # up <--> down
+                        image = PATH_VERTICAL_IMG
+                    elif diff_y_before == 0 and diff_y_after == 0:  # left <--> right
+                        image = PATH_HORIZONTAL_IMG
+                    elif (diff_x_before == 1 and diff_y_after == 1) or (
+                            diff_y_before == 1 and diff_x_after == 1):  # right <--> down
+                        image = PATH_CORNER1_IMG
+                    elif (diff_x_before == -1 and diff_y_after == 1) or (
+                            diff_y_before == 1 and diff_x_after == -1):  # left <--> down
+                        image = PATH_CORNER2_IMG
+                    elif (diff_x_before == 1 and diff_y_after == -1) or (
+                            diff_y_before == -1 and diff_x_after == 1):  # right <--> up
+                        image = PATH_CORNER3_IMG
+                    elif (diff_x_before == -1 and diff_y_after == -1) or (
+                            diff_y_before == -1 and diff_x_after == -1):  # left <--> up
+                        image = PATH_CORNER4_IMG
+                    else:
+                        print("PATH DRAWING ERROR")  # this should never occur
+
+                    if flying:
+                        new_image = image.copy()
+                        new_image.fill(GREEN, None, pg.BLEND_RGBA_MULT)
+                    else:
+                        new_image = image
+                    path_surf.blit(new_image, pg.Rect(node[0] * self.map.tilesize, node[1] * self.map.tilesize,
+                                                       self.map.tilesize, self.map.tilesize))
+
+        return path_surf
+
+    def make_advisor_surf_wrapper(self):
+        if self.headless:
+            return
+        self.advisor_surf = self.make_advisor_surf(self.pathfinder.get_placement_gains(self.get_start_nodes()))
+
+    def make_advisor_surf(self, gains): # shows how much longer a tower on each tile would make the enemies' route
+        surf = pg.Surface((self.map_rect.w, self.map_rect.h), pg.SRCALPHA)
+        surf.fill((0, 0, 0, 0))
+        if len(gains) == 0:
+            return surf
+
+        # a tile is marked red if it would cut any start off, otherwise it shows the most any start's route gets longer
+        blocked = (gains == -1).any(axis = 0)
+        longest = gains.max(axis = 0)
+        for x, y in zip(*numpy.nonzero(blocked | (longest > 0))):
+            if self.map.is_valid_tower_tile(x, y) == 0:
+                continue
+            rect = pg.Rect(x * self.map.tilesize, y * self.map.tilesize, self.map.tilesize, self.map.tilesize)
+            if blocked[x][y]:
+                surf.fill(HALF_RED, rect)
+            else:
+                surf.fill(HALF_GREEN, rect)
+                text = self.advisor_font.render(str(longest[x][y]), 1, WHITE)
+                surf.blit(text, text.get_rect(center = rect.center))
+        return surf
 
     def draw_tower_bases_wrapper(self):
+        if self.headless:
+            return
         self.draw_tower_bases(self)
 
     def draw_tower_bases(self, surface):
@@ -481,23 +593,11 @@ class Game(Display):
 
             if validity == 1:
                 tower_img.fill(HALF_WHITE, None, pg.BLEND_RGBA_MULT)
+            elif validity == -1 and self.paths_pending:
+                # the path worker hasn't worked out the blocking nodes yet, so this isn't cached until it has
+                tower_img.fill(HALF_WHITE, None, pg.BLEND_RGBA_MULT)
             elif validity == -1:
-                result = True
-                if self.node_is_in_path[tower_tile[0]][tower_tile[1]]:
-                    self.map.change_node(tower_tile[0], tower_tile[1], 1)
-                    self.pathfinder.clear_nodes(self.map.get_map())
-                    for start in self.start_data:
-                        path = self.pathfinder.astar(((tile_from_xcoords(start.x, self.map.tilesize),
-                                                       tile_from_xcoords(start.y, self.map.tilesize)), 0),
-                                                     self.goals, False)
-
-                        if not path:
-                            result = False
-                            break
-                    self.map.change_node(tower_tile[0], tower_tile[1], 0)
-                    self.pathfinder.clear_nodes(self.map.get_map())
-                            
-                if result:
+                if not self.pathfinder.get_blocking_nodes(self.get_start_nodes())[tower_tile[0]][tower_tile[1]]:
                     tower_img.fill(HALF_WHITE, None, pg.BLEND_RGBA_MULT)
                     self.map.set_valid_tower_tile(tower_tile[0], tower_tile[1], 1)
                 else:
@@ -519,52 +619,148 @@ class Game(Display):
     def get_cause_of_death(self):
         return self.cause_of_death
 
-    def calculate_path(self): 
-        paths = []
-        valid_path = True
-        
+    def load_flying_paths(self):
+        # flying enemies ignore towers, so their routes only depend on the map file and are worked out once per level
+        filename = path.join(PATH_CACHE_FOLDER, self.map.hash + ".json")
+        if self.pathfinder.load_flying_paths(filename):
+            return
+
+        for node in self.get_start_nodes():
+            self.pathfinder.astar(node, True)
+        try:
+            if not path.isdir(PATH_CACHE_FOLDER):
+                mkdir(PATH_CACHE_FOLDER)
+            self.pathfinder.save_flying_paths(filename)
+        except OSError:
+            pass # the routes are still cached in memory for this level
+
+    def get_goal_nodes(self):
+        return [goal_node for goal in self.goals for goal_node in goal.get_nodes()]
+
+    def get_start_nodes(self):
+        start_nodes = []
         for start in self.start_data:
             xpos = tile_from_xcoords(start.x, self.map.tilesize)
             ypos = tile_from_xcoords(start.y, self.map.tilesize)
             for x in range(tile_from_xcoords(start.w, self.map.tilesize)):
                 for y in range(tile_from_xcoords(start.h, self.map.tilesize)):
-                    path = self.pathfinder.astar(((xpos + x, ypos + y), 0), self.goals, False)
-                    if path == False:
-                        valid_path = False
-                        break
-                    else:
-                        paths.append(path)
-                        
-                if not valid_path:
-                    break
-            if not valid_path:
-                break
-        
+                    start_nodes.append(((xpos + x, ypos + y), 0))
+        return start_nodes
+
+    def reset_valid_tower_tiles(self):
+        self.map.reset_valid_tower_tiles()
+        for node, _ in self.get_start_nodes():
+            self.map.set_valid_tower_tile(node[0], node[1], 0)
+
+    def recalculate_paths(self):
+        # called after the towers change (and the pathfinder has been told about it)
+        # enemy routes, the drawn path and the tower preview's blocking nodes are worked out by the path worker,
+        # enemies keep following their old routes until check_paths picks up the result
+        if self.path_worker == None:
+            self.make_stripped_path_wrapper()
+            if self.show_advisor:
+                self.make_advisor_surf_wrapper()
+            for enemy in self.enemies:
+                enemy.recreate_path()
+            return
+
+        # the worker only gets plain copies of what it needs, the surfaces are drawn from its results in check_paths
+        nodes = [enemy.new_node for enemy in self.enemies if not enemy.flying]
+        start_tiles = self.get_start_tiles(self.starts)
+        start_nodes = self.get_start_nodes()
+        show_advisor = self.show_advisor
+        self.path_version = self.path_worker.submit(self.map.get_map(),
+            lambda pathfinder: work_out_paths(pathfinder, nodes, start_tiles, start_nodes, show_advisor))
+        self.paths_pending = True
+
+    def check_paths(self, wait = False):
+        # a replay waits for the results on the tick they were picked up on in the recorded game
+        if not self.paths_pending:
+            return
+        result = self.path_worker.poll(wait)
+        if result == None or result[0] != self.path_version:
+            return
+
+        self.paths_pending = False
+        self.recorder.record_paths()
+        routes, blocking, start_tiles, start_routes, gains = result[1]
+        self.pathfinder.blocking = blocking
+        self.reset_valid_tower_tiles() # tiles the preview checked against the old towers have to be checked again
+        if start_tiles == self.get_start_tiles(self.starts):
+            self.path_surf = self.make_stripped_path(self.map_img, start_routes)
+        else: # the next wave was set up in the meantime
+            self.make_stripped_path_wrapper()
+        if gains is not None:
+            self.advisor_surf = self.make_advisor_surf(gains)
+        elif self.show_advisor: # it was turned on after the snapshot
+            self.make_advisor_surf_wrapper()
+        for enemy in self.enemies:
+            if enemy.flying:
+                continue
+            path = routes.get(enemy.new_node, False)
+            if path == False: # it has moved on to another node since the snapshot (or spawned after it)
+                enemy.recreate_path()
+            else:
+                enemy.set_path(path)
+
+    def calculate_path(self): 
+        path_nodes = self.pathfinder.get_path_nodes(self.get_start_nodes())
+        if path_nodes is False:
+            return False
+
         # update which nodes in a path
-        if valid_path:
-            self.node_is_in_path = [[False for i in range(len(self.map.get_map()[0]))] for j in range(len(self.map.get_map()))]
-            for path in paths:
-                for node in path:
-                    if node[1] == 0: # not artery or vein
-                        self.node_is_in_path[node[0][0]][node[0][1]] = True
-        
-        return valid_path
+        self.node_is_in_path = path_nodes
+        return True
+
+    def save_replay(self):
+        try:
+            if not path.isdir(REPLAY_FOLDER):
+                mkdir(REPLAY_FOLDER)
+            self.recorder.save(path.join(REPLAY_FOLDER, "{}_{}.json".format(self.level, time.strftime("%Y%m%d_%H%M%S"))))
+            BTN_2_SFX.play()
+        except OSError:
+            WRONG_SELECTION_SFX.play()
+
+    def place_tower(self, x_coord, y_coord, name):
+        # the tile has to have been checked and set as a wall in the map already
+        # returns the new tower, or None if it would block the enemies off (and the tile is freed again)
+        self.pathfinder.update_nodes(self.map.get_map())
+
+        if not self.calculate_path():
+            self.map.change_node(x_coord, y_coord, 0)
+            self.pathfinder.update_nodes(self.map.get_map())
+            return None
+
+        new_tower = Tower(
+            game=self,
+            x=x_coord * self.map.tilesize,
+            y=y_coord * self.map.tilesize,
+            name=name)
+        self.map.add_tower(x_coord, y_coord, new_tower)
+        for start in self.start_data:
+            for x in range(tile_from_xcoords(start.width, self.map.tilesize)):
+                for y in range(tile_from_xcoords(start.height, self.map.tilesize)):
+                    self.map.set_valid_tower_tile(tile_from_xcoords(start.x, self.map.tilesize) + x,
+                                                  tile_from_xcoords(start.y, self.map.tilesize) + y, 0)
+        self.protein -= round(TOWER_DATA[name]["stages"][0]["upgrade_cost"] * (1 + self.difficulty * 0.25))
+
+        self.draw_tower_bases_wrapper()
+        self.recalculate_paths()
+        return new_tower
 
     def sell_tower(self, tower, tower_coords):
         self.map.remove_tower(tower_coords[0], tower_coords[1])
         tower.on_remove()
         tower.kill()
-        self.pathfinder.clear_nodes(self.map.get_map())
+        self.pathfinder.update_nodes(self.map.get_map())
         for start in self.start_data:
             for x in range(tile_from_xcoords(start.width, self.map.tilesize)):
                 for y in range(tile_from_xcoords(start.height, self.map.tilesize)):
                     self.map.set_valid_tower_tile(tile_from_xcoords(start.x, self.map.tilesize) + x,
                                                   tile_from_xcoords(start.y, self.map.tilesize) + y,
                                                   0)
-        self.make_stripped_path_wrapper()
         self.draw_tower_bases_wrapper()
-        for enemy in self.enemies:
-            enemy.recreate_path()
+        self.recalculate_paths()
         for stage in range(tower.stage + 1):
             self.protein += round(
                 TOWER_DATA[tower.name]["stages"][stage]["upgrade_cost"] * (1 + self.difficulty * 0.25) / 2)
@@ -579,11 +775,12 @@ class Game(Display):
         if self.protein >= round(TOWER_DATA[tower.name]["stages"][tower.stage + 1]["upgrade_cost"] * (
                 1 + self.difficulty * 0.25)):
             tower.upgrade()
-            self.draw_tower_bases(self)
-            BUY_SFX.play()
-            self.ui.generate_header()
-            self.ui.generate_body_wrapper()
-        else:
+            self.draw_tower_bases_wrapper()
+            if not self.headless:
+                BUY_SFX.play()
+                self.ui.generate_header()
+                self.ui.generate_body_wrapper()
+        elif not self.headless:
             WRONG_SELECTION_SFX.play()
             
     def select_tower(self, index):
@@ -599,6 +796,8 @@ class Game(Display):
                 self.current_tower = self.available_towers[index]
 
     def event(self, event):
+        self.recorder.record_event(event)
+
         if event.type == pg.MOUSEBUTTONDOWN:
             if event.button == 1:
                 if self.new_enemy_box.enabled:
@@ -669,38 +868,21 @@ class Game(Display):
                     self.current_tower = None
                     return -1
 
-                self.pathfinder.clear_nodes(self.map.get_map())
-
-                if not self.calculate_path():
-                    self.map.change_node(x_coord, y_coord, 0)
-                    self.pathfinder.clear_nodes(self.map.get_map())
+                # the tower preview usually catches towers that would block the enemies off first,
+                # but the result can't depend on whether the tile was drawn or the game couldn't be replayed
+                if self.place_tower(x_coord, y_coord, self.current_tower) == None:
+                    WRONG_SELECTION_SFX.play()
+                    self.current_tower = None
                     return -1
 
-                new_tower = Tower(
-                    game=self,
-                    x=round_to_tilesize(pos[0], self.map.tilesize),
-                    y=round_to_tilesize(pos[1], self.map.tilesize),
-                    name=self.current_tower)
-                self.map.add_tower(x_coord, y_coord, new_tower)
-                for start in self.start_data:
-                    for x in range(tile_from_xcoords(start.width, self.map.tilesize)):
-                        for y in range(tile_from_xcoords(start.height, self.map.tilesize)):
-                            self.map.set_valid_tower_tile(tile_from_xcoords(start.x, self.map.tilesize) + x,
-                                                          tile_from_xcoords(start.y, self.map.tilesize) + y, 0)
                 cost = round(TOWER_DATA[self.current_tower]["stages"][0]["upgrade_cost"] * (1 + self.difficulty * 0.25))
-                self.protein -= cost
-                if not pg.key.get_pressed()[pg.K_LSHIFT] or self.protein < cost:
+                if not pg.key.get_mods() & pg.KMOD_LSHIFT or self.protein < cost:
                     self.current_tower = None
 
                 BUY_SFX.play()
                 self.ui.generate_header()
                 self.ui.generate_body_wrapper()
 
-                self.make_stripped_path_wrapper()
-                self.draw_tower_bases_wrapper()
-                for enemy in self.enemies:
-                    enemy.recreate_path()
-
             elif event.button == 2 or event.button == 3:
                 mouse_pos = self.camera.correct_mouse(event.pos)
                 tower_coords = tile_from_coords(mouse_pos[0], self.map.tilesize), tile_from_coords(
@@ -722,6 +904,18 @@ class Game(Display):
             if event.key == pg.K_ESCAPE:
                 pg.mixer.music.pause()
                 return "pause"
+            elif event.key == pg.K_a: # placement advisor
+                self.show_advisor = not self.show_advisor
+                if self.show_advisor:
+                    self.make_advisor_surf_wrapper()
+                return -1
+            elif event.key == pg.K_F5:
+                self.save_replay()
+                return -1
+            elif event.key == pg.K_f: # game speed
+                self.speed = (self.speed + 1) % len(GAME_SPEEDS)
+                self.ui.generate_header_wrapper()
+                return -1
             elif self.key_map.get(event.key) != None:
                 tower_ind = self.key_map[event.key]
                 
@@ -756,7 +950,6 @@ class Game(Display):
     
 class Start():
     def __init__(self, game, start, enemy_type, enemy_count, spawn_delay, spawn_rate):
-        self.clock = game.clock
         self.game = game
         self.start = start
         self.rect = game.start_data[start]
@@ -770,34 +963,31 @@ class Start():
         self.spawn_delay = spawn_delay
         self.spawn_rate = spawn_rate
         
-        self.time_passed = 0
-        self.next_spawn = self.spawn_delay * 1000
-        
         self.done_spawning = False
         self.start_spawning = False
 
-    def update(self):
-        if self.start_spawning:
-            self.time_passed += self.clock.get_time()
-            
-        if (self.time_passed >= self.next_spawn and (self.infinity or self.enemy_count > 0)):
+    def spawn(self): # called by the game's scheduler
+        if self.infinity or self.enemy_count > 0:
             tilesize = self.game.map.tilesize
             self.game.enemies.add(Enemy(
                 game = self.game,
-                x = self.rect.x + ENEMY_DATA[self.enemy_type]["image"].get_width() + tilesize * random.randint(0, self.rect.w // tilesize - 1),
-                y = self.rect.y + ENEMY_DATA[self.enemy_type]["image"].get_height() + tilesize * random.randint(0, self.rect.h // tilesize - 1),
+                x = self.rect.x + ENEMY_DATA[self.enemy_type]["image"].get_width() + tilesize * self.game.random.randint(0, self.rect.w // tilesize - 1),
+                y = self.rect.y + ENEMY_DATA[self.enemy_type]["image"].get_height() + tilesize * self.game.random.randint(0, self.rect.h // tilesize - 1),
                 name = self.enemy_type))
-            self.next_spawn = self.spawn_rate * 1000
-            self.time_passed = 0
             self.enemy_count -= 1
             
             if self.enemy_count == 0:
                 self.done_spawning = True
+            else:
+                # from when this spawn was due, so spawns quicker than a tick can come out together in the same one
+                self.game.scheduler.schedule_at(self.game.scheduler.due + self.spawn_rate * 1000, self.spawn)
     
     def is_done_spawning(self):
         return self.done_spawning
     
     def enable_spawning(self):
+        if not self.start_spawning:
+            self.game.scheduler.schedule(self.spawn_delay * 1000, self.spawn)
         self.start_spawning = True
     
     def get_rect(self):
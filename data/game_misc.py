@@ -86,7 +86,10 @@ class UI:
 
     def generate_header(self):
         # Draws waves, lives, protein text
-        waves_text = self.font.render("Wave {}/{}".format(min(self.wave + 1, self.max_wave), self.max_wave), 1, WHITE)
+        waves_text = "Wave {}/{}".format(min(self.wave + 1, self.max_wave), self.max_wave)
+        if self.game.speed > 0:
+            waves_text += " (x{})".format(GAME_SPEEDS[self.game.speed])
+        waves_text = self.font.render(waves_text, 1, WHITE)
         width = max(waves_text.get_width() + self.offset * 2, 225)
         if width != self.width:
             self.width = width
@@ -335,24 +338,25 @@ class Textbox(pg.Surface):
 
 class Explosion(pg.sprite.Sprite):
     def __init__(self, game, x, y, rad, color = 0):
+        if game.headless: # explosions are only drawn, an EnemyExplosion has already done its damage by now
+            return
         super().__init__(game.explosions)
-        self.clock = game.clock
+        self.scheduler = game.scheduler
         self.x = x - rad / 2
         self.y = y - rad / 2
         self.rad = rad
-        self.state = 0
+        self.start_time = self.scheduler.now
         self.color = AURA_COLORS[color]
-        self.surf = pg.Surface((rad, rad)).convert_alpha()
+        self.load_image()
+        self.scheduler.schedule(EXPLOSION_TIME * 1000, self.kill)
 
-    def update(self):
-        passed_time = self.clock.get_time() / 1000
-        self.state += passed_time / EXPLOSION_TIME
-        if self.state >= 1:
-            self.kill()
-        else:
-            self.surf.fill(pg.Color(self.color.r, self.color.g, self.color.b, round(127 * self.state)))
+    def load_image(self):
+        self.surf = pg.Surface((self.rad, self.rad)).convert_alpha()
 
     def get_surf(self):
+        # the fade only has to be worked out when the explosion is drawn
+        state = min((self.scheduler.now - self.start_time) / (EXPLOSION_TIME * 1000), 1)
+        self.surf.fill(pg.Color(self.color.r, self.color.g, self.color.b, round(127 * state)))
         return self.surf
 
 class NewEnemyBox(pg.Surface):
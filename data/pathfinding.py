@@ -1,5 +1,13 @@
+import json
 import numpy
+import threading
 from heapq import *
+from collections import deque, OrderedDict
+from itertools import islice
+
+# routes saved to disk are only trusted if they were worked out by the same version of this code (see save_flying_paths)
+# goes up by one with any change here that could give different routes, since a built game doesn't have its source to check
+PATH_CACHE_VERSION = 1
 
 def manhattan(a, b): # technically it's Euclidean distance
     return ((a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2) ** 0.5
@@ -7,18 +15,356 @@ def manhattan(a, b): # technically it's Euclidean distance
 def heuristic(a, b):
     return abs(b[0] - a[0]) + abs(b[1] - a[1])
 
+def arc_lengths(route):
+    # how far along the route each of its nodes is, in tiles (going between layers doesn't move anywhere)
+    lengths = [0]
+    for node, next_node in zip(route, route[1:]):
+        lengths.append(lengths[-1] + (node[0] != next_node[0]))
+    return tuple(lengths)
+
+class Path():
+    # Read-only view of a cached route from one of its nodes onwards
+    # Every node on a route shares the same tuple, so nothing has to be copied when a path is handed out
+    # The route is followed as a polyline through the middle of each node's tile, with lengths from arc_lengths
+    def __init__(self, route, start, lengths):
+        self.route = route
+        self.start = start
+        self.lengths = lengths
+
+    def __len__(self):
+        return len(self.route) - self.start
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        return self.route[self.start + index]
+
+    def __iter__(self):
+        return islice(self.route, self.start, None)
+
+    def get_length(self, index = 0):
+        # how many tiles there are to go along the route from the node at index to the end
+        return self.lengths[-1] - self.lengths[self.start + index]
+
+class Wavefront():
+    # Distance to the goals for every cell of every layer at once
+    # Each step grows the whole frontier by one tile with array shifts instead of popping nodes one at a time
+    # Arrays are indexed [layer + 2][x][y], which flattens to the same node ids as Pathfinder.compile_graph
+    def __init__(self, *args, **kwargs):
+        self.base_map = numpy.array(kwargs.get('base_map'))
+        self.shape = (5,) + self.base_map.shape
+        self.open = numpy.zeros(self.shape, dtype = bool) # walkable cells of every layer but the ground
+        for layer, name in ((1, 'artery_entrances'), (2, 'arteries'), (-1, 'vein_entrances'), (-2, 'veins')):
+            array = kwargs.get(name, None)
+            if array is not None:
+                self.open[layer + 2] = numpy.array(array) == 0
+
+        # (axis, offset) of every move, in the same order as Pathfinder.neighbors so ties go the same way
+        self.moves = [(2, 1), (2, -1), (1, 1), (1, -1), (0, -1), (0, 1)]
+
+    def shifted(self, axis, offset):
+        # slices of the cells that have a neighbor in that direction, and of those neighbors
+        # the Ellipsis lets the same slices be used on a whole batch of (layer, x, y) arrays (see spread)
+        src = [slice(None)] * 3
+        dst = [slice(None)] * 3
+        src[axis] = slice(0, -1) if offset == 1 else slice(1, None)
+        dst[axis] = slice(1, None) if offset == 1 else slice(0, -1)
+        return (Ellipsis,) + tuple(src), (Ellipsis,) + tuple(dst)
+
+    def solve(self, ground, goal_nodes):
+        # returns the distance of every cell to the closest goal node (-1 if it can't get there)
+        walkable = self.open.copy()
+        walkable[2] = numpy.array(ground) == 0
+        dist = numpy.full(self.shape, -1, dtype = numpy.int32)
+        frontier = numpy.zeros(self.shape, dtype = bool)
+        for (x, y), layer in goal_nodes:
+            frontier[layer + 2][x][y] = True
+        dist[frontier] = 0
+
+        shifts = [self.shifted(axis, offset) for axis, offset in self.moves]
+        step = 0
+        while frontier.any():
+            step += 1
+            grown = numpy.zeros(self.shape, dtype = bool)
+            for src, dst in shifts:
+                grown[dst] |= frontier[src]
+            frontier = grown & walkable & (dist == -1)
+            dist[frontier] = step
+
+        return dist
+
+    def spread(self, walkable, dist, targets = None, step = 1):
+        # grows a batch of distance arrays (batch, layer, x, y) in place from the cells they already have,
+        # so each one can start from a different map and from whatever part of its distances is already known
+        # every cell at distance step - 1 is treated as frontier, which is only right if all the cells closer than
+        # the known ones are known too
+        # targets is a list of flat (layer, x, y) ids, stops once every one of them is reached in every array
+        # step can skip ahead when every cell up to step - 1 is known already
+        shifts = [self.shifted(axis, offset) for axis, offset in self.moves]
+        flat = dist.reshape(len(dist), -1)
+        last = dist.max()
+        while True:
+            if targets is not None and (flat[:, targets] >= 0).all():
+                break
+            frontier = dist == step - 1
+            if step > last and not frontier.any():
+                break
+
+            grown = numpy.zeros(dist.shape, dtype = bool)
+            for src, dst in shifts:
+                grown[dst] |= frontier[src]
+            dist[grown & walkable & (dist == -1)] = step
+            step += 1
+
+        return dist
+
+    def get_parents(self, dist):
+        # flat id of the node each cell moves to next (-1 for goals and cells that can't get anywhere)
+        ids = numpy.arange(dist.size).reshape(self.shape)
+        parents = numpy.full(self.shape, -1, dtype = numpy.int64)
+        for axis, offset in self.moves:
+            src, dst = self.shifted(axis, offset)
+            found = (dist[src] > 0) & (dist[dst] == dist[src] - 1) & (parents[src] == -1)
+            parents[src][found] = ids[dst][found]
+
+        return parents
+
+class Hierarchy():
+    # HPA* abstraction of the layered grid for big maps
+    # The ground is cut into cluster_size x cluster_size clusters (with all five layers over them), every open stretch
+    # of border between two clusters gets one or two entrances and the routes between the entrances of a cluster are
+    # worked out ahead of time, so a search only has to go from entrance to entrance
+    # A tower only changes the cluster it's in (and the borders around it), so that's all that gets rebuilt
+    # It only pays off for a few searches from the same starts on very big maps: once every walking enemy is
+    # re-routed after a placement, the plain A* is as fast or faster up to 160x160, and the game's flow field is far faster
+    # still, so it's only there to compare against in data.benchmark (see HierarchicalPathfinder there)
+    def __init__(self, pathfinder, ignore_towers):
+        self.pathfinder = pathfinder
+        self.ignore_towers = ignore_towers
+        self.walkable = pathfinder.get_walkable(ignore_towers)
+        self.cluster_size = size = pathfinder.cluster_size
+        self.width, self.height = pathfinder.base_map.shape
+        self.clusters_x = -(-self.width // size)
+        self.clusters_y = -(-self.height // size)
+        self.cluster_of = [(x // size) * self.clusters_y + y // size for x, y in zip(pathfinder.graph_x, pathfinder.graph_y)]
+        self.layers = [layer for layer in range(-2, 3) if layer == 0 or (layer > 0 and pathfinder.arteries) or (layer < 0 and pathfinder.veins)]
+
+        self.borders = {} # (cluster, cluster to the right or below) -> entrance pairs across that border
+        self.links = {} # entrance -> entrances on the other side of a border
+        self.entrances = {} # cluster -> entrances inside it
+        self.edges = {} # cluster -> {entrance: {entrance: (cost, route)}}
+        self.goal_edges = {}
+        for cluster in range(self.clusters_x * self.clusters_y):
+            for key in self.get_borders(cluster)[2:]:
+                self.make_border(key)
+        for cluster in range(self.clusters_x * self.clusters_y):
+            self.make_cluster(cluster)
+
+    def get_id(self, x, y, layer):
+        return (layer + 2) * self.width * self.height + x * self.height + y
+
+    def get_borders(self, cluster):
+        # keys of the borders to the left of, above, to the right of and below the cluster (None at the edge of the map)
+        cx, cy = divmod(cluster, self.clusters_y)
+        return [
+            (cluster - self.clusters_y, cluster) if cx > 0 else None,
+            (cluster - 1, cluster) if cy > 0 else None,
+            (cluster, cluster + self.clusters_y) if cx < self.clusters_x - 1 else None,
+            (cluster, cluster + 1) if cy < self.clusters_y - 1 else None]
+
+    def make_border(self, key):
+        if key == None:
+            return False
+        ax, ay = divmod(key[0], self.clusters_y)
+        size = self.cluster_size
+        if key[1] == key[0] + 1 and ay < self.clusters_y - 1: # the second cluster is below the first one
+            y = (ay + 1) * size - 1
+            cells = [((x, y), (x, y + 1)) for x in range(ax * size, min((ax + 1) * size, self.width))]
+        else: # b is to the right of a
+            x = (ax + 1) * size - 1
+            cells = [((x, y), (x + 1, y)) for y in range(ay * size, min((ay + 1) * size, self.height))]
+
+        pairs = []
+        for layer in self.layers:
+            segment = []
+            for first, second in cells + [(None, None)]:
+                if first != None:
+                    pair = (self.get_id(first[0], first[1], layer), self.get_id(second[0], second[1], layer))
+                    if self.walkable[pair[0]] and self.walkable[pair[1]]:
+                        segment.append(pair)
+                        continue
+                if segment: # an open stretch just ended, short ones get an entrance in the middle and long ones one at each end
+                    if len(segment) < 6:
+                        pairs.append(segment[len(segment) // 2])
+                    else:
+                        pairs.extend((segment[0], segment[-1]))
+                    segment = []
+
+        old_pairs = self.borders.get(key)
+        if pairs == old_pairs:
+            return False
+        if old_pairs == None:
+            old_pairs = []
+        for first, second in old_pairs:
+            self.links[first].discard(second)
+            self.links[second].discard(first)
+        for first, second in pairs:
+            self.links.setdefault(first, set()).add(second)
+            self.links.setdefault(second, set()).add(first)
+        self.borders[key] = pairs
+        return True
+
+    def make_cluster(self, cluster):
+        entrances = set()
+        for key in self.get_borders(cluster):
+            if key != None:
+                for pair in self.borders[key]:
+                    entrances.update(node for node in pair if self.cluster_of[node] == cluster)
+        self.entrances[cluster] = entrances
+        self.edges[cluster] = {entrance: self.search_cluster(entrance, cluster, entrances) for entrance in entrances}
+
+    def update(self, changed):
+        # changed is the list of ground tiles that have changed since the last update
+        self.walkable = self.pathfinder.get_walkable(self.ignore_towers)
+        self.goal_edges = {}
+        dirty = set()
+        for x, y in changed:
+            cluster = (x // self.cluster_size) * self.clusters_y + y // self.cluster_size
+            dirty.add(cluster)
+            for key in self.get_borders(cluster):
+                if self.make_border(key):
+                    dirty.update(key)
+        for cluster in dirty:
+            self.make_cluster(cluster)
+
+    def search_cluster(self, source, cluster, targets):
+        # BFS from source that stays inside the cluster (except to step onto a target)
+        # returns {target: (cost, route from source to target)} for every target it gets to
+        # the source and the targets are allowed to be walls (i.e. goals or an enemy standing where a tower was placed)
+        indptr = self.pathfinder.graph_indptr
+        indices = self.pathfinder.graph_indices
+        walkable = self.walkable
+        cluster_of = self.cluster_of
+        came_from = {source: -1}
+        queue = deque([source])
+        found = {}
+        while queue:
+            current = queue.popleft()
+            if current in targets and current != source:
+                route = []
+                node = current
+                while node != -1:
+                    route.append(node)
+                    node = came_from[node]
+                route.reverse()
+                found[current] = (len(route) - 1, route)
+                if not walkable[current]:
+                    continue
+            for neighbor in indices[indptr[current]:indptr[current + 1]]:
+                if neighbor in came_from:
+                    continue
+                if neighbor in targets or (walkable[neighbor] and cluster_of[neighbor] == cluster):
+                    came_from[neighbor] = current
+                    queue.append(neighbor)
+        return found
+
+    def get_clusters(self, node):
+        # clusters the node is in or next to
+        indptr = self.pathfinder.graph_indptr
+        indices = self.pathfinder.graph_indices
+        return {self.cluster_of[node]} | {self.cluster_of[neighbor] for neighbor in indices[indptr[node]:indptr[node + 1]]}
+
+    def get_goal_edges(self, goal):
+        try:
+            return self.goal_edges[goal]
+
+        except KeyError:
+            edges = {}
+            for cluster in self.get_clusters(goal):
+                for entrance, (cost, route) in self.search_cluster(goal, cluster, self.entrances[cluster]).items():
+                    if entrance not in edges or cost < edges[entrance][0]:
+                        edges[entrance] = (cost, route[::-1]) # from the entrance to the goal
+            self.goal_edges[goal] = edges
+            return edges
+
+    def find_route(self, start, goals):
+        # returns the node ids from start to the closest goal it can find, False if there's no way there
+        goal_set = set(goals)
+        if start in goal_set:
+            return [start]
+        goal_x = [self.pathfinder.graph_x[goal] for goal in goals]
+        goal_y = [self.pathfinder.graph_y[goal] for goal in goals]
+        graph_x = self.pathfinder.graph_x
+        graph_y = self.pathfinder.graph_y
+
+        to_goal = {}
+        for goal in goals:
+            for entrance, (cost, route) in self.get_goal_edges(goal).items():
+                if entrance not in to_goal or cost < to_goal[entrance][0]:
+                    to_goal[entrance] = (cost, route)
+
+        # -1 stands for having got to a goal
+        # heap entries are (f score, -g score, node), so ties go to whichever is closest to the goals
+        gscore = {start: 0}
+        came_from = {}
+        closed = {start}
+        hscore = {-1: 0}
+        oheap = []
+        def relax(node, g, previous, route):
+            if node in closed or (node in came_from and g >= gscore[node]):
+                return
+            gscore[node] = g
+            came_from[node] = (previous, route)
+            try:
+                h = hscore[node]
+            except KeyError:
+                x, y = graph_x[node], graph_y[node]
+                h = hscore[node] = min(abs(x - gx) + abs(y - gy) for gx, gy in zip(goal_x, goal_y))
+            heappush(oheap, (g + h, -g, node))
+
+        for cluster in self.get_clusters(start):
+            for node, (cost, route) in self.search_cluster(start, cluster, self.entrances[cluster] | goal_set).items():
+                relax(-1 if node in goal_set else node, cost, start, route)
+
+        while oheap:
+            f, g, current = heappop(oheap)
+            if current in closed:
+                continue
+
+            if current == -1:
+                route = []
+                while current != start:
+                    current, part = came_from[current]
+                    route.extend(reversed(part[1:]))
+                route.append(start)
+                route.reverse()
+                return route
+
+            closed.add(current)
+            g = -g
+            for neighbor, (cost, part) in self.edges[self.cluster_of[current]][current].items():
+                relax(neighbor, g + cost, current, part)
+            for neighbor in self.links.get(current, ()):
+                relax(neighbor, g + 1, current, (current, neighbor))
+            if current in to_goal:
+                relax(-1, g + to_goal[current][0], current, to_goal[current][1])
+
+        return False
+
 class Pathfinder():
+    # Everything here is plain data: the layers are 2D arrays (lists or NumPy) indexed [x][y] with 0 for walkable,
+    # and goals is the list of goal nodes ((x, y), layer), so it can be used without pygame or a Game
     def __init__(self, *args, **kwargs):
         self.map = [[], [], [], [], []]
         art_array = kwargs.get('arteries', None)
-        if art_array == None:
+        if art_array is None:
             self.arteries = False
         else:
             self.map[2] = numpy.array(art_array)
             self.map[1] = numpy.array(kwargs.get('artery_entrances', None))
             self.arteries = True
         vein_array = kwargs.get('veins', None)
-        if vein_array == None:
+        if vein_array is None:
             self.veins = False
         else:
             self.map[-2] = numpy.array(vein_array)
@@ -31,101 +377,574 @@ class Pathfinder():
             self.neighbors = [(0, 1, 0), (0, -1, 0), (1, 0, 0), (-1, 0, 0), (0, 0, -1), (0, 0, 1)]
 
         self.base_map = numpy.array(kwargs.get('base_map'))
+        self.compile_graph()
+
+        # the goals never move, so their nodes are only worked out once
+        self.goal_nodes = list(dict.fromkeys(kwargs.get('goals', [])))
+        self.goal_set = set(self.goal_nodes)
+        self.goal_ids = [self.graph_ids[goal_node] for goal_node in self.goal_nodes]
+
+        # flow field mode: one reverse BFS from all the goals per map state (and per flying/not flying)
+        # instead of one A* search per start node
+        self.flow_field = kwargs.get('flow_field', False)
+        # the fields themselves can be grown with NumPy (see Wavefront) instead of a Python BFS
+        self.wavefront = Wavefront(**kwargs) if kwargs.get('wavefront', False) else None
+        # the placement gains are always worked out with a Wavefront, since they need a whole batch of maps at once
+        self.solver = self.wavefront if self.wavefront != None else Wavefront(**kwargs)
+        self.batch_size = kwargs.get('batch_size', 64)
+        self.fields = {}
+        self.walkable = {}
+        self.flying_paths = {}
+        self.blocking = None
+        self.path_nodes = None
+        self.gains = None
+
+        # everything that depends on where the towers are is kept for the last few map states,
+        # so selling a tower that was just placed (or any other layout seen before) doesn't need any pathfinding
+        self.cache_size = kwargs.get('cache_size', 32)
+        self.states = OrderedDict()
+        self.zobrist = numpy.random.default_rng(0).integers(0, 2 ** 63, size = self.base_map.shape, dtype = numpy.int64)
+
+    def compile_graph(self):
+        # Flattens the five layers into integer node ids (layer, then x, then y) with a CSR neighbor list:
+        # the neighbors of id are graph_indices[graph_indptr[id]:graph_indptr[id + 1]]
+        # Which neighbors exist never changes during a level, only which ones are walkable (see get_walkable)
+        width, height = self.base_map.shape
+        self.graph_size = width * height
+        self.graph_nodes = [((x, y), layer) for layer in range(-2, 3) for x in range(width) for y in range(height)]
+        self.graph_ids = {node: i for i, node in enumerate(self.graph_nodes)}
+        self.graph_x = [node[0][0] for node in self.graph_nodes]
+        self.graph_y = [node[0][1] for node in self.graph_nodes]
+
+        self.graph_indptr = [0]
+        self.graph_indices = []
+        for node in self.graph_nodes:
+            if node[1] == 0 or (node[1] > 0 and self.arteries) or (node[1] < 0 and self.veins):
+                self.graph_indices.extend(self.graph_ids[neighbor] for neighbor in self.get_adjacent(node))
+            self.graph_indptr.append(len(self.graph_indices))
+
+    def get_walkable(self, ignore_towers):
+        # walkable flag of every node id for the current map state
+        try:
+            return self.walkable[ignore_towers]
+
+        except KeyError:
+            ground = self.base_map if ignore_towers else self.map[0]
+            layers = []
+            for layer in range(-2, 3):
+                cur_array = ground if layer == 0 else self.map[layer]
+                if len(cur_array) == 0: # no arteries/veins
+                    layers.append(numpy.zeros(self.graph_size, dtype = bool))
+                else:
+                    layers.append((cur_array == 0).ravel())
+            self.walkable[ignore_towers] = numpy.concatenate(layers).tolist()
+            return self.walkable[ignore_towers]
 
     def clear_nodes(self, map):
+        # flying paths only depend on base_map, which never changes, so they're kept
         self.paths = {}
-        self.flying_paths = {}
+        self.fields = {True: self.fields[True]} if True in self.fields else {}
+        self.walkable = {True: self.walkable[True]} if True in self.walkable else {}
+        self.blocking = None
+        self.path_nodes = None
+        self.gains = None
         self.map[0] = numpy.array(map)
+        self.states = OrderedDict()
+        self.map_hash = int(numpy.bitwise_xor.reduce(self.zobrist[self.map[0] == 1]))
 
-    def astar(self, start, goals, ignore_towers):
-        try:
-            if ignore_towers:
-                return self.flying_paths[start].copy()
-            return self.paths[start].copy()
+    def save_state(self):
+        self.states[self.map_hash] = (self.map[0], self.paths, self.fields.get(False), self.walkable.get(False), self.blocking, self.path_nodes, self.gains)
+        self.states.move_to_end(self.map_hash)
+        while len(self.states) > self.cache_size:
+            self.states.popitem(last = False)
+
+    def load_state(self):
+        state = self.states.get(self.map_hash)
+        if state == None or not numpy.array_equal(state[0], self.map[0]):
+            return False
+
+        self.states.move_to_end(self.map_hash)
+        self.paths, field, walkable, self.blocking, self.path_nodes, self.gains = state[1:]
+        for cache, value in ((self.fields, field), (self.walkable, walkable)):
+            if value == None:
+                cache.pop(False, None)
+            else:
+                cache[False] = value
+        return True
+
+    def update_nodes(self, map):
+        # only the ground paths depend on the towers, and those are either restored from a map state seen before
+        # or repaired around the nodes that changed since the last call
+        new_map = numpy.array(map)
+        changed = numpy.argwhere(new_map != self.map[0])
+        if len(changed) == 0:
+            return
+
+        self.save_state()
+        self.map_hash ^= int(numpy.bitwise_xor.reduce(self.zobrist[changed[:, 0], changed[:, 1]]))
+        self.map[0] = new_map
+        if self.load_state():
+            return
+
+        self.paths = {}
+        self.walkable.pop(False, None)
+        self.blocking = None
+        self.path_nodes = None
+        self.gains = None
+        if not self.flow_field or False not in self.fields:
+            self.fields.pop(False, None)
+            return
+
+        blocked = []
+        unblocked = []
+        for x, y in changed:
+            if new_map[x][y] == 1:
+                blocked.append(((int(x), int(y)), 0))
+            else:
+                unblocked.append(((int(x), int(y)), 0))
+
+        # the previous map state keeps its own copy of the field
+        came_from, dist = dict(self.fields[False][0]), dict(self.fields[False][1])
+        self.fields[False] = (came_from, dist)
+        self.repair_blocked(blocked, came_from, dist)
+        self.repair_unblocked(unblocked, came_from, dist)
 
-        except:
-            if ignore_towers:
-                temp_map = self.map[0].copy()
-                self.map[0] = self.base_map
+    def get_path_nodes(self, starts):
+        # marks every ground tile that's on the path of at least one of the starts, False if any start is cut off
+        if self.path_nodes is None:
+            self.path_nodes = numpy.zeros(self.map[0].shape, dtype = bool)
+            for start in starts:
+                path = self.astar(start, False)
+                if path == False:
+                    self.path_nodes = False
+                    break
+                for node in path:
+                    if node[1] == 0: # not artery or vein
+                        self.path_nodes[node[0][0]][node[0][1]] = True
 
-            prevstate = self.map[0][start[0][0]][start[0][1]]
-            self.map[0][start[0][0]][start[0][1]] = 0
+        return self.path_nodes
 
-            close_set = set()
+    def is_walkable(self, node, ground):
+        cur_array = ground if node[1] == 0 else self.map[node[1]]
+        return cur_array[node[0][0]][node[0][1]] == 0
+
+    def repair_blocked(self, blocked, came_from, dist):
+        # every node whose route went through a blocked node loses its distance...
+        orphans = set()
+        stack = [node for node in blocked if node in came_from]
+        orphans.update(stack)
+        while stack:
+            current = stack.pop()
+            for neighbor in self.get_adjacent(current):
+                if neighbor not in orphans and came_from.get(neighbor) == current:
+                    orphans.add(neighbor)
+                    stack.append(neighbor)
+
+        for orphan in orphans:
+            del dist[orphan]
+            del came_from[orphan]
+
+        # ...and gets it back from whichever neighbors still have a route, spreading inwards from there
+        oheap = []
+        for orphan in orphans:
+            if not self.is_walkable(orphan, self.map[0]):
+                continue
+            for neighbor in self.get_adjacent(orphan):
+                if neighbor in dist and neighbor not in orphans:
+                    if orphan not in dist or dist[neighbor] + 1 < dist[orphan]:
+                        dist[orphan] = dist[neighbor] + 1
+                        came_from[orphan] = neighbor
+            if orphan in dist:
+                heappush(oheap, (dist[orphan], orphan))
+
+        self.spread(oheap, came_from, dist, orphans)
+
+    def repair_unblocked(self, unblocked, came_from, dist):
+        oheap = []
+        for node in unblocked:
+            for neighbor in self.get_adjacent(node):
+                if neighbor in dist and (node not in dist or dist[neighbor] + 1 < dist[node]):
+                    dist[node] = dist[neighbor] + 1
+                    came_from[node] = neighbor
+            if node in dist:
+                heappush(oheap, (dist[node], node))
+
+        self.spread(oheap, came_from, dist)
+
+    def spread(self, oheap, came_from, dist, within = None):
+        # Dijkstra outwards from the repaired nodes, stopping wherever the old distances are already as short
+        while oheap:
+            cur_dist, current = heappop(oheap)
+            if cur_dist != dist.get(current):
+                continue
+
+            for neighbor in self.get_adjacent(current):
+                if within != None and neighbor not in within:
+                    continue
+                if neighbor in dist and dist[neighbor] <= cur_dist + 1:
+                    continue
+                if not self.is_walkable(neighbor, self.map[0]):
+                    continue
+                dist[neighbor] = cur_dist + 1
+                came_from[neighbor] = current
+                heappush(oheap, (dist[neighbor], neighbor))
+
+    def get_blocking_nodes(self, starts):
+        # marks every ground tile that would cut at least one start off from the goals if a tower was placed on it,
+        # i.e. the articulation points separating a start from the goals (with all the goals joined into one root)
+        if self.blocking is not None:
+            return self.blocking
+
+        goal_nodes = self.goal_nodes
+        goal_set = self.goal_set
+        root = None
+
+        def graph_neighbors(node):
+            if node in goal_set:
+                yield root
+            for neighbor in self.get_adjacent(node):
+                if neighbor in goal_set or self.is_walkable(neighbor, self.map[0]):
+                    yield neighbor
+
+        # iterative Tarjan DFS from the root
+        parent = {root: None}
+        tin = {root: 0}
+        low = {root: 0}
+        stack = [(root, iter(goal_nodes))]
+        while stack:
+            node, neighbors = stack[-1]
+            for neighbor in neighbors:
+                if neighbor == parent[node]:
+                    continue
+                if neighbor in tin:
+                    low[node] = min(low[node], tin[neighbor])
+                else:
+                    parent[neighbor] = node
+                    tin[neighbor] = low[neighbor] = len(tin)
+                    stack.append((neighbor, graph_neighbors(neighbor)))
+                    break
+            else:
+                stack.pop()
+                if stack:
+                    low[stack[-1][0]] = min(low[stack[-1][0]], low[node])
+
+        self.blocking = numpy.zeros(self.map[0].shape, dtype=bool)
+        for start in starts:
+            if start not in tin: # already cut off, so nothing can be placed
+                self.blocking[:] = True
+                break
+
+            child = start
+            node = parent[start]
+            while node != root:
+                if node[1] == 0 and node not in goal_set and low[child] >= tin[node]:
+                    self.blocking[node[0][0]][node[0][1]] = True
+                child = node
+                node = parent[node]
+
+        return self.blocking
+
+    def get_placement_gains(self, starts):
+        # how many tiles longer the ground route of each start gets if a tower is placed on each tile,
+        # as an array indexed [start][x][y] with -1 where the tower would cut that start off from the goals
+        # A tower can only make a route longer if every shortest route from that start goes through its tile,
+        # so those tiles are found first and then all of them are tried at once as a batch of maps
+        if self.gains is not None:
+            return self.gains
+
+        solver = self.solver
+        self.gains = numpy.zeros((len(starts),) + self.base_map.shape, dtype = numpy.int32)
+        if len(starts) == 0:
+            return self.gains
+        start_ids = [self.graph_ids[start] for start in starts]
+        walkable = solver.open.copy()
+        walkable[2] = self.map[0] == 0
+        walkable.flat[start_ids] = True # same as astar, which treats the start node as walkable
+
+        to_goals = numpy.full((1,) + solver.shape, -1, dtype = numpy.int32)
+        to_goals.flat[self.goal_ids] = 0
+        to_goals = solver.spread(walkable, to_goals)[0]
+        lengths = to_goals.flat[start_ids]
+        if (lengths == -1).any(): # already cut off, so nothing can be placed
+            self.gains[:] = -1
+            return self.gains
+
+        # a tile is on a shortest route if its distances to the start and to the goals add up to the route's length,
+        # and every shortest route goes through it if it's the only such node that far from the start
+        from_starts = numpy.full((len(starts),) + solver.shape, -1, dtype = numpy.int32)
+        from_starts.reshape(len(starts), -1)[numpy.arange(len(starts)), start_ids] = 0
+        solver.spread(walkable, from_starts)
+        tiles = set()
+        for i, length in enumerate(lengths):
+            steps = from_starts[i]
+            on_route = (steps >= 0) & (to_goals >= 0) & (steps + to_goals == length)
+            counts = numpy.bincount(steps[on_route], minlength = steps.max() + 1)
+            critical = on_route[2] & (steps[2] > 0) & (counts[steps[2]] == 1)
+            tiles.update(zip(*numpy.nonzero(critical)))
+
+        # nothing closer to the goals than a tile can have its distance changed by a tower there,
+        # so each map in the batch starts from those distances (sorting keeps the tiles in a batch at similar distances)
+        tiles = sorted(tiles, key = lambda tile: to_goals[2][tile])
+        for chunk in range(0, len(tiles), self.batch_size):
+            xs, ys = numpy.array(tiles[chunk:chunk + self.batch_size]).T
+            batch = numpy.arange(len(xs))
+            levels = to_goals[2][xs, ys]
+            maps = numpy.repeat(walkable[None], len(xs), axis = 0)
+            maps[batch, 2, xs, ys] = False
+            dist = numpy.where(to_goals[None] <= levels[:, None, None, None], to_goals[None], -1)
+            dist[batch, 2, xs, ys] = -1
+            solver.spread(maps, dist, start_ids, levels.min() + 1)
+
+            new_lengths = dist.reshape(len(xs), -1)[:, start_ids]
+            self.gains[:, xs, ys] = numpy.where(new_lengths >= 0, new_lengths - lengths, -1).T
+
+        return self.gains
+
+    def get_adjacent(self, node):
+        for i, j, k in self.neighbors:
+            neighbor = (node[0][0] + i, node[0][1] + j), node[1] + k
+            if abs(neighbor[1]) > 2:
+                continue
+            if self.arteries == False and neighbor[1] > 0:
+                continue
+            if self.veins == False and neighbor[1] < 0:
+                continue
+
+            if 0 <= neighbor[0][0] < self.base_map.shape[0] and 0 <= neighbor[0][1] < self.base_map.shape[1]:
+                yield neighbor
+
+    def get_field(self, ignore_towers):
+        try:
+            return self.fields[ignore_towers]
+
+        except KeyError:
+            ground = self.base_map if ignore_towers else self.map[0]
+            if self.wavefront != None:
+                self.fields[ignore_towers] = self.get_wavefront_field(ground)
+                return self.fields[ignore_towers]
+
+            dist = {}
             came_from = {}
+            queue = deque()
+            for goal_node in self.goal_nodes:
+                dist[goal_node] = 0
+                queue.append(goal_node)
+
+            while queue:
+                current = queue.popleft()
+                for neighbor in self.get_adjacent(current):
+                    if neighbor in dist:
+                        continue
+                    cur_array = ground if neighbor[1] == 0 else self.map[neighbor[1]]
+                    if cur_array[neighbor[0][0]][neighbor[0][1]] == 1:
+                        continue
+                    dist[neighbor] = dist[current] + 1
+                    came_from[neighbor] = current
+                    queue.append(neighbor)
+
+            self.fields[ignore_towers] = (came_from, dist)
+            return self.fields[ignore_towers]
+
+    def get_wavefront_field(self, ground):
+        # same (came_from, dist) dicts as the BFS in get_field, read off the solver's arrays
+        dist_array = self.wavefront.solve(ground, self.goal_nodes)
+        parents = self.wavefront.get_parents(dist_array).ravel()
+        dist_array = dist_array.ravel()
 
+        reached = numpy.flatnonzero(dist_array >= 0).tolist()
+        nodes = self.graph_nodes
+        dist = dict(zip([nodes[i] for i in reached], dist_array[reached].tolist()))
+        moving = numpy.flatnonzero(parents >= 0).tolist()
+        came_from = dict(zip([nodes[i] for i in moving], [nodes[i] for i in parents[moving].tolist()]))
+        return came_from, dist
+
+    def next_node(self, node, ignore_towers):
+        # returns the next node on the way to the goals, None if node is a goal and False if there's no way out
+        came_from, dist = self.get_field(ignore_towers)
+        if node in came_from:
+            return came_from[node]
+        if dist.get(node) == 0:
+            return None
+
+        # node is a wall (i.e. a tower was placed on an enemy), so step onto the closest neighbor
+        # same as what the A* search does by treating the start node as walkable
+        best = False
+        for neighbor in self.get_adjacent(node):
+            if neighbor in dist and (best == False or dist[neighbor] < dist[best]):
+                best = neighbor
+        return best
+
+    def cache_route(self, data, ignore_towers):
+        paths = self.flying_paths if ignore_towers else self.paths
+        route = tuple(data)
+        lengths = arc_lengths(route)
+        for i, node in enumerate(route): # Adds the path for each node in the path
+            # this only has to be done until a node that already has a path is reached
+            if paths.get(node, False) != False:
+                break
+            paths[node] = Path(route, i, lengths)
+        return paths[route[0]]
+
+    def get_version(self):
+        # the engines can break ties between routes of the same length differently
+        return str(PATH_CACHE_VERSION) + "-" + ("flow_field" if self.flow_field else "astar")
+
+    def save_flying_paths(self, filename):
+        # every route is only written once, even though each node on it has its own Path
+        routes = {id(path.route): path.route for path in self.flying_paths.values() if path != False}
+        data = {
+            "version": self.get_version(),
+            "routes": [[[node[0][0], node[0][1], node[1]] for node in route] for route in routes.values()],
+            "unreachable": [[node[0][0], node[0][1], node[1]] for node, path in self.flying_paths.items() if path == False]
+        }
+        with open(filename, "w") as out_file:
+            json.dump(data, out_file)
+
+    def load_flying_paths(self, filename):
+        try:
+            with open(filename, "r") as data_file:
+                data = json.load(data_file)
+        except (OSError, ValueError):
+            return False
+        if data.get("version") != self.get_version(): # made by another version of the game, so the routes may have changed
+            return False
+
+        for route in data["routes"]:
+            self.cache_route([((x, y), layer) for x, y, layer in route], True)
+        for x, y, layer in data["unreachable"]:
+            self.flying_paths[((x, y), layer)] = False
+        return True
+
+    def follow_field(self, start, ignore_towers):
+        paths = self.flying_paths if ignore_towers else self.paths
+        try:
+            return paths[start]
+
+        except KeyError:
+            data = [start]
+            current = self.next_node(start, ignore_towers)
+            if current == False:
+                paths[start] = False
+                return False
+            while current != None:
+                data.append(current)
+                current = self.next_node(current, ignore_towers)
+            return self.cache_route(data, ignore_towers)
+
+    def astar(self, start, ignore_towers = False):
+        if self.flow_field:
+            return self.follow_field(start, ignore_towers)
+
+        paths = self.flying_paths if ignore_towers else self.paths
+        try:
+            return paths[start]
+
+        except KeyError:
+            walkable = self.get_walkable(ignore_towers)
+            indptr = self.graph_indptr
+            indices = self.graph_indices
+            graph_x = self.graph_x
+            graph_y = self.graph_y
+            start_id = self.graph_ids[start]
+            start_x, start_y = start[0]
+
+            # searches from the goals to the start, so the start is allowed to be a wall (i.e. a tower placed on an enemy)
+            size = len(self.graph_nodes)
+            max_h = sum(self.base_map.shape)
+            # heap entries are single ints ordered by f score, then by closest to the start, then by node id (entry % size)
+            # lowering a node's g score just pushes it again, the stale entry is skipped once the node is closed
+            gscore = [-1] * size
+            closed = bytearray(size)
+            came_from = [-1] * size
             oheap = []
-            fscore = {}
-            gscore = {}
-            for goal in goals:
-                goal_nodes = goal.get_nodes()
-                for goal_node in goal_nodes:
-                    fscore[goal_node] = heuristic(start[0], goal_node[0])
-                    gscore[goal_node] = 0
-                    heappush(oheap, (fscore[goal_node], goal_node))
+            for goal_node, goal_id in zip(self.goal_nodes, self.goal_ids):
+                gscore[goal_id] = 0
+                h = heuristic(start[0], goal_node[0])
+                heappush(oheap, (h * max_h + h) * size + goal_id)
 
             while oheap:
-                current = heappop(oheap)[1]
+                current = heappop(oheap) % size
+                if closed[current]: # already popped with a lower key
+                    continue
 
-                if current == start:
+                if current == start_id:
                     data = []
-                    while current in came_from:
-                        data.append(current)
+                    while current != -1:
+                        data.append(self.graph_nodes[current])
                         current = came_from[current]
-                    data.append(current)
-                    
-                    self.map[0][start[0][0]][start[0][1]] = prevstate
-                    if ignore_towers:
-                        self.map[0] = temp_map
-                        
-                    for i, node in enumerate(data): # Adds the path for each node in the path
-                        # this only has to be done until a node that already has a path is reached
-                        if ignore_towers:
-                            if self.flying_paths.get(node, False) != False:
-                                break
-                            self.flying_paths[node] = data[i:]
-                        else:
-                            if self.paths.get(node, False) != False:
-                                break
-                            self.paths[node] = data[i:]
-                    return data.copy()
-
-                close_set.add(current)
-
-                for i, j, k in self.neighbors:
-                    neighbor = (current[0][0] + i, current[0][1] + j), current[1] + k
-                    if abs(neighbor[1]) > 2:
-                        continue
-                    if self.arteries == False and neighbor[1] > 0:
-                        continue
-                    if self.veins == False and neighbor[1] < 0:
-                        continue
+                    return self.cache_route(data, ignore_towers)
 
-                    cur_array = self.map[neighbor[1]]
-                    if 0 <= neighbor[0][0] < cur_array.shape[0]:
-                        if 0 <= neighbor[0][1] < cur_array.shape[1]:
-                            if cur_array[neighbor[0][0]][neighbor[0][1]] == 1:
-                                continue
-                        else:
-                            # array bound y walls
-                            continue
-                    else:
-                        # array bound x walls
+                closed[current] = 1
+                tentative_g_score = gscore[current] + 1
+                for neighbor in indices[indptr[current]:indptr[current + 1]]:
+                    if closed[neighbor] or not (walkable[neighbor] or neighbor == start_id):
                         continue
+                    if gscore[neighbor] == -1 or tentative_g_score < gscore[neighbor]:
+                        gscore[neighbor] = tentative_g_score
+                        came_from[neighbor] = current
+                        h = abs(graph_x[neighbor] - start_x) + abs(graph_y[neighbor] - start_y)
+                        heappush(oheap, ((tentative_g_score + h) * max_h + h) * size + neighbor)
 
-                    tentative_g_score = gscore[current] + 1
+            paths[start] = False
+            return False
 
-                    tentative_f_score = heuristic(start[0], neighbor[0]) + tentative_g_score
+class PathWorker():
+    # Runs a second Pathfinder on a background thread, so the work that follows a map change
+    # doesn't have to happen in the frame that changed it
+    # Every snapshot submitted gets a version number and only the result for the newest one is ever published
+    def __init__(self, *args, **kwargs):
+        self.pathfinder = Pathfinder(*args, **kwargs)
+        self.pathfinder.clear_nodes(kwargs.get('base_map'))
+        self.version = 0
+        self.job = None
+        self.result = None
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+        self.done = threading.Event() # set while there's a result waiting to be polled
+        self.thread = threading.Thread(target = self.run, daemon = True)
+        self.thread.start()
 
-                    if neighbor in close_set and tentative_f_score >= fscore.get(neighbor):
-                        continue
+    def submit(self, map, task):
+        # task(pathfinder) is called on the worker thread once its pathfinder is up to date with map
+        # a snapshot that hasn't been started yet is replaced, since its result would be out of date anyway
+        with self.lock:
+            self.version += 1
+            self.job = (self.version, numpy.array(map), task)
+            self.ready.set()
+            return self.version
 
-                    if neighbor not in [i[1] for i in oheap] or tentative_f_score < fscore.get(neighbor):
-                        came_from[neighbor] = current
-                        fscore[neighbor] = tentative_f_score
-                        gscore[neighbor] = tentative_g_score
-                        heappush(oheap, (fscore[neighbor], neighbor))
+    def poll(self, wait = False):
+        # returns (version, result) for the newest snapshot once it's done, and None until then (unless it waits for it)
+        while True:
+            if wait:
+                self.done.wait()
+            with self.lock:
+                result = self.result
+                self.result = None
+                self.done.clear()
+                # a result that was published before a newer snapshot was submitted is only thrown away when waiting
+                if not wait or result != None and result[0] == self.version:
+                    return result
 
-            self.paths[start] = False
-            self.map[0][start[0][0]][start[0][1]] = prevstate
-            return False
+    def stop(self):
+        with self.lock:
+            self.version += 1
+            self.job = (self.version, None, None)
+            self.ready.set()
+
+    def run(self):
+        while True:
+            self.ready.wait()
+            with self.lock:
+                version, map, task = self.job
+                self.job = None
+                self.ready.clear()
+            if task == None:
+                return
+
+            self.pathfinder.update_nodes(map)
+            result = task(self.pathfinder)
+            with self.lock:
+                if version == self.version:
+                    self.result = (version, result)
+                    self.done.set()
@@ -0,0 +1,47 @@
+import json
+from copy import deepcopy
+
+from data.settings import *
+
+REPLAY_SETTINGS = ["width", "height", "skip_text", "game_attrs", "seen_enemies"] # the parts of the save that change how a game plays out
+
+class Recorder():
+    # Keeps the input events Game.event gets, and when the path worker's results were picked up, along with the tick
+    # they happened before, so data/replay.py can play the game back exactly
+    # Only clicks and key presses are kept, mouse movement just moves the tower preview around
+    def __init__(self, game):
+        self.game = game
+        self.entries = []
+        self.settings = deepcopy({key: SAVE_DATA[key] for key in REPLAY_SETTINGS}) # as they were when the game started
+
+    def record_event(self, event):
+        if event.type not in (pg.MOUSEBUTTONDOWN, pg.KEYDOWN) or event.type == pg.KEYDOWN and event.key == pg.K_F5:
+            return
+        entry = {
+            "tick": self.game.ticks,
+            "type": event.type,
+            "data": {key: value for key, value in event.dict.items() if key != "window"},
+            "mods": pg.key.get_mods() # shift places more than one tower
+        }
+        if self.game.text:
+            entry["writing"] = self.game.textbox.writing
+        if event.type == pg.MOUSEBUTTONDOWN: # clicks on the map go through the camera, which the arrow keys move every frame
+            camera = self.game.camera
+            entry["camera"] = [camera.camera.x, camera.camera.y, camera.current_zoom]
+        self.entries.append(entry)
+
+    def record_paths(self):
+        self.entries.append({"tick": self.game.ticks, "paths": True})
+
+    def save(self, filename):
+        game = self.game
+        with open(filename, "w") as out_file:
+            json.dump({
+                "level": game.level,
+                "difficulty": game.difficulty,
+                "towers": game.available_towers,
+                "seed": game.seed,
+                "settings": self.settings,
+                "ticks": game.ticks,
+                "entries": self.entries
+            }, out_file)
@@ -0,0 +1,145 @@
+# Plays back a game saved with F5 (see data/recorder.py) tick for tick, to reproduce slowdowns and bugs
+# Run from the game folder with: python -m data.replay replay.json [seconds] [draw]
+# With seconds the replay starts that far into the game, from the keyframe before it (see data/snapshot.py)
+# The keyframes are saved next to the replay the first time it's played, and only used again if the replay and game are the same
+# With draw the game is also drawn after every tick, otherwise only the game logic is timed
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy") # the clicks need the game's UI and camera, but not a window
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import sys
+import json
+import time
+import pickle
+from hashlib import sha1
+
+from data.settings import *
+from data.game import Game
+from data.snapshot import Snapshots, SNAPSHOT_VERSION
+
+SLOWEST_TICKS = 10 # how many of the slowest ticks are printed
+KEYFRAME_TIME = 10 # seconds of game time between keyframes
+
+def get_version(filename):
+    # keyframes only fit the replay and the game code and data they were made with
+    # (the code is only there to check when it isn't a built game, which has just the data)
+    version = sha1(str(SNAPSHOT_VERSION).encode())
+    with open(filename, "rb") as replay_file:
+        version.update(replay_file.read())
+    for folder, extension in ((GAME_FOLDER, ".py"), (GAME_FOLDER, ".json"), (LEVELS_FOLDER, ".json")):
+        for file in sorted(listdir(folder)):
+            if file.endswith(extension) and file != "save.json":
+                with open(path.join(folder, file), "rb") as data_file:
+                    version.update(data_file.read())
+    return version.hexdigest()
+
+class Replay():
+    def __init__(self, filename):
+        with open(filename, "r") as replay_file:
+            self.data = json.load(replay_file)
+        SAVE_DATA.update(self.data["settings"]) # only for this run, nothing here saves the game
+
+        MainDisplay.get_instance()
+        self.game = Game(pg.time.Clock())
+        self.game.fixed_seed = self.data["seed"]
+        self.game.new([(self.data["level"], self.data["difficulty"]), False, self.data["towers"]])
+        self.index = 0 # the next entry to play
+
+        self.snapshots = Snapshots(self.game)
+        self.keyframes = [] # (tick, index, snapshot), the first at tick 0 and then about every KEYFRAME_TIME seconds
+        self.keyframe_ticks = round(KEYFRAME_TIME * 1000 / TICK_TIME)
+
+    def run(self, draw = False, until = None):
+        # plays on to the tick until (or the end of the replay) and returns how many ms each tick took
+        game = self.game
+        entries = self.data["entries"]
+        end = self.data["ticks"] if until == None else min(until, self.data["ticks"])
+        times = []
+        while True:
+            if (len(self.keyframes) == 0 or game.ticks >= self.keyframes[-1][0] + self.keyframe_ticks) and self.snapshots.can_take():
+                self.keyframes.append((game.ticks, self.index, self.snapshots.take()))
+            while self.index < len(entries) and entries[self.index]["tick"] == game.ticks:
+                self.play(entries[self.index])
+                self.index += 1
+            if game.ticks >= end:
+                break
+
+            start_time = time.perf_counter()
+            game.tick()
+            pg.event.clear() # nothing reads the event queue here, and a finished game posts to it every tick
+            if draw:
+                game.draw()
+            times.append((time.perf_counter() - start_time) * 1000)
+        return times
+
+    def seek(self, seconds):
+        # goes back to the last keyframe before seconds into the game (unless the game is already between them) and plays on
+        tick = round(seconds * 1000 / TICK_TIME)
+        keyframe = [keyframe for keyframe in self.keyframes if keyframe[0] <= tick][-1]
+        if not keyframe[0] <= self.game.ticks <= tick:
+            self.snapshots.load(keyframe[2])
+            self.index = keyframe[1]
+        self.run(until = tick)
+
+    def save_keyframes(self, filename, version):
+        with open(filename, "wb") as out_file:
+            pickle.dump((version, self.keyframes), out_file, pickle.HIGHEST_PROTOCOL)
+
+    def load_keyframes(self, filename, version):
+        # returns whether the keyframes could be used
+        try:
+            with open(filename, "rb") as keyframes_file:
+                keyframes_version, keyframes = pickle.load(keyframes_file)
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+            return False
+        if keyframes_version != version:
+            return False
+        self.keyframes = keyframes
+        return True
+
+    def play(self, entry):
+        game = self.game
+        if "paths" in entry:
+            game.check_paths(True)
+            return
+
+        if "writing" in entry: # the text box finishes writing over a few frames, which aren't replayed
+            game.textbox.writing = entry["writing"]
+        if "camera" in entry:
+            game.camera.camera.topleft = entry["camera"][:2]
+            game.camera.current_zoom = entry["camera"][2]
+        pg.key.set_mods(entry["mods"])
+        game.event(pg.event.Event(entry["type"], entry["data"]))
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python -m data.replay replay.json [seconds] [draw]")
+        sys.exit(1)
+    args = sys.argv[2:]
+    draw = "draw" in args
+    if draw:
+        args.remove("draw")
+
+    replay = Replay(sys.argv[1])
+    keyframes_filename = sys.argv[1] + ".keyframes"
+    version = get_version(sys.argv[1])
+    if args:
+        if not replay.load_keyframes(keyframes_filename, version):
+            print("Making keyframes...")
+            replay.run()
+            replay.save_keyframes(keyframes_filename, version)
+        replay.seek(float(args[0]))
+        times = replay.run(draw)
+    else:
+        times = replay.run(draw)
+        replay.save_keyframes(keyframes_filename, version)
+    game = replay.game
+    first_tick = game.ticks - len(times)
+
+    print("Level {} difficulty {} (seed {}): {} ticks in {:.2f}s, {:.3f} ms per tick".format(
+        game.level, game.difficulty, game.seed, len(times), sum(times) / 1000, sum(times) / max(len(times), 1)))
+    print("Wave {}/{}, {} lives, {} protein, {} towers, {} enemies".format(
+        min(game.wave + 1, game.max_wave), game.max_wave, game.lives, game.protein, len(game.towers), len(game.enemies)))
+    print("Slowest ticks:")
+    for tick in sorted(range(len(times)), key = lambda tick: times[tick], reverse = True)[:SLOWEST_TICKS]:
+        print("    {:>7}  {:.3f} ms".format(first_tick + tick + 1, times[tick]))
@@ -0,0 +1,26 @@
+from heapq import *
+
+class Scheduler():
+    # Game clock with a heap of timers, so anything that's waiting for a countdown costs nothing until it runs out
+    # Times are in milliseconds of game time, which only goes on while the game is being updated
+    def __init__(self):
+        self.now = 0
+        self.due = 0 # when the timer whose callback is running ran out
+        self.timers = []
+        self.count = 0 # timers that run out at the same time go off in the order they were set
+
+    def schedule(self, delay, callback, *args):
+        self.schedule_at(self.now + delay, callback, *args)
+
+    def schedule_at(self, time, callback, *args):
+        self.count += 1
+        heappush(self.timers, (time, self.count, callback, args))
+
+    def update(self, passed_time):
+        # callbacks see now as the time of this update and due as when their timer ran out, so something that keeps
+        # happening every so often can set its next timer from due instead of rounding each wait up to a whole update
+        # timers set by a callback that have already run out by now go off in this update too
+        self.now += passed_time
+        while self.timers and self.timers[0][0] <= self.now:
+            self.due, count, callback, args = heappop(self.timers)
+            callback(*args)
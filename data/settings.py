@@ -31,6 +31,10 @@ pg.init()
 
 # game settings
 FPS = 60
+TICK_TIME = 1000 / FPS # the game always moves on in steps of this many ms, however long the frames take
+MAX_FRAME_TIME = 250 # a frame longer than this (like when the window is dragged) only counts as this long
+GAME_SPEEDS = [1, 2, 4, 8] # ticks per frame at FPS, picked with the F key
+WAVEFRONT_MIN_TILES = 200 # maps with at least this many tiles build their flow fields with NumPy (see data/benchmark.py)
 SCREEN_WIDTH = 1280
 SCREEN_HEIGHT = 720
               
@@ -110,6 +114,11 @@ except:
             json.dump(SAVE_DATA, out_file, indent=4)
     
 
+# precomputed paths, one file per map
+PATH_CACHE_FOLDER = path.join(dir, "path_cache")
+# games saved with F5, which data/replay.py can play back
+REPLAY_FOLDER = path.join(dir, "replays")
+
 SCREEN_SIZES = [640, 854, 960, 1280, 1366, 1536, 1600, 1920, 2560, 3200, 3840]
 
 class MainDisplay:
@@ -0,0 +1,156 @@
+# Headless simulations of a level, for trying out tower layouts and balance changes without playing through them
+# Run from the game folder with: python -m data.simulation level difficulty [layout.json] [output.json]
+# The layout is a list of towers like {"name": "t_cell", "x": 4, "y": 7, "stage": 1} (x and y are tiles, stage is optional)
+# which are placed in order before the first wave, skipping any that can't be afforded or would block the enemies off
+# A policy can place towers as the game goes on instead, see data/batch.py
+# Nothing is drawn or played and there's no frame cap, so a level runs as fast as the game logic allows
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy") # settings.py starts pygame up when it's imported, no window is ever opened
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import sys
+import json
+import time
+
+from data.settings import *
+from data.tilemap import tile_from_xcoords
+from data.game import Game
+
+MAX_GAME_TIME = 60 * 60 * 1000 # ms, waves with endless enemies never finish so the simulation gives up after this long
+
+class Simulation():
+    def __init__(self, level, difficulty, layout = [], seed = 0, policy = None, policy_towers = []):
+        # policy is called with the simulation before each wave starts, and can place the towers in policy_towers
+        self.level = level
+        self.difficulty = difficulty
+        self.policy = policy
+        self.game = Game(None, headless = True)
+        self.game.fixed_seed = seed
+        self.game.new([(level, difficulty), False, list(dict.fromkeys([tower["name"] for tower in layout] + policy_towers))])
+        self.starting_lives = self.game.lives
+        self.wave = 0 # how many waves the game has started, see get_wave
+        self.waves = [] # how each wave went, filled in as it's cleared or the next one starts
+
+        self.towers = []
+        self.skipped = []
+        for tower in layout:
+            self.place(tower)
+
+    def place(self, data):
+        game = self.game
+        x, y = data["x"], data["y"]
+        if game.protein < round(TOWER_DATA[data["name"]]["stages"][0]["upgrade_cost"] * (1 + game.difficulty * 0.25)) or \
+                game.map.is_valid_tower_tile(x, y) == 0 or game.map.change_node(x, y, 1) == False:
+            self.skipped.append(data)
+            return
+
+        tower = game.place_tower(x, y, data["name"])
+        if tower == None:
+            self.skipped.append(data)
+            return
+
+        while tower.stage < data.get("stage", 0):
+            stage = tower.stage
+            game.upgrade_tower(tower)
+            if tower.stage == stage: # not enough protein
+                break
+        self.towers.append(tower)
+
+    def run(self):
+        # each wave is started as soon as the last one has been cleared
+        # (or by the game itself if its wave timer runs out first, which doesn't give the policy a turn)
+        # a wave's stats are kept once it's cleared, before the policy spends what it earned, or once the next one starts
+        game = self.game
+        while game.lives > 0 and not self.is_finished() and game.scheduler.now < MAX_GAME_TIME:
+            if not game.in_a_wave and len(game.enemies) == 0:
+                if self.wave > len(self.waves):
+                    self.end_wave()
+                if self.policy != None:
+                    self.policy(self)
+                game.start_next_wave()
+            if self.get_wave() > self.wave:
+                if self.wave > len(self.waves):
+                    self.end_wave()
+                self.wave = self.get_wave()
+                self.wave_start = (game.lives, game.leaks, game.protein)
+            game.tick()
+        if self.wave > len(self.waves):
+            self.end_wave()
+        return self.get_results()
+
+    def get_wave(self):
+        # game.wave is the wave that's on now, or the next one once the last one has finished spawning
+        # (apart from the last wave, after which it's max_wave)
+        game = self.game
+        return min(game.wave + 1 if game.in_a_wave else game.wave, game.max_wave)
+
+    def end_wave(self):
+        game = self.game
+        lives, leaks, protein = self.wave_start
+        self.waves.append({
+            "wave": self.wave,
+            "survived": game.lives > 0,
+            "lives": game.lives,
+            "lives_lost": lives - game.lives,
+            "leaks": game.leaks - leaks,
+            "protein": game.protein,
+            "protein_gained": game.protein - protein
+        })
+
+    def is_finished(self):
+        return self.game.wave == self.game.max_wave and len(self.game.enemies) == 0
+
+    def get_results(self):
+        game = self.game
+        results = {
+            "level": self.level,
+            "difficulty": self.difficulty,
+            "seed": self.game.seed,
+            "finished": self.is_finished(),
+            "wave": self.wave,
+            "max_wave": game.max_wave,
+            "lives": game.lives,
+            "lives_lost": self.starting_lives - game.lives,
+            "leaks": game.leaks,
+            "protein": game.protein,
+            "game_time": game.scheduler.now / 1000,
+            "towers": [{
+                "name": tower.name,
+                "x": tile_from_xcoords(tower.rect.x, game.map.tilesize),
+                "y": tile_from_xcoords(tower.rect.y, game.map.tilesize),
+                "stage": tower.stage,
+                "hits": tower.hits,
+                "kills": tower.kills,
+                "destroyed": not tower.alive()
+            } for tower in self.towers],
+            "skipped": self.skipped,
+            "waves": self.waves
+        }
+        if game.lives == 0:
+            results["cause_of_death"] = game.cause_of_death
+        return results
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Usage: python -m data.simulation level difficulty [layout.json] [output.json]")
+        sys.exit(1)
+
+    layout = []
+    if len(sys.argv) > 3:
+        with open(sys.argv[3], "r") as layout_file:
+            layout = json.load(layout_file)
+
+    start_time = time.perf_counter()
+    results = Simulation(int(sys.argv[1]), int(sys.argv[2]), layout).run()
+    results["real_time"] = time.perf_counter() - start_time
+
+    print("Level {} difficulty {}: wave {}/{}, {} lives lost, {} protein left ({:.1f}s of game time in {:.2f}s)".format(
+        results["level"], results["difficulty"], results["wave"], results["max_wave"], results["lives_lost"],
+        results["protein"], results["game_time"], results["real_time"]))
+    for tower in results["towers"]:
+        print("    {} at ({}, {}) stage {}: {} hits, {} kills{}".format(tower["name"], tower["x"], tower["y"], tower["stage"],
+            tower["hits"], tower["kills"], " (destroyed)" if tower["destroyed"] else ""))
+    if len(sys.argv) > 4:
+        with open(sys.argv[4], "w") as out_file:
+            json.dump(results, out_file, indent=4)
+        print("Results written to " + sys.argv[4])
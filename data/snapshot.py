@@ -0,0 +1,142 @@
+import io
+import pickle
+import zlib
+
+from data.settings import *
+
+# goes up by one with any change to what a snapshot keeps or to the classes in it, so old ones aren't loaded into the wrong code
+# (a built game doesn't have its source for data/replay.py to check)
+SNAPSHOT_VERSION = 1
+
+# what a snapshot keeps of the game itself, everything these refer to (enemies, towers, timers...) comes along with them
+GAME_STATE = ["ticks", "protein", "lives", "leaks", "wave", "in_a_wave", "time_passed", "text", "cause_of_death", "current_tower",
+              "show_advisor", "starts", "random", "scheduler", "enemy_store", "projectile_store",
+              "speed"] # the speed doesn't change the ticks, but it's in the header, which moves the rest of the UI about
+SPRITE_GROUPS = ["enemies", "towers", "projectiles", "explosions", "obstacles"] # obstacles has the towers in it too
+# parts of the game that are only ever changed in place or don't change at all, so a snapshot just refers to them
+SHARED = ["map", "pathfinder", "path_worker", "clock", "camera", "ui", "textbox", "new_enemy_box", "goals"] + SPRITE_GROUPS
+TEXTBOX_STATE = ["text", "current_text", "position", "writing", "enabled", "yoffset"]
+NEW_ENEMY_BOX_STATE = ["enemy", "show", "enabled", "opacity"]
+
+def find_constants(value, constants):
+    # the images and sounds loaded from the tower and enemy data, which sprites keep references to
+    if isinstance(value, dict):
+        for item in value.values():
+            find_constants(item, constants)
+    elif isinstance(value, list):
+        for item in value:
+            find_constants(item, constants)
+    elif isinstance(value, (pg.Surface, pg.mixer.Sound)):
+        constants.append(value)
+    return constants
+
+class SnapshotPickler(pickle.Pickler):
+    def __init__(self, file, snapshots):
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+        self.snapshots = snapshots
+
+    def persistent_id(self, obj):
+        key = self.snapshots.keys.get(id(obj))
+        if key != None:
+            return key
+        if isinstance(obj, pg.Surface): # images made for drawing (scaled, rotated or tinted) are made again after loading
+            return ("image",)
+        return None
+
+class SnapshotUnpickler(pickle.Unpickler):
+    def __init__(self, file, snapshots):
+        super().__init__(file)
+        self.snapshots = snapshots
+
+    def persistent_load(self, key):
+        if key == ("image",):
+            return None
+        return self.snapshots.objects[key]
+
+class Snapshots():
+    # Compact copies of everything in a game that changes as it's played, which the game can be put back to later
+    # Snapshots are pickled and compressed, with the map, pathfinder, UI and loaded images left out and referred to instead
+    # A snapshot can only be taken while no paths are being worked out, since the path worker's job isn't part of it
+    def __init__(self, game):
+        self.game = game
+        self.keys = {} # id of each shared object -> the key a snapshot refers to it by
+        self.objects = {} # and back again
+        self.share(("game",), game)
+        for name in SHARED:
+            if getattr(game, name, None) != None:
+                self.share(("game", name), getattr(game, name))
+        for i, constant in enumerate(find_constants([TOWER_DATA, ENEMY_DATA], [])):
+            self.share(("constant", i), constant)
+        for i, wall in enumerate(obstacle for obstacle in game.obstacles if obstacle not in game.towers):
+            self.share(("wall", i), wall)
+
+    def share(self, key, obj):
+        self.keys[id(obj)] = key
+        self.objects[key] = obj
+
+    def can_take(self):
+        return not self.game.paths_pending
+
+    def take(self):
+        game = self.game
+        state = {
+            "game": {name: getattr(game, name) for name in GAME_STATE},
+            "texts": getattr(game, "texts", None),
+            "groups": {name: list(getattr(game, name)) for name in SPRITE_GROUPS},
+            "map": (game.map.map, game.map.tower_map, game.map.valid_tower_tiles),
+            "seen_enemies": SAVE_DATA["seen_enemies"] # whether the new enemy box comes up, which changes what a click does
+        }
+        if not game.headless:
+            # the arrow's rects are only worked out when the UI is opened or closed, not when the UI changes width
+            state["ui"] = (game.ui.active, game.ui.rect, game.ui.adjusted_rect, game.ui.tower, game.ui.wave, game.ui.next_wave_btn_enabled)
+            state["textbox"] = {name: getattr(game.textbox, name) for name in TEXTBOX_STATE}
+            state["new_enemy_box"] = {name: getattr(game.new_enemy_box, name) for name in NEW_ENEMY_BOX_STATE}
+
+        file = io.BytesIO()
+        SnapshotPickler(file, self).dump(state)
+        return zlib.compress(file.getvalue())
+
+    def load(self, snapshot):
+        game = self.game
+        state = SnapshotUnpickler(io.BytesIO(zlib.decompress(snapshot)), self).load()
+        for name, value in state["game"].items():
+            setattr(game, name, value)
+        if state["texts"] != None:
+            game.texts = state["texts"]
+        for name, sprites in state["groups"].items():
+            # the loaded sprites already know which groups they're in, so only the groups themselves are changed
+            # (Group.empty would trip over towers, whose Sprite.__init__ runs twice and forgets about obstacles)
+            group = getattr(game, name)
+            for sprite in group.sprites():
+                group.remove_internal(sprite)
+            for sprite in sprites:
+                group.add_internal(sprite)
+        game.map.map, game.map.tower_map, game.map.valid_tower_tiles = state["map"]
+        SAVE_DATA["seen_enemies"][:] = state["seen_enemies"]
+
+        # everything worked out from the map is worked out again
+        game.paths_pending = False
+        game.pathfinder.update_nodes(game.map.get_map())
+        game.calculate_path()
+        for enemy in game.enemies:
+            enemy.load_image()
+        for explosion in game.explosions:
+            explosion.load_image()
+
+        if not game.headless:
+            game.draw_tower_bases_wrapper()
+            game.make_stripped_path_wrapper()
+            if game.show_advisor:
+                game.make_advisor_surf_wrapper()
+
+            game.ui.active, game.ui.rect, game.ui.adjusted_rect, game.ui.tower, game.ui.wave, game.ui.next_wave_btn_enabled = state["ui"]
+            game.ui.generate_header()
+            game.ui.generate_body()
+            game.ui.generate_next_wave_wrapper()
+            for name, value in state["textbox"].items():
+                setattr(game.textbox, name, value)
+            game.textbox.draw()
+            for name, value in state["new_enemy_box"].items():
+                setattr(game.new_enemy_box, name, value)
+            if game.new_enemy_box.enemy != None:
+                game.new_enemy_box.draw()
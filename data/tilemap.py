@@ -1,4 +1,6 @@
 from pytmx.util_pygame import load_pygame
+import pytmx
+from hashlib import sha1
 
 from data.settings import *
 
@@ -21,12 +23,17 @@ def clamp(x, s, b):
     return max(min(x, b), s)
 
 class TiledMap:
-    def __init__(self, filename):
-        tm = load_pygame(filename, pixelalpha=True)
+    def __init__(self, filename, headless = False):
+        if headless: # the tile images need a display mode, and only the objects and tile sizes are needed to play the map
+            tm = pytmx.TiledMap(filename)
+        else:
+            tm = load_pygame(filename, pixelalpha=True)
         self.width = tm.width * tm.tilewidth
         self.height = tm.height * tm.tileheight
         self.tilesize = tm.tilewidth
         self.tmxdata = tm
+        with open(filename, "rb") as map_file:
+            self.hash = sha1(map_file.read()).hexdigest() # identifies the map for anything cached on disk
         self.start = [[False for row in range(self.tmxdata.height)] for col in range(self.tmxdata.width)]
         self.clear_map()
 
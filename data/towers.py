@@ -1,10 +1,12 @@
 import math
+import numpy
 import pygame as pg
 from data.tilemap import round_to_mtilesize
-from data.pathfinding import heuristic, manhattan
-from data.settings import TOWER_DATA
+from data.pathfinding import manhattan
+from data.settings import TOWER_DATA, TICK_TIME
 from data.tilemap import *
 from data.game_misc import Explosion
+from data.enemies import stored, ColumnStore
 
 class Obstacle(pg.sprite.Sprite):
     def __init__(self, game, x, y, w, h):
@@ -16,147 +18,301 @@ class Obstacle(pg.sprite.Sprite):
             for j in range(tile_from_xcoords(h, self.game.map.tilesize)):
                 self.game.map.change_node(tile_from_xcoords(x, self.game.map.tilesize) + i, tile_from_xcoords(y, self.game.map.tilesize) + j, 1)
 
-class Projectile(pg.sprite.Sprite):
-    def __init__(self, args):
-        self.groups = args[0].projectiles
-        self.clock = args[0].clock
-        pg.sprite.Sprite.__init__(self, self.groups)
-        self.game = args[0]
-        self.type = type
-        self.size = args[4].get_size()
-        self.rect = pg.Rect(args[2], args[3], self.size[0], self.size[1])
-        self.rect.centerx = args[2]
-        self.rect.centery = args[3]
-        self.raw_image = args[4]
-        self.speed = args[5]
-        self.slow_speed = args[7]
-        self.slow_duration = args[8]
-        self.damage = args[10]
-        self.direction = args[9]
-        self.image = pg.transform.rotate(self.raw_image, math.degrees(args[9]))
-        self.shield_damage = args[11]
-        self.strikethrough = args[12]
-        self.time_passed = 0
-        self.carry = 0
-        self.end = args[6] * 1000
-        self.tower = args[1]
-
-    def update(self):
-        if self.time_passed > self.end:
-            self.kill()
-
-        self.delta = self.clock.get_time()
-        self.time_passed += self.delta
-        self.delta /= 1000
-        self.carry += self.delta
-        if self.carry >= 1 / self.speed:
-            self.rect.centerx -= round(self.carry * self.speed * math.sin(self.direction))
-            self.rect.centery -= round(self.carry * self.speed * math.cos(self.direction))
-            self.carry = 0
+ROTATED_IMAGES = {} # (bullet image, direction in whole degrees) -> the image turned that way, shared by every projectile
+FAST_PROJECTILE_SPEED = 1000 # px/s, tracking projectiles at least this fast have their hit worked out when they're shot
+
+class ProjectileStore(ColumnStore):
+    # Every projectile in a game, like EnemyStore: where each one is, which way it's going and when it runs out are columns,
+    # so they all home in, move and run out in one step
+    # Only the projectiles touching an enemy have their own methods called (Projectile.hit)
+    # Fast ones go straight to where they'll meet their enemy and hit it on a timer instead (Projectile.aim),
+    # so they're only drawn where they'd be by then and left out of everything else here
+    # Projectiles are pooled, so towers shoot the sprites of ones that have hit something or run out again
+    COLUMNS = {
+        "x": numpy.int64, "y": numpy.int64, "w": numpy.int64, "h": numpy.int64, # the projectile's rect
+        "direction": numpy.float64, # in radians, 0 is up and it goes anticlockwise (the same as the bullet image is rotated)
+        "speed": numpy.float64,
+        "carry": numpy.float64, # seconds since it last moved, since it only moves once it would go at least a pixel
+        "end": numpy.float64, # game time (see Scheduler) when it runs out
+        "damage": numpy.float64,
+        "shield_damage": numpy.float64,
+        "tracking": bool,
+        "rotation_speed": numpy.float64, # in radians per tick
+        "range": numpy.float64, # how far away a tracked enemy can get before it's lost
+        "order": numpy.int64, # how many projectiles were shot before this one
+        "timed": bool, # whether its hit is on a timer (see Projectile.aim)
+        "fired": numpy.float64 # game time when it was shot
+    }
+
+    def __init__(self, game, capacity = 64):
+        super().__init__(capacity)
+        self.game = game
+        self.pool = [] # projectiles that can be shot again
+
+    def shoot(self, tower, direction):
+        projectile = self.pool.pop() if self.pool else Projectile(self)
+        self.add(projectile)
+        projectile.load(tower, direction)
+        projectile.add(self.game.projectiles)
+        if tower.tracking and tower.directions == 1 and tower.bullet_speed >= FAST_PROJECTILE_SPEED and projectile.enemy != None:
+            projectile.aim()
+
+    def remove(self, projectile):
+        super().remove(projectile)
+        projectile.enemy = None
+        projectile.tower = None
+        self.pool.append(projectile)
+
+    def update(self, passed_time):
+        if len(self.objects) == 0:
+            return
+        for projectile in self.get_objects(self.get_columns(len(self.objects))["end"] <= self.game.scheduler.now):
+            projectile.kill()
+
+        columns = self.get_columns(len(self.objects))
+        stepped = ~columns["timed"]
+        if (columns["tracking"] & stepped).any():
+            self.home_in(columns)
+
+        # a projectile moves in one go once it's been long enough since it last moved for it to go at least a pixel
+        start_x, start_y = columns["x"].copy(), columns["y"].copy()
+        columns["carry"] += passed_time
+        moving = numpy.flatnonzero((columns["carry"] >= 1 / columns["speed"]) & stepped)
+        step = columns["carry"][moving] * columns["speed"][moving]
+        columns["x"][moving] -= numpy.round(step * numpy.sin(columns["direction"][moving])).astype(numpy.int64)
+        columns["y"][moving] -= numpy.round(step * numpy.cos(columns["direction"][moving])).astype(numpy.int64)
+        columns["carry"][moving] = 0
+
+        # every projectile's move this tick against the enemies it went near (see EnemyStore.sweep), and then the ones that
+        # hit something go one at a time, since each hit can kill an enemy the projectiles after it would have hit
+        # The projectiles go in the order they were shot, and each one's enemies in the order it touched them
+        # (and the order of the enemies group when it touched more than one at once)
+        enemy_store = self.game.enemy_store
+        stepped = numpy.flatnonzero(stepped)
+        if len(enemy_store) == 0 or len(stepped) == 0:
+            return
+        pairs, enemy_rows, times = enemy_store.sweep(start_x[stepped], start_y[stepped], columns["x"][stepped], columns["y"][stepped],
+                                                     columns["w"][stepped], columns["h"][stepped])
+        rows = stepped[pairs]
+        order = numpy.lexsort((enemy_store.columns["order"][enemy_rows], times, columns["order"][rows]))
+        hits = []
+        for row, enemy_row, time in zip(rows[order].tolist(), enemy_rows[order].tolist(), times[order].tolist()):
+            if not hits or hits[-1][0] != row:
+                hits.append((row, self.objects[row], start_x[row].item(), start_y[row].item(), columns["x"][row].item(), columns["y"][row].item(), []))
+            hits[-1][-1].append((time, enemy_store.objects[enemy_row]))
+        for row, projectile, x1, y1, x2, y2, touched in hits:
+            touched = [(time, enemy) for time, enemy in touched if enemy.alive()]
+            if len(touched) == 0:
+                continue
+            if not projectile.strikethrough: # it stops where it touched the first one, which is where an explosion goes off
+                projectile.x = x1 + round((x2 - x1) * touched[0][0])
+                projectile.y = y1 + round((y2 - y1) * touched[0][0])
+            projectile.hit([enemy for time, enemy in touched])
+
+    def home_in(self, columns):
+        # tracking projectiles turn towards their enemy as far as they can in a tick, and look for the closest enemy
+        # (which they start turning towards on the next tick) once they lose it
+        rows = numpy.flatnonzero(columns["tracking"] & ~columns["timed"])
+        projectiles = [self.objects[row] for row in rows.tolist()]
+        center_x = columns["x"][rows] + columns["w"][rows] // 2
+        center_y = columns["y"][rows] + columns["h"][rows] // 2
+        enemy_x = numpy.array([projectile.enemy.rect.centerx if projectile.enemy != None else 0 for projectile in projectiles])
+        enemy_y = numpy.array([projectile.enemy.rect.centery if projectile.enemy != None else 0 for projectile in projectiles])
+        dx = enemy_x - center_x
+        dy = enemy_y - center_y
+        tracked = numpy.array([projectile.enemy != None and projectile.enemy.damagable and projectile.enemy.alive() for projectile in projectiles], dtype = bool)
+        tracked &= numpy.abs(dx) + numpy.abs(dy) <= columns["range"][rows]
+
+        turning = rows[tracked]
+        target = numpy.arctan2(-dx[tracked], -dy[tracked])
+        turn = (target - columns["direction"][turning] + math.pi) % (math.pi * 2) - math.pi
+        rotation_speed = columns["rotation_speed"][turning]
+        columns["direction"][turning] = (columns["direction"][turning] + numpy.clip(turn, -rotation_speed, rotation_speed)) % (math.pi * 2)
+
+        # and the closest enemy to each one that lost its own comes from the cells around it (see EnemyGrid)
+        lost = numpy.flatnonzero(~tracked)
+        grid = self.game.enemy_store.get_grid()
+        for i, x, y in zip(lost.tolist(), center_x[lost].tolist(), center_y[lost].tolist()):
+            projectiles[i].enemy = grid.get_nearest(x, y)
 
-        self.check_for_impact()
+class Projectile(pg.sprite.Sprite):
+    # A projectile is only drawn and checked by itself when it hits something, the rest is done by its ProjectileStore
+    x = stored("x")
+    y = stored("y")
+    w = stored("w")
+    h = stored("h")
+    direction = stored("direction")
+    speed = stored("speed")
+    timed = stored("timed")
+    fired = stored("fired")
+    damage = stored("damage")
+    shield_damage = stored("shield_damage")
+
+    def __init__(self, store):
+        super().__init__()
+        self.game = store.game
+        self.store = store
+
+    def load(self, tower, direction):
+        # a projectile shot from the middle of tower
+        columns = self.store.columns
+        row = self.row
+        self.tower = tower
+        self.raw_image = tower.bullet_image
+        w, h = self.raw_image.get_size()
+        columns["w"][row], columns["h"][row] = w, h
+        columns["x"][row] = tower.rect.centerx - w // 2
+        columns["y"][row] = tower.rect.centery - h // 2
+        columns["direction"][row] = direction
+        columns["speed"][row] = tower.bullet_speed
+        columns["carry"][row] = 0
+        columns["end"][row] = self.game.scheduler.now + tower.bullet_lifetime * 1000
+        columns["damage"][row] = tower.true_damage
+        columns["shield_damage"][row] = tower.true_shield_damage
+        columns["tracking"][row] = tower.tracking
+        columns["rotation_speed"][row] = math.radians(tower.rotation_speed) if tower.tracking else 0
+        columns["range"][row] = tower.true_range
+        columns["timed"][row] = False
+        columns["fired"][row] = self.game.scheduler.now
+
+        self.slow_speed = tower.slow_speed
+        self.slow_duration = tower.slow_duration
+        self.strikethrough = tower.strikethrough
+        self.enemy = tower.current_enemy if tower.tracking else None
+        self.explosion_radius = tower.explosion_radius if tower.explode_on_impact else None
+        self.explosion_color = tower.explosion_color if tower.explode_on_impact else None
+
+    @property
+    def rect(self):
+        if not self.timed:
+            return pg.Rect(self.x, self.y, self.w, self.h)
+        # on its way to a timed hit, x and y are where it was shot from
+        # (and it moves a tick's worth as soon as it's shot, like the others do)
+        travel = self.speed * ((self.game.scheduler.now - self.fired + TICK_TIME) / 1000)
+        return pg.Rect(self.x - round(travel * math.sin(self.direction)), self.y - round(travel * math.cos(self.direction)), self.w, self.h)
+
+    def aim(self):
+        # works out when and where the projectile meets its enemy if the enemy keeps going along its path at the same speed,
+        # then sends it straight there with a timer for the hit, instead of it homing in and being checked every tick
+        # it's left to home in like any other if it'd run out first
+        enemy = self.enemy
+        tick = TICK_TIME / 1000
+        speed = self.speed
+        if enemy.speed >= speed:
+            return
+        rect = self.rect
+        origin_x, origin_y = rect.x + rect.w / 2, rect.y + rect.h / 2
+        reach = (min(rect.w, rect.h) + min(enemy.rect.w, enemy.rect.h)) / 2 # how close their middles are when they touch
+        lifetime = (self.store.columns["end"][self.row] - self.game.scheduler.now) / 1000
+
+        start = 0 # seconds until the enemy gets to the start of each stretch of its path
+        for x, y, dx, dy, length in enemy.get_stretches():
+            if start >= lifetime:
+                return
+            # the enemy is at (x, y) + (dx, dy) * enemy.speed * time into the stretch, and they meet when it's as far from the
+            # projectile's start as the projectile has gone plus reach, which comes out as a quadratic in time
+            # (with only one root after the enemy gets to the stretch, since the projectile is faster)
+            offset_x, offset_y = x - origin_x, y - origin_y
+            velocity_x, velocity_y = dx * enemy.speed, dy * enemy.speed
+            ahead = speed * (start + tick) + reach
+            a = velocity_x ** 2 + velocity_y ** 2 - speed ** 2
+            b = 2 * (offset_x * velocity_x + offset_y * velocity_y - speed * ahead)
+            c = offset_x ** 2 + offset_y ** 2 - ahead ** 2
+            time = 0 if c <= 0 else (-b - math.sqrt(b * b - 4 * a * c)) / (2 * a)
+            duration = length / enemy.speed if enemy.speed > 0 else math.inf
+            if time <= duration:
+                break
+            start += duration
+        else:
+            return # the enemy gets to the end of its path first
+
+        # the hit happens on the first tick the stepped projectile would have been touching the enemy,
+        # which is checked after everything has moved, so the timer goes off at the start of the tick after
+        ticks = math.ceil((start + time) / tick)
+        if ticks * TICK_TIME >= lifetime * 1000:
+            return
+        meet_x, meet_y = x + velocity_x * time, y + velocity_y * time
+        distance = math.hypot(meet_x - origin_x, meet_y - origin_y)
+        if distance > 0:
+            self.direction = math.atan2(origin_x - meet_x, origin_y - meet_y)
+        travel = max(distance - reach, 0)
+        self.hit_x = round(origin_x - travel * math.sin(self.direction) - rect.w / 2)
+        self.hit_y = round(origin_y - travel * math.cos(self.direction) - rect.h / 2)
+        self.hit_path = enemy.path
+        self.hit_distance = enemy.distance + enemy.speed * ticks * tick # how far along its path the enemy should be by then
+        self.timed = True
+        self.game.scheduler.schedule((ticks + 0.5) * TICK_TIME, self.land, self.store.columns["order"][self.row].item())
+
+    def land(self, order):
+        # the timer from aim, which the projectile (or another one using the same sprite from the pool) may have outlived
+        if not self.alive() or self.store.columns["order"][self.row] != order:
+            return
+        enemy = self.enemy
+        if enemy.alive() and enemy.damagable and enemy.path is self.hit_path and abs(enemy.distance - self.hit_distance) < 0.5:
+            # a stepped projectile would have hit whatever it touched first on the way, so the straight line it took is
+            # checked against the enemies too (where they are now, which is at most a few ticks' moving from where they were)
+            touched = []
+            rect = pg.Rect(self.x, self.y, self.w, self.h)
+            for time, other in self.game.enemy_store.get_grid().get_touched(rect, self.hit_x - self.x, self.hit_y - self.y):
+                if other is enemy:
+                    break
+                touched.append((time, other))
+            else:
+                time = 1
+            touched.append((time, enemy))
+
+            self.timed = False
+            # like the stepped ones, it stops where it touched the first one unless it goes through them
+            time = 1 if self.strikethrough else touched[0][0]
+            self.x += round((self.hit_x - self.x) * time)
+            self.y += round((self.hit_y - self.y) * time)
+            self.hit([other for time, other in touched])
+        else:
+            # the enemy was killed, slowed, sent another way or stopped being damagable in the meantime, so the projectile
+            # carries on from where it got to by the end of the last tick (this tick's move comes with the rest of them)
+            travel = self.speed * ((self.game.scheduler.now - self.fired) / 1000)
+            self.x -= round(travel * math.sin(self.direction))
+            self.y -= round(travel * math.cos(self.direction))
+            self.timed = False
+            self.store.columns["carry"][self.row] = 0
+
+    @property
+    def image(self): # only needed for drawing, so it's only turned then
+        key = (self.raw_image, round(math.degrees(self.direction)) % 360)
+        if key not in ROTATED_IMAGES:
+            ROTATED_IMAGES[key] = pg.transform.rotate(self.raw_image, key[1])
+        return ROTATED_IMAGES[key]
+
+    def kill(self):
+        if self.alive():
+            self.store.remove(self)
+        super().kill()
+
+    def hit(self, enemies):
+        # enemies are the ones this projectile is touching
+        if len(enemies) == 0:
+            return
+        if self.explosion_radius != None:
+            # everything around the first hit is caught in the explosion
+            rect = self.rect
+            center = rect.center
+            rect.width = rect.height = self.explosion_radius
+            rect.center = center
+            self.x, self.y, self.w, self.h = rect
+            enemies = self.game.enemy_store.get_grid().get_in_rect(rect)
+            Explosion(self.game, rect.center[0], rect.center[1], self.explosion_radius, self.explosion_color)
+        else:
+            enemies = enemies[:1]
 
-    def check_for_impact(self):
-        hits = pg.sprite.spritecollide(self, self.game.enemies, False)
-        if (hits):
+        for enemy in enemies:
             self.tower.hits += 1
-            if hits[0].damage(self.damage, self.shield_damage):
+            if enemy.damage(self.damage, self.shield_damage):
                 self.tower.kills += 1
             if self.slow_speed != 1:
-                hits[0].slow(self.slow_speed, self.slow_duration)
-            if not self.strikethrough:
-                self.kill()
-
-class TrackingProjectile(Projectile):
-    def __init__(self, args):
-        Projectile.__init__(self, args[:-3])
-        self.rotation_speed = math.radians(args[-3])
-        self.range = args[-2]
-        self.enemy = args[-1]
-
-    def update(self):
-        if self.enemy != None:
-            enemy_center = self.enemy.rect.center
-            if (not self.enemy.damagable or not self.enemy.alive() or heuristic(
-                    enemy_center, self.rect.center) > self.range):
-                self.enemy = None
-
-            else:
-                temp_x = enemy_center[0]
-                temp_y = enemy_center[1]
+                enemy.slow(self.slow_speed, self.slow_duration)
 
-                if (temp_y - self.rect.centery == 0):
-                    if (temp_x - self.rect.centerx > 0):
-                        direction = math.pi * 3 / 2
-                    else:
-                        direction = math.pi / 2
-
-                else:
-                    direction = math.atan((temp_x - self.rect.centerx) / (temp_y - self.rect.centery))
-                    if (temp_y - self.rect.centery > 0):
-                        direction += math.pi
-
-                if direction - self.direction > math.pi:
-                    direction -= math.pi * 2
-
-                elif direction - self.direction < -math.pi:
-                    direction += math.pi * 2
-
-                if direction - self.direction > self.rotation_speed:
-                    self.direction += self.rotation_speed
-                    self.direction %= 2 * math.pi
-                elif direction - self.direction < -self.rotation_speed:
-                    self.direction -= self.rotation_speed
-                    self.direction %= 2 * math.pi
-                else:
-                    self.direction = direction
-                    self.direction %= 2 * math.pi
-                self.image = pg.transform.rotate(self.raw_image, math.degrees(self.direction))
-
-        if self.enemy == None:
-            self.search_for_enemy()
-
-        super().update()
-
-    def search_for_enemy(self):
-        if self.enemy != None:
-            enemy_her = heuristic(self.enemy.rect.center, self.rect.center)
-
-        for enemy in self.game.enemies:
-            t_enemy_her = heuristic(enemy.rect.center, self.rect.center)
-            if self.enemy == None or t_enemy_her < enemy_her:
-                self.enemy = enemy
-                enemy_her = t_enemy_her
-
-class ExplodingProjectile(Projectile):
-    def __init__(self, args):
-        Projectile.__init__(self, args[:-1])
-        self.explosion_radius = args[-2]
-        self.explosion_color = args[-1]
-
-    def check_for_impact(self):
-        hits = pg.sprite.spritecollide(self, self.game.enemies, False)
-        if (hits):
-            center = self.rect.center
-            self.rect.width = self.rect.height = self.explosion_radius
-            self.rect.center = center
-            hits = pg.sprite.spritecollide(self, self.game.enemies, False)
-            Explosion(self.game, self.rect.center[0], self.rect.center[1], self.explosion_radius, self.explosion_color)
-            for hit in hits:
-                self.tower.hits += 1
-                if hit.damage(self.damage, self.shield_damage):
-                    self.tower.kills += 1
-                if self.slow_speed != 1:
-                    hit.slow(self.slow_speed, self.slow_duration)
-
-            if not self.strikethrough:
-                self.kill()
-
-class TrackingExplodingProjectile(TrackingProjectile, ExplodingProjectile):
-    def __init__(self, args):
-        TrackingProjectile.__init__(self, args[:-2])
-        self.explosion_radius = args[-2]
-        self.explosion_color = args[-1]
+        if not self.strikethrough:
+            self.kill()
 
 class Tower(Obstacle):
     def __init__(self, game, x, y, name):
@@ -168,8 +324,9 @@ class Tower(Obstacle):
         self.stage = 0
         self.load_tower_data()
 
-        self.time_passed = 0
-        self.next_spawn = 1
+        self.ready = False # set by the game's scheduler once the tower can attack again
+        self.reloaded = 0 # when it could attack again
+        self.game.scheduler.schedule(1, self.reload)
 
         self.rotation = 0
         self.current_enemy = None
@@ -260,8 +417,17 @@ class Tower(Obstacle):
                         continue
                     hit.debuff(self, self.aoe_buff_type, self.aoe_buff_amount)
 
+    def reload(self):
+        self.ready = True
+        self.reloaded = self.game.scheduler.due
+
+    def schedule_reload(self):
+        # counts from when it could first have attacked in this tick, so the attack speed isn't rounded up to whole ticks
+        self.ready = False
+        self.game.scheduler.schedule_at(max(self.reloaded, self.game.scheduler.now - TICK_TIME) + self.true_attack_speed * 1000, self.reload)
+
     def update(self):
-        if self.time_passed >= self.next_spawn:
+        if self.ready:
             if self.area_of_effect:
                 if self.aoe_buff:
                     hits = pg.sprite.spritecollide(self.aoe_sprite, self.game.towers, False)
@@ -273,15 +439,17 @@ class Tower(Obstacle):
                     return
 
                 self.update_aoe_sprite(self.true_range)
-                hits = pg.sprite.spritecollide(self.aoe_sprite, self.game.enemies, False)
+                hits = self.game.enemy_store.get_grid().get_in_rect(self.aoe_sprite.rect)
                 if (hits):
                     for hit in hits:
-                        hit.damage(self.true_damage, self.shield_damage)
+                        self.hits += 1
+                        if hit.damage(self.true_damage, self.shield_damage):
+                            self.kills += 1
                         if self.slow_speed != 1:
                             hit.slow(self.slow_speed, self.slow_duration)
-                    TOWER_DATA[self.name]["stages"][self.stage]["shoot_sound"].play()
-                    self.next_spawn = self.true_attack_speed * 1000
-                    self.time_passed = 0
+                    if not self.game.headless:
+                        TOWER_DATA[self.name]["stages"][self.stage]["shoot_sound"].play()
+                    self.schedule_reload()
 
             elif self.current_enemy is not None:
                 enemy_center = self.current_enemy.rect.center
@@ -314,26 +482,12 @@ class Tower(Obstacle):
                     rotation = self.rotation
                     increment = math.pi * 2 / self.directions
                     for i in range(self.directions):
-                        if self.tracking:
-                            if self.explode_on_impact:
-                                TrackingExplodingProjectile([self.game, self, self.rect.centerx, self.rect.centery, self.bullet_image, self.bullet_speed,
-                                       self.bullet_lifetime, self.slow_speed, self.slow_duration, rotation, self.true_damage, self.true_shield_damage, self.strikethrough, self.rotation_speed, self.true_range, self.current_enemy, self.explosion_radius, self.explosion_color])
-                            else:
-                                TrackingProjectile([self.game, self, self.rect.centerx, self.rect.centery, self.bullet_image, self.bullet_speed,
-                                       self.bullet_lifetime, self.slow_speed, self.slow_duration, rotation, self.true_damage, self.true_shield_damage, self.strikethrough, self.rotation_speed, self.true_range, self.current_enemy])
-
-                        else:
-                            if self.explode_on_impact:
-                                ExplodingProjectile([self.game, self, self.rect.centerx, self.rect.centery, self.bullet_image, self.bullet_speed,
-                                       self.bullet_lifetime, self.slow_speed, self.slow_duration, rotation, self.true_damage, self.true_shield_damage, self.strikethrough, self.rotation_speed, self.true_range, self.current_enemy, self.explosion_radius, self.explosion_color])
-                            else:
-                                Projectile([self.game, self, self.rect.centerx, self.rect.centery, self.bullet_image, self.bullet_speed, self.bullet_lifetime, self.slow_speed, self.slow_duration, rotation, self.true_damage, self.true_shield_damage, self.strikethrough])
-
+                        self.game.projectile_store.shoot(self, rotation)
                         rotation += increment
 
-                    self.sound.play()
-                    self.next_spawn = self.true_attack_speed * 1000
-                    self.time_passed = 0
+                    if not self.game.headless:
+                        self.sound.play()
+                    self.schedule_reload()
 
         if not self.area_of_effect and \
                 (self.current_enemy == None or
@@ -342,8 +496,6 @@ class Tower(Obstacle):
             self.current_enemy = None
             self.search_for_enemy()
 
-        self.time_passed += self.clock.get_time()
-
     def update_aoe_sprite(self, true_range):
         self.aoe_sprite.rect.x = self.rect.x - (true_range - self.game.map.tilesize) / 2
         self.aoe_sprite.rect.y = self.rect.y - (true_range - self.game.map.tilesize) / 2
@@ -398,8 +550,9 @@ class Tower(Obstacle):
                     hit.buff(self, self.aoe_buff_type, self.aoe_buff_amount)
 
     def search_for_enemy(self):
-        for enemy in self.game.enemies:
-            if manhattan((enemy.rect.center[0], enemy.rect.center[1]), (self.rect.center[0], self.rect.center[1])) <= self.true_range and enemy.damagable:
+        # only the enemies in the cells around the tower are looked at (see EnemyGrid), in the same order as the enemies group
+        for enemy in self.game.enemy_store.get_grid().get_in_range(self.rect.center[0], self.rect.center[1], self.true_range):
+            if enemy.damagable:
                 if self.current_enemy is None:
                     self.current_enemy = enemy
                     continue
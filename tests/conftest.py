@@ -0,0 +1,15 @@
+# Run from the game folder with: python -m pytest
+import os
+import sys
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy") # settings.py starts pygame up when it's imported, no window is ever opened
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import data.game
+
+@pytest.fixture(autouse = True)
+def path_cache(tmp_path, monkeypatch):
+    # games cache their flying routes when a level starts, which shouldn't end up in the game's own cache folder
+    monkeypatch.setattr(data.game, "PATH_CACHE_FOLDER", str(tmp_path / "path_cache"))
@@ -0,0 +1,144 @@
+# Maps for the tests, and plain, slow versions of what data/pathfinding.py works out to check it against
+import random
+from collections import deque
+from functools import lru_cache
+
+from data.settings import *
+from data.tilemap import TiledMap
+from data.game import Game
+
+LAYERS = ((1, "artery_entrances"), (2, "arteries"), (-1, "vein_entrances"), (-2, "veins"))
+RANDOM_MAPS = 24
+
+def random_map(seed):
+    # a small map with walls, goals and starts anywhere, and sometimes arteries and/or veins
+    # goal tiles are walls and start tiles aren't, like Game.load_map makes them
+    rng = random.Random(seed)
+    width, height = rng.randint(3, 14), rng.randint(3, 14)
+    walls = rng.choice([0.1, 0.25, 0.4])
+    path_data = {"base_map": [[int(rng.random() < walls) for y in range(height)] for x in range(width)]}
+    for name in rng.choice([(), ("arteries",), ("veins",), ("arteries", "veins")]):
+        entrances = "artery_entrances" if name == "arteries" else "vein_entrances"
+        path_data[name] = [[int(rng.random() < 0.5) for y in range(height)] for x in range(width)]
+        path_data[entrances] = [[int(rng.random() < 0.8) for y in range(height)] for x in range(width)]
+
+    tiles = [(x, y) for x in range(width) for y in range(height)]
+    rng.shuffle(tiles)
+    goals = tiles[:rng.randint(1, 3)]
+    starts = tiles[len(goals):len(goals) + rng.randint(1, 4)]
+    for x, y in goals:
+        path_data["base_map"][x][y] = 1
+    for x, y in starts:
+        path_data["base_map"][x][y] = 0
+    path_data["goals"] = [(goal, 0) for goal in goals]
+    return path_data, [(start, 0) for start in starts]
+
+@lru_cache(maxsize = None)
+def level_maps():
+    # {name: (path_data, start nodes)} for every map in data/maps with starts and goals, loaded like data/benchmark.py does
+    game = Game(None, headless = True)
+    maps = {}
+    for file in sorted(listdir(MAP_FOLDER)):
+        if file.endswith(".tmx"):
+            game.map = TiledMap(path.join(MAP_FOLDER, file), headless = True)
+            path_data = game.load_map()
+            starts = game.get_start_nodes()
+            if starts and path_data["goals"]:
+                maps[file[:-4]] = (path_data, starts)
+    return maps
+
+def get_map(name):
+    # returns a fresh copy of the map's (path_data, starts), so a test can change it
+    if name.startswith("random"):
+        return random_map(int(name[6:]))
+    path_data, starts = level_maps()[name]
+    return {key: [col[:] for col in value] if key != "goals" else list(value) for key, value in path_data.items()}, list(starts)
+
+def map_names(max_tiles = None):
+    # every random map and level map, or only the ones with at most max_tiles ground tiles
+    names = ["random" + str(seed) for seed in range(RANDOM_MAPS)]
+    for name, (path_data, starts) in level_maps().items():
+        if max_tiles == None or len(path_data["base_map"]) * len(path_data["base_map"][0]) <= max_tiles:
+            names.append(name)
+    return names
+
+def add_towers(path_data, starts, rng, share, keep_routes = False):
+    # the ground map with towers on about share of the open tiles that aren't starts or goals
+    # with keep_routes a tower is only placed if every start can still get to a goal, like the game only allows
+    ground = [col[:] for col in path_data["base_map"]]
+    for x, y in get_tower_tiles(path_data, starts, ground):
+        if rng.random() < share:
+            ground[x][y] = 1
+            if keep_routes and not reaches_goals(path_data, ground, starts):
+                ground[x][y] = 0
+    return ground
+
+def wall_in(path_data, starts, ground):
+    # towers on every tile around the first start, which usually cuts it off
+    for neighbor in get_adjacent(path_data, starts[0]):
+        if neighbor[0] in get_tower_tiles(path_data, starts, ground):
+            ground[neighbor[0][0]][neighbor[0][1]] = 1
+
+def get_tower_tiles(path_data, starts, ground):
+    reserved = {node[0] for node in starts} | {node[0] for node in path_data["goals"]}
+    return [(x, y) for x in range(len(ground)) for y in range(len(ground[0])) if ground[x][y] == 0 and (x, y) not in reserved]
+
+def is_walkable(path_data, ground, node, also_walkable = ()):
+    (x, y), layer = node
+    if node in also_walkable:
+        return True
+    if layer == 0:
+        return ground[x][y] == 0
+    return path_data[dict(LAYERS)[layer]][x][y] == 0
+
+def get_adjacent(path_data, node):
+    (x, y), layer = node
+    width, height = len(path_data["base_map"]), len(path_data["base_map"][0])
+    for neighbor in (((x, y + 1), layer), ((x, y - 1), layer), ((x + 1, y), layer), ((x - 1, y), layer),
+                     ((x, y), layer - 1), ((x, y), layer + 1)):
+        (nx, ny), nlayer = neighbor
+        if 0 <= nx < width and 0 <= ny < height and (nlayer == 0 or dict(LAYERS).get(nlayer) in path_data):
+            yield neighbor
+
+def get_nodes(path_data):
+    width, height = len(path_data["base_map"]), len(path_data["base_map"][0])
+    layers = [0] + [layer for layer, name in LAYERS if name in path_data]
+    return [((x, y), layer) for layer in layers for x in range(width) for y in range(height)]
+
+def get_distances(path_data, ground, also_walkable = ()):
+    # BFS out from the goals (which are where routes end even if they're walls) over the walkable nodes
+    dist = {}
+    queue = deque()
+    for goal in path_data["goals"]:
+        dist[goal] = 0
+        queue.append(goal)
+    while queue:
+        current = queue.popleft()
+        for neighbor in get_adjacent(path_data, current):
+            if neighbor not in dist and is_walkable(path_data, ground, neighbor, also_walkable):
+                dist[neighbor] = dist[current] + 1
+                queue.append(neighbor)
+    return dist
+
+def reaches_goals(path_data, ground, starts, also_walkable = ()):
+    dist = get_distances(path_data, ground, also_walkable)
+    return all(start in dist for start in starts)
+
+def get_route_length(path_data, dist, start):
+    # how many steps the shortest route from start takes, None if there isn't one
+    # a start that's a wall (i.e. a tower was placed on an enemy) steps off onto whichever neighbor is closest
+    if start in dist:
+        return dist[start]
+    lengths = [dist[neighbor] for neighbor in get_adjacent(path_data, start) if neighbor in dist]
+    return min(lengths) + 1 if lengths else None
+
+def check_route(path_data, ground, route, start):
+    # the route goes from start to a goal, one step at a time and only over walkable nodes
+    route = list(route)
+    assert route[0] == start
+    assert route[-1] in path_data["goals"]
+    for node, next_node in zip(route, route[1:]):
+        assert next_node in get_adjacent(path_data, node)
+    for node in route[1:-1]:
+        assert is_walkable(path_data, ground, node)
+    return len(route) - 1
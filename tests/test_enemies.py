@@ -0,0 +1,129 @@
+import random
+from fractions import Fraction
+
+import numpy
+import pytest
+
+from data.settings import *
+from data.enemies import EnemyStore
+
+class Target():
+    # stands in for an Enemy: the grid only needs its rect, its row in the store and whether it's still alive
+    def __init__(self, rect):
+        self.rect = rect
+        self.living = True
+
+    def alive(self):
+        return self.living
+
+def make_store(rng, count, spacing):
+    # enemies across a few grid cells, some of which are removed from the store again, like killed ones are
+    # every spacing pixels (with the same size) so there are ties between them, or anywhere at all sizes if spacing is 1
+    store = EnemyStore(4)
+    targets = []
+    for i in range(count):
+        if spacing > 1:
+            rect = pg.Rect(rng.randint(-2, 20) * spacing, rng.randint(-2, 16) * spacing, 30, 30)
+        else:
+            rect = pg.Rect(rng.randint(-100, 1000), rng.randint(-100, 800), rng.randint(4, 70), rng.randint(4, 70))
+        target = Target(rect)
+        store.add(target)
+        store.columns["x"][target.row], store.columns["y"][target.row] = target.rect.topleft
+        store.columns["w"][target.row], store.columns["h"][target.row] = target.rect.size
+        targets.append(target)
+    for target in rng.sample(targets, count // 5):
+        store.remove(target)
+        targets.remove(target)
+    return store, targets
+
+def get_center(target):
+    return (target.rect.x + target.rect.w // 2, target.rect.y + target.rect.h // 2)
+
+def by_order(store, targets):
+    return sorted(targets, key = lambda target: store.columns["order"][target.row])
+
+@pytest.mark.parametrize("spacing", [1, 16, 50])
+@pytest.mark.parametrize("seed", range(10))
+def test_grid_matches_brute_force(seed, spacing):
+    # each query finds what going through every enemy would, in the enemies group's order,
+    # with the enemies killed since the grid was made left out
+    rng = random.Random(seed)
+    store, targets = make_store(rng, rng.choice([0, 1, 10, 100]), spacing)
+    grid = store.get_grid()
+    for target in rng.sample(targets, len(targets) // 10):
+        target.living = False
+    alive = by_order(store, [target for target in targets if target.alive()])
+
+    for i in range(50):
+        x, y = rng.randint(-300, 1300) // spacing * spacing, rng.randint(-300, 1100) // spacing * spacing
+        radius = rng.choice([0, 20, 64, 128, 300, 2000])
+        assert grid.get_in_range(x, y, radius) == [target for target in alive
+            if (get_center(target)[0] - x) ** 2 + (get_center(target)[1] - y) ** 2 <= radius ** 2]
+
+        rect = pg.Rect(x, y, rng.randint(0, 400), rng.randint(0, 400))
+        assert grid.get_in_rect(rect) == [target for target in alive if target.rect.colliderect(rect)]
+
+        nearest = min(alive, key = lambda target: abs(get_center(target)[0] - x) + abs(get_center(target)[1] - y), default = None)
+        assert grid.get_nearest(x, y) is nearest
+
+def get_touch_time(rect, dx, dy, target):
+    # exactly how far through moving (dx, dy) rect first overlaps target's rect, None if it doesn't at any point
+    enter, leave = None, None # no limits yet
+    for start, move, low, high in ((rect.x, dx, target.rect.left - rect.w, target.rect.right),
+                                   (rect.y, dy, target.rect.top - rect.h, target.rect.bottom)):
+        if move == 0:
+            if not low < start < high:
+                return None
+            continue
+        ends = sorted((Fraction(low - start, move), Fraction(high - start, move)))
+        enter = ends[0] if enter == None else max(enter, ends[0])
+        leave = ends[1] if leave == None else min(leave, ends[1])
+    if enter == None:
+        return Fraction(0)
+    if enter < leave and enter < 1 and leave > 0:
+        return max(enter, Fraction(0))
+    return None
+
+def make_moves(rng, count):
+    # rects of all sizes going every way, some along only one axis or not at all
+    moves = []
+    for i in range(count):
+        dx, dy = rng.randint(-300, 300), rng.randint(-300, 300)
+        if rng.random() < 0.3:
+            dx, dy = rng.choice([(dx, 0), (0, dy), (0, 0)])
+        moves.append((pg.Rect(rng.randint(-200, 1100), rng.randint(-200, 900), rng.randint(1, 40), rng.randint(1, 40)), dx, dy))
+    return moves
+
+@pytest.mark.parametrize("seed", range(10))
+def test_sweep_matches_brute_force(seed):
+    rng = random.Random(seed)
+    store, targets = make_store(rng, rng.choice([1, 10, 100]), 1)
+    moves = make_moves(rng, rng.choice([1, 10, 200]))
+    start_x, start_y, end_x, end_y, w, h = (numpy.array(column, dtype = numpy.int64) for column in
+        zip(*[(rect.x, rect.y, rect.x + dx, rect.y + dy, rect.w, rect.h) for rect, dx, dy in moves]))
+    pairs, rows, times = store.sweep(start_x, start_y, end_x, end_y, w, h)
+
+    found = {(i, store.objects[row]): time for i, row, time in zip(pairs.tolist(), rows.tolist(), times.tolist())}
+    assert len(found) == len(pairs)
+    for i, (rect, dx, dy) in enumerate(moves):
+        for target in targets:
+            time = get_touch_time(rect, dx, dy, target)
+            if time == None:
+                assert (i, target) not in found
+            else:
+                assert found[(i, target)] == pytest.approx(float(time), abs = 1e-12)
+
+@pytest.mark.parametrize("seed", range(10))
+def test_grid_touches_match_sweep(seed):
+    # the grid's version for a single rect finds the same enemies at the same times, in order of time and then the enemies
+    # group's, and leaves out the ones killed since it was made
+    rng = random.Random(seed)
+    store, targets = make_store(rng, rng.choice([1, 10, 100]), 1)
+    grid = store.get_grid()
+    for target in rng.sample(targets, len(targets) // 10):
+        target.living = False
+    for rect, dx, dy in make_moves(rng, 50):
+        array = lambda value: numpy.array([value], dtype = numpy.int64)
+        pairs, rows, times = store.sweep(array(rect.x), array(rect.y), array(rect.x + dx), array(rect.y + dy), array(rect.w), array(rect.h))
+        swept = sorted((time, store.columns["order"][row], store.objects[row]) for row, time in zip(rows.tolist(), times.tolist()))
+        assert grid.get_touched(rect, dx, dy) == [(time, target) for time, order, target in swept if target.alive()]
@@ -0,0 +1,215 @@
+import random
+
+import numpy
+import pytest
+
+from data.pathfinding import Pathfinder, Hierarchy, Wavefront
+from data.benchmark import BaselinePathfinder, HierarchicalPathfinder
+from reference import *
+
+# keyword arguments added to the map's arrays for each engine whose routes are always the shortest
+ENGINES = {
+    "astar": {},
+    "flow_field": {"flow_field": True},
+    "wavefront": {"flow_field": True, "wavefront": True}
+}
+SAMPLED_NODES = 40 # nodes other than the starts that get a route in each test
+
+def get_sampled_nodes(path_data, starts, rng):
+    nodes = get_nodes(path_data)
+    return starts + rng.sample(nodes, min(SAMPLED_NODES, len(nodes)))
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("name", map_names())
+def test_routes_match_bfs(name, engine):
+    # with and without towers, every engine finds a route from exactly the nodes a BFS reaches, and the route is as short
+    path_data, starts = get_map(name)
+    rng = random.Random(name + engine)
+    pathfinder = Pathfinder(**path_data, **ENGINES[engine])
+    ground = add_towers(path_data, starts, rng, rng.choice([0.05, 0.2]))
+    pathfinder.clear_nodes(path_data["base_map"])
+    pathfinder.update_nodes(ground)
+
+    for ignore_towers, map in ((False, ground), (True, path_data["base_map"])):
+        dist = get_distances(path_data, map)
+        for node in get_sampled_nodes(path_data, starts, rng):
+            length = get_route_length(path_data, dist, node)
+            path = pathfinder.astar(node, ignore_towers)
+            if length == None:
+                assert path == False
+                continue
+            assert path != False
+            assert check_route(path_data, map, path, node) == length == len(path) - 1
+            assert path.get_length() == sum(a[0] != b[0] for a, b in zip(list(path), list(path)[1:]))
+
+@pytest.mark.parametrize("name", map_names(max_tiles = 400))
+def test_baseline_routes_match_bfs(name):
+    # the A* the benchmark measures the engines against finds routes just as short from the same nodes, so it's timed
+    # doing the same job (it always lets the ground tile under the start be a wall, but no other layer's)
+    path_data, starts = get_map(name)
+    rng = random.Random(name)
+    pathfinder = BaselinePathfinder(**path_data)
+    ground = add_towers(path_data, starts, rng, 0.2)
+    for node in get_sampled_nodes(path_data, starts, rng):
+        (x, y), layer = node
+        if layer != 0 and not is_walkable(path_data, ground, node):
+            continue
+        pathfinder.clear_nodes(ground)
+        open_ground = [col[:] for col in ground]
+        open_ground[x][y] = 0
+        length = get_route_length(path_data, get_distances(path_data, open_ground), node)
+        path = pathfinder.astar(node)
+        if length == None:
+            assert path == False
+        else:
+            assert path != False
+            assert check_route(path_data, open_ground, path, node) == length == len(path) - 1
+            assert pathfinder.astar(node) == path # and again from its cache
+
+def check_field(pathfinder, path_data, map):
+    came_from, dist = pathfinder.get_field(False)
+    assert dist == get_distances(path_data, map)
+    assert set(came_from) == set(dist) - set(path_data["goals"])
+    for node, next_node in came_from.items():
+        assert next_node in get_adjacent(path_data, node) and dist[next_node] == dist[node] - 1
+
+@pytest.mark.parametrize("wavefront", [False, True])
+@pytest.mark.parametrize("cache_size", [0, 4])
+@pytest.mark.parametrize("name", map_names())
+def test_repaired_field_matches_bfs(name, cache_size, wavefront):
+    # towers placed and sold one or a few at a time, sometimes going back to a layout from before (which comes from the
+    # pathfinder's cache of map states if it's still there), leave the same field as working it out from scratch
+    path_data, starts = get_map(name)
+    rng = random.Random(name)
+    pathfinder = Pathfinder(**path_data, flow_field = True, wavefront = wavefront, cache_size = cache_size)
+    ground = [col[:] for col in path_data["base_map"]]
+    pathfinder.clear_nodes(ground)
+    check_field(pathfinder, path_data, ground)
+
+    tiles = get_tower_tiles(path_data, starts, ground)
+    layouts = [ground]
+    for i in range(30):
+        if rng.random() < 0.2:
+            ground = [col[:] for col in rng.choice(layouts)]
+        else:
+            ground = [col[:] for col in ground]
+            for x, y in rng.sample(tiles, min(rng.randint(1, 3), len(tiles))):
+                ground[x][y] = 1 - ground[x][y]
+        layouts.append(ground)
+        pathfinder.update_nodes(ground)
+        check_field(pathfinder, path_data, ground)
+
+@pytest.mark.parametrize("name", map_names())
+def test_blocking_nodes_match_brute_force(name):
+    # a tile is blocking exactly when a tower on it would leave a start with no way to a goal, and everything is blocking
+    # once a start has none already (start tiles and goal tiles can't have towers on them, so they aren't checked)
+    path_data, starts = get_map(name)
+    rng = random.Random(name)
+    pathfinder = Pathfinder(**path_data)
+    ground = add_towers(path_data, starts, rng, rng.choice([0.1, 0.3]), True)
+    if rng.random() < 0.2:
+        wall_in(path_data, starts, ground)
+    pathfinder.clear_nodes(ground)
+    blocking = pathfinder.get_blocking_nodes(starts)
+
+    if not reaches_goals(path_data, ground, starts):
+        assert blocking.all()
+        return
+    for x, y in get_tower_tiles(path_data, starts, ground):
+        ground[x][y] = 1
+        assert blocking[x][y] == (not reaches_goals(path_data, ground, starts))
+        ground[x][y] = 0
+    for x in range(len(ground)):
+        for y in range(len(ground[0])):
+            if ground[x][y] == 1:
+                assert not blocking[x][y]
+
+@pytest.mark.parametrize("name", map_names())
+def test_placement_gains_match_brute_force(name):
+    # the gain of a tile is how much longer each start's route gets with a tower on it (-1 if it can't get to a goal at all,
+    # and -1 everywhere once a start can't already), with the starts walkable like A* treats them
+    path_data, starts = get_map(name)
+    rng = random.Random(name)
+    pathfinder = Pathfinder(**path_data)
+    ground = add_towers(path_data, starts, rng, rng.choice([0.1, 0.3]), True)
+    if rng.random() < 0.2:
+        wall_in(path_data, starts, ground)
+    pathfinder.clear_nodes(ground)
+    gains = pathfinder.get_placement_gains(starts)
+    assert gains.shape == (len(starts), len(ground), len(ground[0]))
+
+    dist = get_distances(path_data, ground, starts)
+    if not all(start in dist for start in starts):
+        assert (gains == -1).all()
+        return
+    lengths = [dist[start] for start in starts]
+    for x, y in get_tower_tiles(path_data, starts, ground):
+        ground[x][y] = 1
+        new_dist = get_distances(path_data, ground, starts)
+        ground[x][y] = 0
+        for i, start in enumerate(starts):
+            assert gains[i][x][y] == (new_dist[start] - lengths[i] if start in new_dist else -1)
+    for x in range(len(ground)):
+        for y in range(len(ground[0])):
+            if ground[x][y] == 1:
+                assert (gains[:, x, y] == 0).all()
+
+def get_links(hierarchy):
+    # entrances whose border stretch has gone keep an empty set of links
+    return {entrance: links for entrance, links in hierarchy.links.items() if links}
+
+@pytest.mark.parametrize("cluster_size", [3, 4, 8])
+@pytest.mark.parametrize("name", map_names())
+def test_hierarchy_routes(name, cluster_size):
+    # the hierarchy finds a route from exactly the nodes a BFS reaches, which can be longer but never shorter,
+    # and after towers are placed and sold its clusters are the same as making it again from scratch
+    path_data, starts = get_map(name)
+    rng = random.Random(name + str(cluster_size))
+    pathfinder = HierarchicalPathfinder(**path_data, cluster_size = cluster_size)
+    ground = [col[:] for col in path_data["base_map"]]
+    pathfinder.clear_nodes(ground)
+    tiles = get_tower_tiles(path_data, starts, ground)
+    for i in range(4):
+        for ignore_towers, map in ((False, ground), (True, path_data["base_map"])):
+            dist = get_distances(path_data, map)
+            for node in get_sampled_nodes(path_data, starts, rng):
+                length = get_route_length(path_data, dist, node)
+                path = pathfinder.astar(node, ignore_towers)
+                if length == None:
+                    assert path == False
+                else:
+                    assert path != False
+                    assert check_route(path_data, map, path, node) >= length
+
+        ground = [col[:] for col in ground]
+        for x, y in rng.sample(tiles, min(rng.randint(1, 5), len(tiles))):
+            ground[x][y] = 1 - ground[x][y]
+        pathfinder.update_nodes(ground)
+        updated = pathfinder.get_hierarchy(False)
+        fresh = Hierarchy(pathfinder, False)
+        assert updated.borders == fresh.borders
+        assert get_links(updated) == get_links(fresh)
+        assert updated.entrances == fresh.entrances
+        assert updated.edges == fresh.edges
+
+@pytest.mark.parametrize("name", map_names())
+def test_wavefront_matches_bfs(name):
+    # every cell's distance is the BFS's (-1 where it can't get to a goal), and every cell with a distance but a goal
+    # moves next to a neighbor one step closer
+    path_data, starts = get_map(name)
+    rng = random.Random(name)
+    wavefront = Wavefront(**path_data)
+    for map in (path_data["base_map"], add_towers(path_data, starts, rng, 0.2)):
+        dist = get_distances(path_data, map)
+        dist_array = wavefront.solve(map, path_data["goals"])
+        parents = wavefront.get_parents(dist_array)
+        for node in get_nodes(path_data):
+            (x, y), layer = node
+            assert dist_array[layer + 2][x][y] == dist.get(node, -1)
+            parent = parents[layer + 2][x][y]
+            if dist.get(node, 0) == 0:
+                assert parent == -1
+                continue
+            parent_layer, parent_x, parent_y = numpy.unravel_index(parent, dist_array.shape)
+            parent_node = ((parent_x, parent_y), parent_layer - 2)
+            assert parent_node in get_adjacent(path_data, node) and dist[parent_node] == dist[node] - 1
@@ -0,0 +1,173 @@
+import random
+from copy import deepcopy
+from hashlib import sha1
+
+import pytest
+
+from data.settings import *
+from data.game import Game
+from data.replay import Replay, get_version
+from data.snapshot import Snapshots
+
+FRAMES = 2000 # frames of the played game that gets recorded
+CHECK_FRAMES = 100 # how often the replays are checked against it
+
+class UnevenClock():
+    # frame times like a game that's struggling now and then, so the ticks per frame keep changing
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+        self.time = 16
+
+    def get_time(self):
+        return self.time
+
+    def tick(self, *args):
+        self.time = self.rng.choice([8, 16, 17, 33, 50, 120])
+        return self.time
+
+def get_state(game):
+    # everything the tests compare between games, with the enemies and towers hashed
+    state = sha1()
+    for enemy in sorted(game.enemies, key = lambda enemy: (enemy.spawn_time, enemy.rect.x, enemy.rect.y)):
+        state.update(repr((enemy.name, enemy.rect.topleft, round(enemy.distance, 6), enemy.hp)).encode())
+    for tower in sorted(game.towers, key = lambda tower: tower.rect.topleft):
+        state.update(repr((tower.name, tower.rect.topleft, tower.stage, tower.hits, tower.kills)).encode())
+    return (game.ticks, game.wave, game.lives, game.protein, len(game.enemies), len(game.towers), state.hexdigest())
+
+def click_map(game, x, y):
+    pos = ((x + 0.5) * game.map.tilesize, (y + 0.5) * game.map.tilesize)
+    pos = [pos[i] * game.camera.current_zoom + game.camera.camera.topleft[i] for i in range(2)]
+    return pg.event.Event(pg.MOUSEBUTTONDOWN, button = 1, pos = tuple(pos))
+
+def find_wave_button(game):
+    for x in range(0, SAVE_DATA["width"], 4):
+        for y in range(0, SAVE_DATA["height"], 4):
+            if not game.ui.adjusted_rect.collidepoint((x, y)) and \
+                    game.ui.event((x - game.ui.ui_offset[0], y - game.ui.ui_offset[1])) == "start_wave":
+                return (x, y)
+
+def play(level, seed):
+    # plays a level like a player clicking around at random would, with the path worker's results coming in whenever
+    # they're ready, while the game records it
+    # returns the game and {tick: state} every CHECK_FRAMES frames
+    rng = random.Random(seed)
+    MainDisplay.get_instance() # the map images need a display mode
+    game = Game(UnevenClock(seed))
+    game.new([(level, 0), False, SAVE_DATA["owned_towers"][:5]])
+    game.ui.active = True
+    width, height = len(game.map.map), len(game.map.map[0])
+    states = {}
+    for frame in range(FRAMES):
+        game.clock.tick()
+        events = []
+        roll = rng.random()
+        if roll < 0.01: # game speed
+            events.append(pg.event.Event(pg.KEYDOWN, key = pg.K_f, mod = 0, unicode = "f", scancode = 0))
+        elif roll < 0.05: # picks a tower and places it, often in the way of the enemies so they have to go around it
+            events.append(pg.event.Event(pg.KEYDOWN, key = rng.choice([pg.K_1, pg.K_2, pg.K_3]), mod = 0, unicode = "", scancode = 0))
+            if game.enemies and rng.random() < 0.5:
+                enemy = rng.choice(sorted(game.enemies, key = lambda enemy: enemy.rect.topleft))
+                x = enemy.rect.centerx // game.map.tilesize + rng.randint(-1, 1)
+                y = enemy.rect.centery // game.map.tilesize + rng.randint(-1, 1)
+                events.append(click_map(game, x, y))
+            else:
+                events.append(click_map(game, rng.randrange(width), rng.randrange(height)))
+        elif roll < 0.055: # zoom
+            events.append(pg.event.Event(pg.MOUSEBUTTONDOWN, button = rng.choice([4, 5]), pos = (300, 300)))
+        elif roll < 0.06 and game.towers: # upgrades or sells a tower
+            tower = rng.choice(sorted(game.towers, key = lambda tower: tower.rect.topleft))
+            pos = [tower.rect.center[i] * game.camera.current_zoom + game.camera.camera.topleft[i] for i in range(2)]
+            events.append(pg.event.Event(pg.MOUSEBUTTONDOWN, button = rng.choice([2, 3]), pos = tuple(pos)))
+        if not game.in_a_wave and game.ui.next_wave_btn_enabled and rng.random() < 0.05:
+            button = find_wave_button(game)
+            if button != None:
+                events.append(pg.event.Event(pg.MOUSEBUTTONDOWN, button = 1, pos = button))
+        if rng.random() < 0.02:
+            game.camera.move(rng.choice([-25, 25]), 0)
+
+        for event in events:
+            game.event(event)
+        if game.new_enemy_box.show:
+            game.new_enemy_box.enabled = False
+            game.new_enemy_box.show = False
+        game.update()
+        if frame % CHECK_FRAMES == 0:
+            states[game.ticks] = get_state(game)
+    return game, states
+
+@pytest.fixture(scope = "module")
+def save_data():
+    # the recorded game and the replays change the save (just for themselves), which the other tests shouldn't see
+    saved = deepcopy(SAVE_DATA)
+    SAVE_DATA["skip_text"] = True
+    SAVE_DATA["game_attrs"]["starting_protein"]["value"] = 5000
+    SAVE_DATA["game_attrs"]["lives"]["value"] = 1000 # so the game is still going at the end
+    yield SAVE_DATA
+    SAVE_DATA.clear()
+    SAVE_DATA.update(saved)
+
+@pytest.fixture(scope = "module")
+def recording(save_data, tmp_path_factory):
+    # (replay file, {tick: state} of the recorded game, state it ended in)
+    game, states = play(0, 3)
+    filename = str(tmp_path_factory.mktemp("replay") / "replay.json")
+    game.recorder.save(filename)
+    game.path_worker.stop()
+    # there's something to get right: towers placed and paths picked up from the worker, and enemies on the way
+    assert len(game.towers) > 0 and game.wave > 0
+    assert any("paths" in entry for entry in game.recorder.entries)
+    # a replay run up to a tick plays what came in at that tick too, which the recorded game got after its state was kept
+    entry_ticks = {entry["tick"] for entry in game.recorder.entries}
+    return filename, {tick: state for tick, state in states.items() if tick not in entry_ticks}, get_state(game)
+
+def test_replay_matches_the_recording(recording):
+    filename, states, end = recording
+    replay = Replay(filename)
+    for tick, state in sorted(states.items()):
+        replay.run(until = tick)
+        assert get_state(replay.game) == state
+    replay.run()
+    assert get_state(replay.game) == end
+    replay.game.path_worker.stop()
+
+def test_seeking_ends_like_the_recording(recording):
+    # going back to a keyframe and playing on from there gets to the same end, from anywhere in the replay
+    filename, states, end = recording
+    replay = Replay(filename)
+    replay.run()
+    rng = random.Random(0)
+    for i in range(3):
+        replay.seek(rng.randrange(replay.data["ticks"]) * TICK_TIME / 1000)
+        replay.run()
+        assert get_state(replay.game) == end
+
+    # and so do the keyframes once they've been saved and loaded by another replay
+    keyframes = filename + ".keyframes"
+    version = get_version(filename)
+    replay.save_keyframes(keyframes, version)
+    replay.game.path_worker.stop()
+    replay = Replay(filename)
+    assert not replay.load_keyframes(keyframes, version + "x")
+    assert replay.load_keyframes(keyframes, version)
+    replay.seek(replay.data["ticks"] * TICK_TIME / 2000)
+    replay.run()
+    assert get_state(replay.game) == end
+    replay.game.path_worker.stop()
+
+def test_snapshot_puts_the_game_back(recording):
+    filename, states, end = recording
+    replay = Replay(filename)
+    snapshots = Snapshots(replay.game)
+    tick = replay.data["ticks"] // 2
+    replay.run(until = tick)
+    while not snapshots.can_take() and tick < replay.data["ticks"]:
+        tick += 1
+        replay.run(until = tick)
+    assert snapshots.can_take()
+    snapshot = snapshots.take()
+    middle = get_state(replay.game)
+    replay.run()
+    assert get_state(replay.game) == end
+    snapshots.load(snapshot)
+    assert get_state(replay.game) == middle
+    replay.game.path_worker.stop()
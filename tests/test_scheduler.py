@@ -0,0 +1,72 @@
+import random
+
+from data.scheduler import Scheduler
+
+def test_timers_go_off_in_order():
+    # by when they run out, and in the order they were set when that's the same, whatever order they were set in
+    rng = random.Random(0)
+    scheduler = Scheduler()
+    fired = []
+    timers = [(rng.choice([0, 5, 10, 16, 33, 50]), i) for i in range(200)]
+    for delay, i in timers:
+        scheduler.schedule(delay, lambda delay, i: fired.append((delay, i)), delay, i)
+    while scheduler.timers:
+        scheduler.update(rng.choice([1, 7, 16.7]))
+    assert fired == sorted(timers)
+
+def test_timers_only_go_off_once_due():
+    scheduler = Scheduler()
+    fired = []
+    scheduler.schedule(10, fired.append, "a")
+    scheduler.update(9.5)
+    assert fired == []
+    scheduler.update(0.5)
+    assert fired == ["a"]
+    scheduler.update(100)
+    assert fired == ["a"]
+
+def test_callbacks_see_the_time_of_the_update():
+    # so a timer set in a callback is timed from the update it went off in, not from when it was due
+    scheduler = Scheduler()
+    fired = []
+    def first():
+        fired.append(("first", scheduler.now))
+        scheduler.schedule(10, lambda: fired.append(("second", scheduler.now)))
+    scheduler.schedule(5, first)
+    scheduler.update(8)
+    scheduler.update(8)
+    assert fired == [("first", 8)]
+    scheduler.update(2)
+    assert fired == [("first", 8), ("second", 18)]
+
+def test_timers_set_in_a_callback_go_off_once_due():
+    # in the same update if they've already run out by then, still in order of when they ran out
+    scheduler = Scheduler()
+    fired = []
+    def first():
+        fired.append("first")
+        scheduler.schedule(0, fired.append, "no delay")
+        scheduler.schedule(-5, fired.append, "overdue") # at 11, after the one set before it at 10
+        scheduler.schedule(1, fired.append, "later")
+    scheduler.schedule(0, first)
+    scheduler.schedule(10, fired.append, "due before")
+    scheduler.update(16)
+    assert fired == ["first", "due before", "overdue", "no delay"]
+    scheduler.update(1)
+    assert fired == ["first", "due before", "overdue", "no delay", "later"]
+
+def test_timers_set_from_when_they_were_due_keep_their_pace():
+    # something that goes off every few milliseconds, more often than the updates or not at all in between,
+    # goes off as many times as it would with updates that short
+    for period in (0, 10, 25):
+        scheduler = Scheduler()
+        fired = []
+        def repeat():
+            fired.append(scheduler.due)
+            if len(fired) < 40:
+                scheduler.schedule_at(scheduler.due + period, repeat)
+        scheduler.schedule(0, repeat)
+        for i in range(100):
+            scheduler.update(1000 / 60)
+            assert len(fired) == min(int(scheduler.now / period) + 1 if period else 40, 40)
+        assert fired == [i * period for i in range(40)]
@@ -0,0 +1,47 @@
+from copy import deepcopy
+
+import pytest
+
+from data.settings import *
+from data.simulation import Simulation
+from data.batch import get_policy
+
+LAYOUT = [{"name": "t_cell", "x": 5, "y": 5}, {"name": "t_cell", "x": 9, "y": 5}] # so some enemies get killed
+
+@pytest.fixture
+def save_data():
+    saved = deepcopy(SAVE_DATA)
+    SAVE_DATA["game_attrs"]["lives"]["value"] = 1000 # so it plays through every wave
+    yield SAVE_DATA
+    SAVE_DATA.clear()
+    SAVE_DATA.update(saved)
+
+def watch(policy, seen):
+    # a policy that keeps the protein it's given a turn with, before going on to spend it (or not)
+    def watched(simulation):
+        seen.append(simulation.game.protein)
+        if policy != None:
+            policy(simulation)
+    return watched
+
+def test_wave_stats_are_kept_before_the_policy_spends(save_data):
+    # a policy that doesn't place anything leaves the same stats as no policy at all, and each wave's protein is what
+    # the policy had to spend after it
+    plain = Simulation(0, 0, LAYOUT).run()
+    seen = []
+    watched = Simulation(0, 0, LAYOUT, policy = watch(None, seen)).run()
+    assert plain["waves"] == watched["waves"]
+    assert plain["finished"] and len(plain["waves"]) == plain["max_wave"]
+    assert seen[1:] == [wave["protein"] for wave in watched["waves"][:len(seen) - 1]]
+    assert all(wave["protein_gained"] > 0 for wave in plain["waves"])
+
+def test_policy_spending_isnt_counted_against_a_wave(save_data):
+    # what the advisor spends comes off between one wave's protein and the next one's start
+    policy, towers = get_policy("advisor")
+    seen = []
+    simulation = Simulation(0, 0, policy = watch(policy, seen), policy_towers = towers)
+    results = simulation.run()
+    assert len(simulation.towers) > 0
+    assert seen[1:] == [wave["protein"] for wave in results["waves"][:len(seen) - 1]]
+    assert results["finished"] and len(results["waves"]) == results["max_wave"]
+    assert all(wave["protein_gained"] > 0 for wave in results["waves"])
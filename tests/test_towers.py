@@ -0,0 +1,84 @@
+import math
+import random
+from copy import deepcopy
+
+import pytest
+
+from data.settings import *
+from data.simulation import Simulation
+from data.towers import Projectile, Tower
+
+FAST_TOWERS = ["t_cell", "killer_cell", "mast_cell", "goblet_cell", "macrophage"] # tracking, with projectiles fast enough to be aimed
+
+@pytest.fixture
+def save_data():
+    saved = deepcopy(SAVE_DATA)
+    SAVE_DATA["game_attrs"]["starting_protein"]["value"] = 10 ** 6
+    SAVE_DATA["game_attrs"]["lives"]["value"] = 10 ** 6
+    yield SAVE_DATA
+    SAVE_DATA.clear()
+    SAVE_DATA.update(saved)
+
+@pytest.mark.parametrize("level", [3, 7])
+def test_aimed_projectiles_land_on_their_enemy(save_data, monkeypatch, level):
+    # when a timed hit goes off and its enemy went where it was expected to, the projectile's middle is no further from
+    # the enemy's than when they touch, give or take the enemy's move in the tick the hit was rounded up to (and a pixel)
+    landings = []
+    land = Projectile.land
+    def checked_land(projectile, order):
+        enemy = projectile.enemy
+        if projectile.alive() and projectile.store.columns["order"][projectile.row] == order and enemy.alive() and \
+                enemy.damagable and enemy.path is projectile.hit_path and abs(enemy.distance - projectile.hit_distance) < 0.5:
+            reach = (min(projectile.w, projectile.h) + min(enemy.rect.w, enemy.rect.h)) / 2
+            distance = math.hypot(projectile.hit_x + projectile.w / 2 - enemy.rect.centerx, projectile.hit_y + projectile.h / 2 - enemy.rect.centery)
+            landings.append(distance - reach - enemy.speed * TICK_TIME / 1000)
+        land(projectile, order)
+    monkeypatch.setattr(Projectile, "land", checked_land)
+
+    simulation = Simulation(level, 0)
+    game = simulation.game
+    rng = random.Random(level)
+    tiles = [(x, y) for x in range(len(game.map.map)) for y in range(len(game.map.map[0])) if game.map.is_valid_tower_tile(x, y) == -1]
+    for i, (x, y) in enumerate(rng.sample(tiles, min(20, len(tiles)))):
+        simulation.place({"name": FAST_TOWERS[i % len(FAST_TOWERS)], "x": x, "y": y, "stage": 2})
+    for tick in range(3000):
+        if not game.in_a_wave and len(game.enemies) == 0:
+            game.start_next_wave()
+        game.tick()
+
+    assert len(landings) > 100
+    assert max(landings) <= 1
+
+def test_towers_attack_at_their_attack_speed(save_data, monkeypatch):
+    # a tower that attacks in the same tick it reloaded is ready again exactly its attack speed after it reloaded,
+    # however that lines up with the ticks
+    reloads = {} # tower -> (when its last reload was due, the tick it went off in)
+    gaps = []
+    reload = Tower.reload
+    def checked_reload(tower):
+        due = tower.game.scheduler.due
+        if tower in reloads and reloads[tower][1] == None:
+            gaps.append(due - reloads[tower][0] - tower.true_attack_speed * 1000)
+        reload(tower)
+        reloads[tower] = (due, tower.game.scheduler.now)
+    schedule_reload = Tower.schedule_reload
+    def checked_schedule_reload(tower):
+        if tower in reloads and reloads[tower][1] == tower.game.scheduler.now:
+            reloads[tower] = (reloads[tower][0], None) # attacked straight away
+        schedule_reload(tower)
+    monkeypatch.setattr(Tower, "reload", checked_reload)
+    monkeypatch.setattr(Tower, "schedule_reload", checked_schedule_reload)
+
+    simulation = Simulation(3, 0)
+    game = simulation.game
+    rng = random.Random(0)
+    tiles = [(x, y) for x in range(len(game.map.map)) for y in range(len(game.map.map[0])) if game.map.is_valid_tower_tile(x, y) == -1]
+    for i, (x, y) in enumerate(rng.sample(tiles, min(20, len(tiles)))):
+        simulation.place({"name": FAST_TOWERS[i % len(FAST_TOWERS)], "x": x, "y": y, "stage": i % 3})
+    for tick in range(2000):
+        if not game.in_a_wave and len(game.enemies) == 0:
+            game.start_next_wave()
+        game.tick()
+
+    assert len(gaps) > 100
+    assert max(abs(gap) for gap in gaps) < 1e-6